@@ -1,6 +1,9 @@
 import streamlit as st
 from PIL import Image
 import acoustic_tracking as at
+from range_driver.config import prepare_config
+from range_driver.data_prep.tidal import TidalLookup, tidal_lookup_path
+from range_driver.dict_utils import yload
 import copy
 import pandas as pd
 from datetime import datetime
@@ -105,6 +108,19 @@ def tidal_analysis():
         detection_df, detection_env_df = load_processed_data(detections_file, detections_env_file)
         st.subheader("Determine tidal heights via interpolation of tidal time tables")
         st.markdown("In addition to ocean and weather model data, historic tidal tables are available and used here to provide additional information about environmental cycles that could be factors of influence on the acoustic data.")
+        config_yaml = st.sidebar.file_uploader("Upload Configuration YAML", type="yaml")
+        if config_yaml is not None:
+            config = yload(config_yaml.read().decode('utf-8'))
+            prepare_config(config)
+            tidal_interpolation_file = config.get('data', {}).get('tidal', {}).get('tidal_interpolation_output_csv')
+            # the tidal lookup table saved by Detections, rather than re-reading the tidal times ODS
+            tidal_lookup = tidal_interpolation_file and TidalLookup.load(tidal_lookup_path(tidal_interpolation_file))
+            if tidal_lookup:
+                datetimes = pd.to_datetime(detection_env_df['datetime'])
+                df_tidal = tidal_lookup.frame(datetimes.min(), datetimes.max())
+                st.line_chart(df_tidal[['height', 'dheight_cm_per_hr']].assign(t=df_tidal.t*10))
+            else:
+                st.info("No tidal lookup table yet, it is written next to `data.tidal.tidal_interpolation_output_csv` of the configuration when the detections are processed")
 
     else:
         st.error("""Uh oh! the required data files have not been generated, head over to the **load data** module""")
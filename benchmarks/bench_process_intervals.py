@@ -0,0 +1,59 @@
+"""
+    Benchmark process_intervals(): per-group loop vs. vectorized single pass
+
+    Run from the repository root:
+
+        python -m benchmarks.bench_process_intervals --num-detections 10000000
+
+    With --parallel thread or process, the vectorized engine runs on chunks of groups in a pool
+    of --workers threads or processes. The equivalence of the engines is checked by
+    tests/test_detection_rates.py.
+"""
+
+import argparse
+import copy
+import time
+
+from range_driver.data_prep import process_intervals
+from range_driver.data_prep.parallel import GroupExecutor
+from benchmarks.synthetic import make_synthetic_detections
+
+
+def time_engine(detection_df, metadata, engine, executor=None):
+    metadata = copy.deepcopy(metadata)
+    t0 = time.perf_counter()
+    result = process_intervals(detection_df.copy(deep=False), metadata, engine=engine,
+                               executor=executor)
+    return time.perf_counter() - t0, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--num-detections', type=int, default=10**7)
+    parser.add_argument('--receivers', type=int, default=20)
+    parser.add_argument('--transmitters', type=int, default=100)
+    parser.add_argument('--skip-loop', action='store_true', help="only time the vectorized engine")
+    parser.add_argument('--parallel', choices=GroupExecutor.backends, default='serial',
+                        help="group executor backend of the vectorized engine")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="threads or processes of the group executor, default: CPU count")
+    args = parser.parse_args(argv)
+
+    detection_df, metadata = make_synthetic_detections(args.num_detections, args.receivers,
+                                                       args.transmitters)
+    print("{:,} detections, {} receiver/transmitter pairs".format(
+        len(detection_df), args.receivers * args.transmitters))
+
+    with GroupExecutor(args.parallel, args.workers) as executor:
+        if args.parallel != 'serial':
+            # start the workers before timing
+            executor.pool().submit(int).result()
+        t_vec, _ = time_engine(detection_df, metadata, "vectorized", executor)
+    print("vectorized: {:8.2f} s  ({})".format(t_vec, args.parallel))
+    if not args.skip_loop:
+        t_loop, _ = time_engine(detection_df, metadata, "loop")
+        print("loop:       {:8.2f} s  (speedup {:.1f}x)".format(t_loop, t_loop / t_vec))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+    Synthetic range test data for benchmarks
+
+    Generates detections for a grid of receivers and transmitters with an initial short-interval
+    sequence followed by regular pings, plus metadata in the layout returned by read_otn_data(),
+    or written as input files in the NSOG layout.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+from sklearn.utils import Bunch
+
+from range_driver.data_prep.metadata import encode_devices
+
+
+def make_synthetic_metadata(num_receivers=20, num_transmitters=100, seed=0):
+    """Create a metadata Bunch with receiver, transmitter, and deploy tables."""
+    rng = np.random.default_rng(seed)
+    receiver_ids = 480000 + np.arange(num_receivers)
+    transmitter_ids = 10000 + np.arange(num_transmitters)
+    num_stations = max(1, num_receivers // 2)
+
+    deploy = pd.DataFrame({
+        'STATION_NO': np.concatenate([np.arange(num_receivers) % num_stations + 1,
+                                      np.arange(num_transmitters) % num_stations + 1]),
+        'DEPLOY_LAT': 44.4 + rng.uniform(0, 0.1, num_receivers + num_transmitters),
+        'DEPLOY_LONG': -64.2 + rng.uniform(0, 0.1, num_receivers + num_transmitters),
+        'BOTTOM_DEPTH': rng.uniform(10, 40, num_receivers + num_transmitters),
+        'INSTRUMENT_DEPTH': rng.uniform(5, 10, num_receivers + num_transmitters),
+        'INS_SERIAL_NO': np.concatenate([receiver_ids, transmitter_ids]),
+    })
+    # station coordinates are those of the first device deployed there
+    first = deploy.groupby('STATION_NO')[['DEPLOY_LAT', 'DEPLOY_LONG']].transform('first')
+    deploy[['DEPLOY_LAT', 'DEPLOY_LONG']] = first
+
+    metadata = Bunch()
+    metadata.deploy = deploy
+    metadata.receiver = deploy.iloc[:num_receivers][['DEPLOY_LAT', 'DEPLOY_LONG', 'BOTTOM_DEPTH',
+                                                     'INSTRUMENT_DEPTH', 'INS_SERIAL_NO']].copy()
+    metadata.receiver.columns = ['Receiver.lat', 'Receiver.lon', 'Receiver.bottom_depth',
+                                 'Receiver.depth', 'Receiver.ID']
+
+    min_delay = np.where(np.arange(num_transmitters) % 2, 250, 500)
+    metadata.transmitter = pd.DataFrame({
+        'Transmitter': ["A69-1601-%d" % tid for tid in transmitter_ids],
+        'Transmitter.Tag Family': np.where(np.arange(num_transmitters) % 3, 'V13', 'V9'),
+        'Transmitter.ID': transmitter_ids,
+        'Transmitter.Power': np.where(np.arange(num_transmitters) % 2, 'H', 'L'),
+        'Transmitter.Min delay': min_delay,
+        'Transmitter.Max delay': min_delay + 100,
+    })
+    metadata.transmitter['Transmitter.Avg delay'] = (metadata.transmitter['Transmitter.Min delay']
+                                                     + metadata.transmitter['Transmitter.Max delay']) / 2
+    metadata.transmitter.set_index('Transmitter', inplace=True)
+    return metadata
+
+
+def make_synthetic_detections(num_detections=10**6, num_receivers=20, num_transmitters=100,
+                              start="2016-03-09", init_pings=20, seed=0):
+    """
+    Create detections and matching metadata.
+
+    :return: - **detection_df** (`pandas.DataFrame`) - detections sorted by datetime with the
+               columns and categorical device names returned by read_detections()
+             - **metadata** (`sklearn.utils.Bunch`) - metadata with receiver, transmitter, deploy
+    """
+    rng = np.random.default_rng(seed)
+    metadata = make_synthetic_metadata(num_receivers, num_transmitters, seed)
+    receivers = np.array(["VR2W-%d" % rid for rid in metadata.receiver['Receiver.ID']])
+    transmitters = metadata.transmitter.index.values
+    num_pairs = num_receivers * num_transmitters
+
+    pair = rng.integers(0, num_pairs, num_detections)
+    pair.sort()
+    pair_size = np.bincount(pair, minlength=num_pairs)
+    pair_start = np.concatenate([[0], np.cumsum(pair_size)[:-1]])
+    rank = np.arange(num_detections) - np.repeat(pair_start, pair_size)
+
+    ti = pair % num_transmitters
+    min_delay = metadata.transmitter['Transmitter.Min delay'].values[ti]
+    # short init sequence, then regular pings with random delay and occasional missed detections
+    gaps = np.where(rank < init_pings,
+                    rng.uniform(20, 40, num_detections),
+                    (min_delay + rng.uniform(0, 100, num_detections))
+                    * rng.geometric(0.7, num_detections))
+    detected = pair_size > 0
+    gaps[rank == 0] = rng.uniform(0, 86400, detected.sum())
+    offsets = np.cumsum(gaps)
+    offsets -= np.repeat((offsets - gaps)[pair_start[detected]], pair_size[detected])
+
+    detection_df = pd.DataFrame({
+        'datetime': pd.Timestamp(start) + pd.to_timedelta(np.round(offsets), unit='s'),
+        'Receiver': receivers[pair // num_transmitters],
+        'Transmitter': transmitters[ti],
+    })
+    detection_df['Receiver.ID'] = 480000 + pair // num_transmitters
+    detection_df['Transmitter.ID'] = 10000 + ti
+    detection_df = detection_df.sort_values('datetime', kind='mergesort').reset_index(drop=True)
+    return encode_devices(detection_df), metadata
+
+
+def write_synthetic_nsog(directory, num_detections=20000, num_receivers=4, num_transmitters=6,
+                         seed=0):
+    """
+    Write synthetic detections in the NSOG layout read by read_nsog_data(), with a vendor tag
+    specs workbook of the transmitters.
+
+    :return: - **detections_csv** (`str`) - path of the detections CSV file
+             - **vendor_tag_specs** (`str`) - path of the vendor tag specs workbook
+    """
+    detection_df, metadata = make_synthetic_detections(num_detections, num_receivers,
+                                                       num_transmitters, seed=seed)
+    receiver = metadata.receiver.set_index('Receiver.ID')
+    station = metadata.deploy.set_index('INS_SERIAL_NO')['STATION_NO']
+    receiver_ids = detection_df['Receiver.ID'].values
+    detections_csv = os.path.join(directory, 'nsog.csv')
+    pd.DataFrame({
+        'datecollected': detection_df['datetime'].dt.strftime('%Y-%m-%d %H:%M:%S'),
+        'rcvrcatnumber': 'NSOG',
+        'collectornumber': receiver_ids,
+        'catalognumber': detection_df['Transmitter'].astype(str) + '-' + detection_df.index.astype(str),
+        'latitude': receiver.loc[receiver_ids, 'Receiver.lat'].values,
+        'longitude': receiver.loc[receiver_ids, 'Receiver.lon'].values,
+        'bottom_depth': receiver.loc[receiver_ids, 'Receiver.bottom_depth'].values,
+        'receiver_depth': receiver.loc[receiver_ids, 'Receiver.depth'].values,
+        'station': station.loc[receiver_ids].values,
+    }).to_csv(detections_csv, index=False)
+
+    transmitter = metadata.transmitter.reset_index()
+    vendor_tag_specs = os.path.join(directory, 'vendor_tag_specs.xlsx')
+    pd.DataFrame({
+        'INTERVAL': 1,
+        'Tag Family': transmitter['Transmitter.Tag Family'],
+        'ID Code': transmitter['Transmitter.ID'],
+        'VUE Tag ID\n(Freq-Space-ID)': transmitter['Transmitter'],
+        'Power\n(L/H)': transmitter['Transmitter.Power'],
+        'Min \n(sec)': transmitter['Transmitter.Min delay'],
+        'Max \n(sec)': transmitter['Transmitter.Max delay'],
+    }).to_excel(vendor_tag_specs, index=False)
+    return detections_csv, vendor_tag_specs
@@ -0,0 +1,231 @@
+"""
+    On-disk cache of processing results, keyed by fingerprints of their inputs.
+
+    Entries are DataFrames stored as Parquet files, or arbitrary objects stored as pickles, named
+    by their key. The cache directory is limited in size, entries that were least recently used
+    are evicted first.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import uuid
+
+import numpy as np
+import pandas as pd
+
+# ----------------------------------------------------------------------------
+# fingerprints
+
+
+def file_identity(path, content_hash=False):
+    """
+    Identity of a file for use in cache keys: absolute path, size, and modification time, or a
+    hash of the file contents if `content_hash` is True.
+    """
+    if content_hash:
+        h = hashlib.sha1()
+        with open(path, 'rb') as fh:
+            for block in iter(lambda: fh.read(1 << 20), b''):
+                h.update(block)
+        return h.hexdigest()
+    stat = os.stat(path)
+    return [os.path.abspath(path), stat.st_size, stat.st_mtime_ns]
+
+
+def file_identities(value):
+    """Copy of the config `value` with all strings that are paths of existing files replaced by
+    their py:file_identity()"""
+    if isinstance(value, dict):
+        return {k: file_identities(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [file_identities(v) for v in value]
+    if isinstance(value, str) and os.path.isfile(value):
+        return file_identity(value)
+    return value
+
+
+def _update_hash(h, obj):
+    if isinstance(obj, (pd.DataFrame, pd.Series, pd.Index)):
+        h.update(str(list(obj.columns) if isinstance(obj, pd.DataFrame) else obj.name).encode())
+        h.update(pd.util.hash_pandas_object(obj, index=not isinstance(obj, pd.Index)).values.tobytes())
+    elif isinstance(obj, np.ndarray):
+        obj = np.ascontiguousarray(obj)
+        h.update(str((obj.dtype, obj.shape)).encode())
+        h.update(obj.tobytes() if obj.dtype != object else str(obj.tolist()).encode())
+    else:
+        h.update(json.dumps(obj, sort_keys=True, default=str).encode())
+
+
+def fingerprint(*objs):
+    """
+    Hash of the given objects: configuration values (dicts, lists, scalars, datetimes), NumPy
+    arrays, and pandas objects.
+
+    :return: Hex digest
+    :rtype: str
+    """
+    h = hashlib.sha1()
+    for obj in objs:
+        _update_hash(h, obj)
+    return h.hexdigest()
+
+# ----------------------------------------------------------------------------
+# cache directory
+
+
+class DiskCache:
+    """ Directory of DataFrames stored as Parquet files and objects stored as pickles, keyed by
+    fingerprint.
+
+    Args:
+        directory: cache directory, created if needed
+        max_bytes: total size limit, least recently used entries are evicted beyond it
+    """
+    default_max_bytes = 2 * 1024**3
+    suffix = '.parquet'
+    object_suffix = '.pkl'
+
+    def __init__(self, directory, max_bytes=None):
+        self.directory = directory
+        self.max_bytes = self.default_max_bytes if max_bytes is None else max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key, suffix=None):
+        return os.path.join(self.directory, key + (self.suffix if suffix is None else suffix))
+
+    def __contains__(self, key):
+        return os.path.exists(self.path(key)) or os.path.exists(self.path(key, self.object_suffix))
+
+    def get(self, key, columns=None):
+        """Return the DataFrame stored under `key`, None if there is none."""
+        path = self.path(key)
+        try:
+            df = pd.read_parquet(path, columns=columns)
+        except FileNotFoundError:
+            # DataFrames that Parquet cannot store are pickled, see put()
+            df = self.get_object(key)
+            return df[columns] if df is not None and columns is not None else df
+        # mark as recently used
+        os.utime(path)
+        return df
+
+    def put(self, key, df):
+        """Store DataFrame `df` under `key` and evict old entries if the cache is too large.
+        DataFrames that Parquet cannot store, e.g. with mixed-type object columns, are pickled."""
+        try:
+            self._write(key, self.suffix, df.to_parquet)
+        except (ValueError, TypeError, NotImplementedError):
+            self.put_object(key, df)
+
+    def get_object(self, key):
+        """Return the object pickled under `key`, None if there is none."""
+        path = self.path(key, self.object_suffix)
+        try:
+            with open(path, 'rb') as fh:
+                obj = pickle.load(fh)
+        except FileNotFoundError:
+            return None
+        os.utime(path)
+        return obj
+
+    def put_object(self, key, obj):
+        """Pickle `obj` under `key` and evict old entries if the cache is too large."""
+        def dump(path):
+            with open(path, 'wb') as fh:
+                pickle.dump(obj, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        self._write(key, self.object_suffix, dump)
+
+    def _write(self, key, suffix, write_func):
+        # write to a temporary file first, so that readers never see partial entries
+        tmp_path = os.path.join(self.directory, '.{}.tmp'.format(uuid.uuid4().hex))
+        try:
+            write_func(tmp_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        os.replace(tmp_path, self.path(key, suffix))
+        self.evict()
+
+    def entries(self):
+        """List of (last use time, size, path) of all entries, least recently used first"""
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith((self.suffix, self.object_suffix)):
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return sorted(entries)
+
+    def size(self):
+        """Total size of all entries in bytes"""
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self, max_bytes=None):
+        """Remove least recently used entries until the total size is at most `max_bytes`."""
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def invalidate(self, key=None):
+        """Remove the entries stored under `key`, or all entries if `key` is None."""
+        if key is None:
+            self.evict(0)
+            return
+        for suffix in (self.suffix, self.object_suffix):
+            try:
+                os.remove(self.path(key, suffix))
+            except FileNotFoundError:
+                pass
+
+
+def missing_as_nan(df):
+    """`df` with the missing values of object columns as NaN, like in freshly parsed tables,
+    rather than the None that Parquet reads back"""
+    columns = {c: df[c].where(df[c].notna(), np.nan) for c in df.columns
+               if df[c].dtype == object and df[c].isna().any()}
+    return df.assign(**columns) if columns else df
+
+
+def cached_frames(cache, key, func):
+    """
+    DataFrames computed by `func`, loaded from `cache` if they are stored under `key`.
+
+    :param cache: Cache to load the DataFrames from and store them in, None to always compute
+    :type cache: DiskCache
+
+    :param key: Fingerprint of the inputs of `func`, see py:fingerprint()
+    :type key: str
+
+    :param func: Function without arguments that returns a tuple of DataFrames
+    :type func: callable
+
+    :return: The DataFrames returned by func()
+    :rtype: tuple
+    """
+    if cache is None:
+        return func()
+    count = cache.get_object(key)
+    if count is not None:
+        frames = tuple(cache.get(fingerprint(key, i)) for i in range(count))
+        if all(df is not None for df in frames):
+            return tuple(map(missing_as_nan, frames))
+    frames = tuple(func())
+    for i, df in enumerate(frames):
+        cache.put(fingerprint(key, i), df)
+    # the count is written last, so it marks complete entries
+    cache.put_object(key, len(frames))
+    return frames
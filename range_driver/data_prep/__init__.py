@@ -1,15 +1,34 @@
+import os
+import shutil
+from functools import partial
+
 import pandas as pd
 import numpy as np
+try:
+    import dask.dataframe as dd
+    from dask.dataframe.utils import clear_known_categories
+except ImportError:     # only needed for out-of-core reading, see py:read_partitioned_detections()
+    dd = clear_known_categories = None
+try:
+    import pyarrow.dataset
+    import pyarrow.parquet as pq
+except ImportError:     # only needed for reading Parquet datasets in batches, see py:iter_detections_parquet()
+    pyarrow = pq = None
 
 from .metadata import *
 from .tidal import *
-from range_driver.geo_utils import dist_m
+from range_driver.geo_utils import dist_matrix_m
 from range_driver.utils import *
 from range_driver.pandas_utils import *
 from range_driver.dict_utils import *
 
-from .metadata import read_otn_metadata
+from .metadata import (read_otn_metadata, read_vendor_tag_specs, device_columns, device_codes,
+                       device_categories, encode_devices, merge_devices, make_device_dimensions,
+                       has_device_attributes, resolve_attributes)
+from .timestamps import parse_datetimes
 from .environment import add_kadlu_env_data
+from .parallel import group_sizes, serial_executor
+from range_driver.cache import missing_as_nan
 
 # ----------------------------------------------------------------------------
 # receiver/tag metadata enhancements
@@ -57,29 +76,26 @@ def dist_str_th(dist, dist_th):
 
 
 # ----------------------------------------------------------------------------
-def calc_station_dists_m(deploy_lat_lon):
+def calc_station_dists_m(deploy_lat_lon, method="vincenty"):
     """
     Calculate geodesic distances between stations.
 
     :param deploy_lat_lon: DataFrame with station latitude and longitude columns (in that order).
     :type deploy_lat_lon: pandas.DataFrame
 
+    :param method: Distance calculation of py:range_driver.geo_utils.dist_matrix_m(), "vincenty"
+        (WGS84, error < 1 mm), "haversine" (spherical, relative error <= 0.56%), or "geodesic"
+        (exact WGS84, one geopy call per station pair)
+    :type method: str
+
     :return: A dataframe containing the distance (in meters) between each pair of stations.
     :rtype: pandas.DataFrame
 
     """
-
-    station_dists_m = pd.DataFrame(None, columns=deploy_lat_lon.index, index=deploy_lat_lon.index)
-    # uses geodesic distance calculation from geo_utils module
-    for stationA in deploy_lat_lon.index:
-        station_dists_m.loc[stationA, stationA] = 0
-        next_station = get_next_index(deploy_lat_lon, stationA)
-        for stationB in deploy_lat_lon.loc[next_station:, :].index:
-            dABm = dist_m(deploy_lat_lon.loc[stationA, :].values,
-                          deploy_lat_lon.loc[stationB, :].values)
-            station_dists_m.loc[stationA, stationB] = dABm
-            station_dists_m.loc[stationB, stationA] = dABm
-    return station_dists_m
+    # uses batched geodesic distance calculation from geo_utils module
+    lat_lon = deploy_lat_lon.values.astype(float)
+    return pd.DataFrame(dist_matrix_m(lat_lon[:, 0], lat_lon[:, 1], method=method),
+                        columns=deploy_lat_lon.index, index=deploy_lat_lon.index)
 
 def estimate_det_max(drs):
     """Estimate maximum detection rate over majority of time
@@ -113,17 +129,160 @@ def dr_estimate_and_cutoff(drs):
         - **cutoff_loc** - raw index of first valid detection bin
     """
     dr_max = estimate_det_max(drs)
+    above = drs[drs>dr_max*1.05] if dr_max is not None else drs.iloc[:0]
     if dr_max is None:
         cutoff_loc = 0
         dr_max = drs.max()
+    elif above.empty:
+        # no init sequence above the estimate
+        cutoff_loc = 0
     else:
-        cutoff = drs[drs>dr_max*1.05].index[-1]
+        cutoff = above.index[-1]
         cutoff_loc = min(drs.index.get_loc(cutoff)+1, len(drs)-1)
     return dr_max, drs.index[cutoff_loc], cutoff_loc
 
+
+def dr_estimates_and_cutoffs(drs, gsize):
+    """
+    py:dr_estimate_and_cutoff() for many detection rate sequences at once, with the same results.
+
+    :param drs: Detection rate sequences over fixed time intervals, one after the other
+    :type drs: numpy.ndarray
+
+    :param gsize: Length of each sequence, at least 1
+    :type gsize: numpy.ndarray
+
+    :return:
+        - **dr_max**     - maximum detection rate for majority of time of each sequence
+        - **cutoff_loc** - position of the first valid detection bin within each sequence
+    """
+    num_groups = len(gsize)
+    if not num_groups:
+        return np.zeros(0, dtype=drs.dtype), np.zeros(0, dtype=int)
+    gstart = np.cumsum(gsize) - gsize
+    group = np.repeat(np.arange(num_groups), gsize)
+
+    # estimate_det_max(): cdf of the rates and the sorted slopes of the cdf, NaNs last
+    drcdf = drs[np.lexsort((drs, group))]
+    drdd = np.empty(len(drs), dtype=drcdf.dtype)
+    drdd[1:] = drcdf[1:] - drcdf[:-1]
+    drdd[gstart] = np.nan
+    drdd = drdd[np.lexsort((drdd, group))]
+    # median of the slopes above 1e-8, which follow the smaller ones in each group
+    num_small = np.bincount(group, weights=drdd <= 1e-8, minlength=num_groups).astype(int)
+    num_pos = np.bincount(group, weights=drdd > 1e-8, minlength=num_groups).astype(int)
+    has_pos = num_pos > 0
+    mid = (gstart + num_small + num_pos // 2)[has_pos]
+    odd = (num_pos % 2 == 1)[has_pos]
+    low_val = np.full(num_groups, np.nan)
+    low_val[has_pos] = np.where(odd, drdd[mid], (drdd[mid - 1] + drdd[mid]) / 2)
+    # first slope above 3 * low_val, the cdf value before it is the estimate
+    large_th = np.repeat(3 * low_val, gsize)
+    num_not_large = np.bincount(group, weights=drdd <= large_th, minlength=num_groups).astype(int)
+    has_large = np.bincount(group, weights=drdd > large_th, minlength=num_groups) > 0
+    # like get_next_index(), the position before the first one is the last one
+    prev_pos = np.where(num_not_large > 0, num_not_large - 1, gsize - 1)
+    dr_max = np.where(has_large, drcdf[gstart + prev_pos], np.fmax.reduceat(drs, gstart))
+
+    # cutoff after the last rate above the estimate
+    pos = np.arange(len(drs)) - np.repeat(gstart, gsize)
+    above = drs > np.repeat(dr_max * 1.05, gsize)
+    last_above = np.maximum.reduceat(np.where(above, pos, -1), gstart)
+    cutoff_loc = np.where(has_large & (last_above >= 0), np.minimum(last_above + 1, gsize - 1), 0)
+    return dr_max, cutoff_loc
+
+
+def normalize_detection_rates(df_drs, dfield='detection_rate', executor=None):
+    """
+    Drop the bins of the init sequence of each transmitter/receiver group, as determined by
+    py:dr_estimate_and_cutoff(), and divide the detection rates by their maximum in the remaining
+    bins of the group. All groups are processed at once, see py:dr_estimates_and_cutoffs().
+
+    :param df_drs: Detection rates per bin in time order, with 'Transmitter' and 'Receiver'
+        columns or index levels
+    :type df_drs: pandas.DataFrame
+
+    :param dfield: Column to estimate the detection rate from
+    :type dfield: str
+
+    :param executor: Runs py:dr_estimates_and_cutoffs() on chunks of groups, serially if None
+    :type executor: GroupExecutor
+
+    :return: Rows of the valid bins, ordered by (Transmitter, Receiver), with normalized
+             'detection_rate'
+    :rtype: pandas.DataFrame
+    """
+    if executor is None:
+        executor = serial_executor
+    gcodes, _ = rt_group_codes(df_drs, ['Transmitter', 'Receiver'])
+    order, gsize = group_sizes(gcodes)
+    n = len(order)
+    gstart = np.cumsum(gsize) - gsize
+
+    drs = df_drs[dfield].values[order]
+    _, cutoff_loc = executor.map_groups(dr_estimates_and_cutoffs, gsize, rows=(drs,))
+    keep = np.arange(n) - np.repeat(gstart, gsize) >= np.repeat(cutoff_loc, gsize)
+    drs = drs[keep]
+    kept_size = gsize - cutoff_loc
+    # TODO: the following brute force correction is not needed in most cases
+    d_max = np.fmax.reduceat(drs, np.cumsum(kept_size) - kept_size) if n else drs
+    df_drs = df_drs.take(order[keep])
+    df_drs['detection_rate'] = drs / np.repeat(d_max, kept_size)
+    return df_drs
+
 # ----------------------------------------------------------------------------
 # calculate interval length between detections; move init sequence to separate df
-def process_intervals(detection_df, metadata):
+def split_init_sequences(tns, labels, gsize, min_delay):
+    """
+    Detection intervals and init sequence split of consecutive receiver/transmitter groups, the
+    per-group work of py:process_intervals().
+
+    :param tns: Detection times, group by group
+    :type tns: numpy.ndarray of datetime64[ns]
+
+    :param labels: Index label of each detection
+    :type labels: numpy.ndarray
+
+    :param gsize: Number of detections of each group
+    :type gsize: numpy.ndarray
+
+    :param min_delay: Shortest regular interval of each group in seconds, detections with shorter
+        intervals belong to the init sequence
+    :type min_delay: numpy.ndarray
+
+    :return: - **interval** (`numpy.ndarray`) - seconds to the next detection of the group, the
+               last detection repeats the interval before it, NaN for single detections
+             - **init_split** (`numpy.ndarray`) - position of the first detection after the init
+               sequence within each group
+    """
+    n = len(tns)
+    pos = np.arange(n)
+    gstart = np.cumsum(gsize) - gsize
+    gfirst = np.repeat(gstart, gsize)       # position of first row of each row's group
+    glast = gfirst + np.repeat(gsize, gsize) - 1
+    multi = glast > gfirst                  # rows of groups with more than one detection
+
+    # interval to next detection within the group, last one copies the one before
+    interval = np.full(n, np.nan)
+    interval[:-1] = (tns[1:] - tns[:-1]) / sec1.to_timedelta64()
+    interval[glast] = np.nan
+    is_last = multi & (pos == glast)
+    interval[is_last] = interval[pos[is_last] - 1]
+
+    # ignore time range with short signal intervals at beginning
+    short = multi & (interval < np.repeat(min_delay, gsize))
+    # split after the short interval with the largest index label in each group
+    group = np.repeat(np.arange(len(gsize)), gsize)
+    short_df = pd.DataFrame({'group': group[short], 'label': labels[short], 'pos': pos[short]})
+    short_last = (short_df.sort_values(['group', 'label'], kind='mergesort')
+                  .drop_duplicates('group', keep='last')
+                  .set_index('group')['pos'])
+    init_split = np.zeros(len(gsize), dtype=gstart.dtype)
+    init_split[short_last.index] = short_last.values + 1 - gstart[short_last.index]
+    return interval, init_split
+
+
+def process_intervals(detection_df, metadata, engine="vectorized", executor=None):
     """
     Calculate detection interval lengths and split out init sequences
 
@@ -135,12 +294,79 @@ def process_intervals(detection_df, metadata):
         be added to metadata.
     :type metadata: dict
 
+    :param engine: "vectorized" (default) processes all receiver/transmitter groups in a single
+        pass over the detections sorted once by group. "loop" uses the original per-group loop in
+        py:process_intervals_loop(). Both produce identical results.
+    :type engine: str
+
+    :param executor: Runs the per-group work of the vectorized engine (see
+        py:split_init_sequences()) on chunks of groups, serially if None
+    :type executor: GroupExecutor
+
     :return: - **df_dets** (`pandas.DataFrame`) - DataFrame containing the detection events.
              - **df_inits** (`pandas.DataFrame`) - DataFrame containing the detections from the
                short-interval initial sequence
              - **rt_groups** (`pandas.DataFrame`) - DataFrame containing the summary of
                receiver/transmitter groups
     """
+    if engine == "loop":
+        return process_intervals_loop(detection_df, metadata)
+    elif engine != "vectorized":
+        raise ValueError("Unknown process_intervals engine: {}".format(engine))
+
+    if executor is None:
+        executor = serial_executor
+    # group number of each row, in the (sorted) order used by groupby, -1 for NaN keys
+    gcodes, pairs = rt_group_codes(detection_df)
+    # sort once by group, keeping the original row order within each group
+    order, gsize = group_sizes(gcodes)
+    gcodes = gcodes[order]
+    tdf = detection_df.take(order)
+
+    n = len(tdf)
+    pos = np.arange(n)
+    gstart = np.cumsum(gsize) - gsize
+    tns = tdf['datetime'].values
+    ugroups = gcodes[gstart]
+    transmitters = pairs.get_level_values('Transmitter')[ugroups]
+    min_delay = metadata.transmitter.loc[transmitters, 'Transmitter.Min delay'].values * 0.9
+    interval, init_split = executor.map_groups(split_init_sequences, gsize,
+                                               rows=(tns, tdf.index.values), groups=(min_delay,))
+    tdf['interval'] = interval
+    init_split = gstart + init_split
+    # groups with a single detection are dropped, a short interval at the very end leaves no
+    # valid detections
+    gkeep = gsize > 1
+    gvalid = gkeep & (init_split < gstart + gsize)
+    for gi in np.flatnonzero(gkeep & ~gvalid):
+        print("Removing group {} - no valid detections".format(
+            " - ".join(tdf.iloc[gstart[gi]][['Receiver', 'Transmitter']])))
+
+    cutoff_t = tns[np.minimum(init_split, n - 1)]
+    row_cutoff = np.repeat(cutoff_t, gsize)
+    row_valid = np.repeat(gvalid, gsize)
+    is_det = row_valid & (tns >= row_cutoff)
+    is_init = row_valid & (tns < row_cutoff)
+    df_dets = tdf[is_det]
+    df_inits = tdf[is_init]
+
+    # summary of each group: start at cutoff, end at last valid detection
+    last_det = pd.Series(pos[is_det]).groupby(gcodes[is_det]).max()
+    gpairs = pairs[ugroups[gvalid]]
+    rt_groups = pd.DataFrame({'Receiver': gpairs.get_level_values('Receiver'),
+                              'Transmitter': gpairs.get_level_values('Transmitter'),
+                              'tstart': cutoff_t[gvalid],
+                              'tend': tns[last_det.loc[ugroups[gvalid]].values]},
+                             columns=['Receiver', 'Transmitter', 'tstart', 'tend'])
+    metadata.rt_groups = rt_groups.set_index(['Receiver', 'Transmitter'])
+    return df_dets, df_inits, metadata.rt_groups
+
+
+def process_intervals_loop(detection_df, metadata):
+    """
+    Per-group loop implementation of py:process_intervals(), see there for parameters and return
+    values.
+    """
 
 
     df_dets = []
@@ -150,7 +376,7 @@ def process_intervals(detection_df, metadata):
                             ['str', 'str', 'datetime64[ns]', 'datetime64[ns]'])
         .set_index(['Receiver','Transmitter']))
 
-    for gn, tdf in detection_df.groupby(['Receiver','Transmitter']):
+    for gn, tdf in iter_rt_groups(detection_df):
         #print(" / ".join(gn))
         min_delay = metadata.transmitter.loc[gn[1], 'Transmitter.Min delay'] * 0.9
         tdf['interval'] = calc_intervals(tdf.set_index("datetime")).values
@@ -179,7 +405,8 @@ def process_intervals(detection_df, metadata):
     return df_dets, df_inits, metadata.rt_groups
 
 
-def detection_rate_grid(detection_df, time_bin_length, metadata, auto_dr=False):
+def detection_rate_grid(detection_df, time_bin_length, metadata, auto_dr=False,
+                        engine="vectorized", executor=None, origin=None):
     """
     Group detections into timestamp bins and analyze the detections on a group-level. Append
     aggregated bin data to the end of the detections DF.
@@ -197,6 +424,22 @@ def detection_rate_grid(detection_df, time_bin_length, metadata, auto_dr=False):
     :param auto_dr: Automatically estimate tag rate programming
     :type auto_dr: bool
 
+    :param engine: "vectorized" (default) counts detections with one grouped aggregation over
+        receiver, transmitter, and time bin and expands the `tstart`/`tend` intervals of
+        `metadata`.rt_groups into the zero-filled grid of active pairs, and estimates the tag
+        rates of all pairs at once (see py:normalize_detection_rates()). "loop" uses the original
+        per-time-bin loop in py:detection_rate_grid_loop() and per-pair `auto_dr` loop. Both
+        produce identical results.
+    :type engine: str
+
+    :param executor: Runs the per-group work of `auto_dr` on chunks of groups, serially if None
+    :type executor: GroupExecutor
+
+    :param origin: Start of the first time bin, midnight of the first detection by default (see
+        py:time_bin_index()). Partitions of the detections share the bins of the whole with the
+        origin of the whole. Not supported by the "loop" engine.
+    :type origin: pandas.Timestamp
+
     :return: - **detection_df** (`pandas.DataFrame`) - DataFrame containing the detection events,
                grouped into timestamp bins. New columns have been added that include the detection
                rate and counts for that bin. New rows have been added, containingaggregated data for
@@ -204,48 +447,409 @@ def detection_rate_grid(detection_df, time_bin_length, metadata, auto_dr=False):
              - **event_bin_split** (`int`) - The row number of the first new row.
 
     """
+    if engine == "loop":
+        if origin is not None:
+            raise ValueError("The loop engine of detection_rate_grid has no origin parameter")
+        return detection_rate_grid_loop(detection_df, time_bin_length, metadata, auto_dr)
+    elif engine != "vectorized":
+        raise ValueError("Unknown detection_rate_grid engine: {}".format(engine))
+
     time_bin_length = pd.Timedelta(time_bin_length)
-    df_drs = []
-    df_detg = []
-    tgrouper = detection_df.set_index('datetime').groupby(pd.Grouper(freq=time_bin_length))
-    for tg, tgroup in tgrouper:
-        # detection count in time window
-        df_tdr = tgroup.groupby(['Receiver', 'Transmitter']).size()
-        rt_detected = df_tdr.index
-        # determine which transmitters are still between their first and last detection
-        active_rt = metadata.rt_groups[(metadata.rt_groups['tstart'] <= tg+time_bin_length) & 
-                                  (metadata.rt_groups['tend'] >= tg)]
-        # append zero counts for missing detections
-        missing_rt = pd.Series(0, index=active_rt.index.difference(rt_detected.values))
-        df_tdr = df_tdr.append(missing_rt)
-        df_tdr = pd.DataFrame(df_tdr, columns=['detection_count'])
-        df_tdr['interval'] = time_bin_length.seconds / df_tdr.loc[rt_detected, 'detection_count']
-        df_tdr['datetimeb'] = tg
-        df_tdr = df_tdr.set_index(['datetimeb'], append=True)
-        
-        df_drs.append(df_tdr)
-        # individual detection events within this time window
-        tgroup = tgroup.reset_index()
-        tgroup['datetimeb'] = tg
-        df_detg.append(tgroup)
-    df_drs = pd.concat(df_drs)
-    df_detg = pd.concat(df_detg)
+    # individual detection events, stable sorted by time as when grouping with a pd.Grouper
+    df_detg = detection_df[detection_df['datetime'].notna()]
+    order = np.argsort(df_detg['datetime'].values, kind='stable')
+    df_detg = df_detg.set_index('datetime').iloc[order].reset_index()
+    bin_idx, origin = time_bin_index(df_detg['datetime'], time_bin_length, origin)
+    df_detg['datetimeb'] = origin + bin_idx * time_bin_length
+    df_detg.index = np.arange(len(df_detg)) - np.searchsorted(bin_idx, bin_idx)
+
+    pairs, det_code = rt_pair_codes(df_detg, metadata.rt_groups)
+    # one aggregation over (bin, pair)
+    det_keys, det_counts = np.unique(bin_idx * len(pairs) + det_code, return_counts=True)
+    num_bins = int(bin_idx[-1]) + 1 if len(bin_idx) else 0
+    df_drs = bin_counts_grid(det_keys, det_counts, pairs, num_bins, origin, time_bin_length,
+                             metadata.rt_groups)
+    return merge_detection_rates(df_drs, df_detg, time_bin_length, metadata, auto_dr, engine,
+                                 executor)
+
+
+def time_bin_index(datetimes, time_bin_length, origin=None):
+    """
+    Number of the fixed length time bin that each timestamp falls into.
+
+    :param datetimes: Timestamps to assign to bins
+    :type datetimes: pandas.Series
+
+    :param time_bin_length: Length of time bins
+    :type time_bin_length: pandas.Timedelta
+
+    :param origin: Start of the first bin. Defaults to midnight of the first day, the same as the
+        default for pd.Grouper(freq=time_bin_length).
+    :type origin: pandas.Timestamp
+
+    :return: - **bin_idx** (`numpy.ndarray`) - int64 bin numbers, counting from `origin`
+             - **origin** (`pandas.Timestamp`) - start of bin 0
+    """
+    if origin is None:
+        origin = datetimes.min().floor('D')
+    tns = (datetimes.values - origin.to_datetime64()).astype('int64')
+    return tns // time_bin_length.value, origin
+
+
+def rt_group_codes(df, keys=('Receiver', 'Transmitter')):
+    """
+    Group number of each row by the device names in `keys`, the same as
+    df.groupby(list(keys), sort=True).ngroup(), computed from the integer device codes (see
+    py:device_codes()) instead of hashing name strings.
+
+    :param df: DataFrame with device name columns or index levels `keys`, preferably categoricals
+        as returned by py:encode_devices()
+    :type df: pandas.DataFrame
+
+    :param keys: Device name columns to group by
+    :type keys: list
+
+    :return: - **gcodes** (`numpy.ndarray`) - int64 group number of each row, -1 if a name is
+               missing
+             - **groups** (`pandas.MultiIndex`) - sorted device names of the groups
+    """
+    codes, names = zip(*(device_codes(df[key] if key in df.columns else
+                                      df.index.get_level_values(key)) for key in keys))
+    shape = tuple(len(n) for n in names)
+    valid = np.logical_and.reduce([c >= 0 for c in codes])
+    flat = np.ravel_multi_index([c[valid] for c in codes], shape) if all(shape) else \
+        np.zeros(0, dtype='int64')
+    num_keys = int(np.prod(shape, dtype='int64'))
+    if num_keys <= 2 * len(flat) + 1024:
+        # number the occurring keys via a dense table
+        present = np.bincount(flat, minlength=num_keys) > 0
+        ukeys = np.flatnonzero(present)
+        inverse = (np.cumsum(present) - 1)[flat]
+    else:
+        ukeys, inverse = np.unique(flat, return_inverse=True)
+    gcodes = np.full(len(valid), -1, dtype='int64')
+    gcodes[valid] = inverse
+    levels = np.unravel_index(ukeys, shape) if all(shape) else [ukeys] * len(keys)
+    groups = pd.MultiIndex.from_arrays([n[l] for n, l in zip(names, levels)], names=list(keys))
+    return gcodes, groups
+
+
+def iter_rt_groups(df, keys=('Receiver', 'Transmitter')):
+    """Iterate over (device names, group DataFrame) like over df.groupby(list(keys)), grouping by
+    integer device codes (see py:rt_group_codes())"""
+    gcodes, groups = rt_group_codes(df, keys)
+    for code, group in df.groupby(np.where(gcodes >= 0, gcodes, np.nan)):
+        yield groups[int(code)], group
+
+
+def rt_group_views(df, keys=('Receiver', 'Transmitter')):
+    """Lazy py:GroupViews of the same groups as py:iter_rt_groups(), which stores row positions
+    instead of a copy of each group"""
+    gcodes, groups = rt_group_codes(df, keys)
+    return GroupViews(df, gcodes, groups)
 
+
+def rt_pair_mask(df, pairs):
+    """Boolean mask of the rows of `df` whose (Receiver, Transmitter) columns or index levels are
+    one of `pairs`"""
+    gcodes, groups = rt_group_codes(df)
+    return np.append(groups.isin(pairs), False)[gcodes]
+
+
+def splice_rt_groups(old, new, pairs, like=None):
+    """
+    Replace the rows of the receiver/transmitter `pairs` in `old` by the rows of `new`, e.g. to
+    update results of py:process_intervals() for the pairs with new detections.
+
+    :param like: Optional DataFrame whose device name categories the result shares, see
+        py:encode_devices()
+    :type like: pandas.DataFrame
+
+    :return: Rows ordered by group like the results of py:process_intervals(), keeping the row
+             order within each group
+    :rtype: pandas.DataFrame
+    """
+    old = old[~rt_pair_mask(old, pairs)]
+    if like is not None:
+        old, new = encode_devices(old, like=like), encode_devices(new, like=like)
+    df = pd.concat((old, new))
+    gcodes, _ = rt_group_codes(df)
+    return df.take(np.argsort(gcodes, kind='stable'))
+
+
+def rt_pair_codes(df_detg, rt_groups):
+    """
+    Integer codes for the receiver/transmitter pair of each detection.
+
+    :param df_detg: Detection events with 'Receiver' and 'Transmitter' columns
+    :type df_detg: pandas.DataFrame
+
+    :param rt_groups: Receiver/transmitter groups indexed by (Receiver, Transmitter)
+    :type rt_groups: pandas.DataFrame
+
+    :return: - **pairs** (`pandas.MultiIndex`) - sorted union of detected and grouped pairs
+             - **det_code** (`numpy.ndarray`) - position in `pairs` for each row of `df_detg`
+    """
+    gcodes, det_pairs = rt_group_codes(df_detg)
+    pairs = det_pairs.union(rt_groups.index)
+    det_code = pairs.get_indexer(det_pairs)[gcodes]
+    return pairs, det_code
+
+
+def bin_counts_grid(det_keys, det_counts, pairs, num_bins, origin, time_bin_length, rt_groups):
+    """
+    Detection counts for all receiver/transmitter pairs that are active in a time bin.
+
+    Pairs that are between their `tstart` and `tend` in `rt_groups` without any detection in a bin
+    receive a zero count. Rows are ordered as in py:detection_rate_grid_loop(): by bin, then
+    detected pairs before missing pairs, each sorted by (Receiver, Transmitter).
+
+    :param det_keys: Sorted unique keys `bin * len(pairs) + pair code` of bins with detections
+    :type det_keys: numpy.ndarray
+
+    :param det_counts: Detection count for each key in `det_keys`
+    :type det_counts: numpy.ndarray
+
+    :param pairs: Receiver/transmitter pairs, as returned by py:rt_pair_codes()
+    :type pairs: pandas.MultiIndex
+
+    :param num_bins: Number of time bins, starting at `origin`
+    :type num_bins: int
+
+    :param origin: Start of time bin 0
+    :type origin: pandas.Timestamp
+
+    :param time_bin_length: Length of time bins
+    :type time_bin_length: pandas.Timedelta
+
+    :param rt_groups: Receiver/transmitter groups with 'tstart' and 'tend' columns
+    :type rt_groups: pandas.DataFrame
+
+    :return: DataFrame with 'detection_count' and 'interval' columns, indexed by
+             (Receiver, Transmitter, datetimeb)
+    :rtype: pandas.DataFrame
+    """
+    bin_ns = time_bin_length.value
+    num_pairs = len(pairs)
+
+    # expand the [tstart, tend] interval of each group into the bins it overlaps
+    origin_ns = origin.value
+    tstart = pd.to_datetime(rt_groups['tstart']).values.astype('int64') - origin_ns
+    tend = pd.to_datetime(rt_groups['tend']).values.astype('int64') - origin_ns
+    first_bin = np.maximum(-((bin_ns - tstart) // bin_ns), 0)   # ceil((tstart - bin) / bin)
+    last_bin = np.minimum(tend // bin_ns, num_bins - 1)
+    group_code, active_bin = expand_ranges(first_bin, last_bin + 1)
+    active_keys = active_bin * num_pairs + pairs.get_indexer(rt_groups.index)[group_code]
+    missing_keys = np.setdiff1d(active_keys, det_keys)
+
+    keys = np.concatenate((det_keys, missing_keys))
+    counts = np.concatenate((det_counts, np.zeros(len(missing_keys), dtype=det_counts.dtype)))
+    is_missing = np.arange(len(keys)) >= len(det_keys)
+    bins, codes = np.divmod(keys, num_pairs)
+    # missing pairs follow detected pairs within each bin
+    order = np.lexsort((codes, is_missing, bins))
+    bins, codes, counts = bins[order], codes[order], counts[order].astype('int64')
+
+    rt = pairs[codes]
+    df_drs = pd.DataFrame({'detection_count': counts},
+                          index=pd.MultiIndex.from_arrays(
+                              [rt.get_level_values(0), rt.get_level_values(1),
+                               origin + bins * time_bin_length],
+                              names=['Receiver', 'Transmitter', 'datetimeb']))
+    df_drs['interval'] = time_bin_length.total_seconds() / df_drs['detection_count'].where(counts > 0)
+    return df_drs
+
+
+def detection_rate_cube(detection_df, metadata, base_bin_length):
+    """
+    Detection counts per receiver/transmitter pair at the finest time resolution of interest.
+    Coarser time bins are derived from these counts by py:detection_rate_level(), without
+    reprocessing the individual detections.
+
+    :param detection_df: Dataframe containing the detection events, e.g. df_dets as returned by
+        py:process_intervals()
+    :type detection_df: pandas.DataFrame
+
+    :param metadata: Metadata associated with the detection events, including rt_groups
+    :type metadata: sklearn.utils.Bunch
+
+    :param base_bin_length: Finest time bin length. Levels must use a whole multiple of it.
+    :type base_bin_length: str or pandas.Timedelta
+
+    :return: Bunch with the time sorted detection events `events`, their base bin number
+             `bin_idx`, the bin `origin`, receiver/transmitter `pairs`, and the base level counts
+             `det_keys`/`det_counts` (see py:bin_counts_grid())
+    :rtype: sklearn.utils.Bunch
+    """
+    base_bin_length = pd.Timedelta(base_bin_length)
+    events = time_sorted_events(detection_df)
+    bin_idx, origin = time_bin_index(events['datetime'], base_bin_length)
+    pairs, det_code = rt_pair_codes(events, metadata.rt_groups)
+    det_keys, det_counts = np.unique(bin_idx * len(pairs) + det_code, return_counts=True)
+    return Bunch(base_bin_length=base_bin_length, origin=origin, events=events, bin_idx=bin_idx,
+                 pairs=pairs, det_keys=det_keys, det_counts=det_counts)
+
+
+def time_sorted_events(detection_df):
+    """Detections with a timestamp, stable sorted by time and numbered from 0, as held by the
+    detection rate cube"""
+    events = detection_df[detection_df['datetime'].notna()]
+    order = np.argsort(events['datetime'].values, kind='stable')
+    return events.set_index('datetime').iloc[order].reset_index()
+
+
+def update_detection_rate_cube(cube, detection_df, metadata, pairs):
+    """
+    Replace the events and counts of the receiver/transmitter `pairs` in detection rate `cube`,
+    e.g. after new detections of these pairs were processed. The counts of the other pairs are
+    kept, unless the new events start before the cube's first day. Gives the same result as
+    py:detection_rate_cube() on all events.
+
+    :param cube: Detection rate cube as returned by py:detection_rate_cube()
+    :type cube: sklearn.utils.Bunch
+
+    :param detection_df: Detection events of `pairs`, e.g. df_dets of py:process_intervals()
+    :type detection_df: pandas.DataFrame
+
+    :param metadata: Metadata associated with the detection events, including the rt_groups of
+        all events
+    :type metadata: sklearn.utils.Bunch
+
+    :param pairs: Receiver/transmitter pairs to replace
+    :type pairs: pandas.MultiIndex
+
+    :return: Updated detection rate cube
+    :rtype: sklearn.utils.Bunch
+    """
+    kept = cube.events[~rt_pair_mask(cube.events, pairs)]
+    added = time_sorted_events(detection_df)
+    events = pd.concat((encode_devices(kept, like=added), encode_devices(added, like=kept)),
+                       ignore_index=True)
+    # ties in time are ordered by group, as in the group ordered events of process_intervals()
+    gcodes, _ = rt_group_codes(events)
+    order = np.lexsort((gcodes, events['datetime'].values.view('int64')))
+    events = events.take(order).reset_index(drop=True)
+
+    bin_idx, origin = time_bin_index(events['datetime'], cube.base_bin_length)
+    new_pairs, det_code = rt_pair_codes(events, metadata.rt_groups)
+    num_pairs = len(new_pairs)
+    if origin == cube.origin:
+        # keep the counts of the other pairs, renumbered for the new pairs
+        base_bins, codes = np.divmod(cube.det_keys, len(cube.pairs))
+        keep = ~cube.pairs.isin(pairs)[codes]
+        kept_keys = base_bins[keep] * num_pairs + new_pairs.get_indexer(cube.pairs)[codes[keep]]
+        replaced = new_pairs.isin(pairs)[det_code]
+        new_keys, new_counts = np.unique(bin_idx[replaced] * num_pairs + det_code[replaced],
+                                         return_counts=True)
+        det_keys = np.concatenate((kept_keys, new_keys))
+        det_counts = np.concatenate((cube.det_counts[keep], new_counts))
+        order = np.argsort(det_keys)
+        det_keys, det_counts = det_keys[order], det_counts[order]
+    else:
+        det_keys, det_counts = np.unique(bin_idx * num_pairs + det_code, return_counts=True)
+    return Bunch(base_bin_length=cube.base_bin_length, origin=origin, events=events,
+                 bin_idx=bin_idx, pairs=new_pairs, det_keys=det_keys, det_counts=det_counts)
+
+
+def detection_rate_level(cube, time_bin_length, metadata, auto_dr=False, executor=None):
+    """
+    Derive detection rates for `time_bin_length` by aggregating the base counts of `cube`.
+    Gives the same result as py:detection_rate_grid() on the detections the cube was built from.
+
+    Example::
+
+        cube = detection_rate_cube(df_dets, mdb, "10min")
+        levels = {tbl: detection_rate_level(cube, tbl, mdb) for tbl in ["10min", "1h", "6h"]}
+
+    :param cube: Detection rate cube as returned by py:detection_rate_cube()
+    :type cube: sklearn.utils.Bunch
+
+    :param time_bin_length: Time bin length, a whole multiple of the cube's base_bin_length
+    :type time_bin_length: str or pandas.Timedelta
+
+    :param metadata: Metadata associated with the detection events, including rt_groups
+    :type metadata: sklearn.utils.Bunch
+
+    :param auto_dr: Automatically estimate tag rate programming (per level)
+    :type auto_dr: bool
+
+    :param executor: Runs the per-group work of `auto_dr` on chunks of groups, serially if None
+    :type executor: GroupExecutor
+
+    :return: - **detection_df** (`pandas.DataFrame`) - see py:detection_rate_grid()
+             - **event_bin_split** (`int`) - The row number of the first bin row.
+    """
+    time_bin_length = pd.Timedelta(time_bin_length)
+    factor, remainder = divmod(time_bin_length.value, cube.base_bin_length.value)
+    if factor < 1 or remainder:
+        raise ValueError("Time bin length {} is not a multiple of the base bin length {}".format(
+            time_bin_length, cube.base_bin_length))
+
+    bin_idx = cube.bin_idx // factor
+    df_detg = cube.events.copy(deep=False)
+    df_detg['datetimeb'] = cube.origin + bin_idx * time_bin_length
+    df_detg.index = np.arange(len(df_detg)) - np.searchsorted(bin_idx, bin_idx)
+
+    # roll up base counts into the coarser bins, keys stay sorted by (bin, pair)
+    num_pairs = len(cube.pairs)
+    base_bins, codes = np.divmod(cube.det_keys, num_pairs)
+    det_keys, key_inv = np.unique((base_bins // factor) * num_pairs + codes, return_inverse=True)
+    det_counts = np.bincount(key_inv, weights=cube.det_counts,
+                             minlength=len(det_keys)).astype(cube.det_counts.dtype)
+    num_bins = int(bin_idx[-1]) + 1 if len(bin_idx) else 0
+    df_drs = bin_counts_grid(det_keys, det_counts, cube.pairs, num_bins, cube.origin,
+                             time_bin_length, metadata.rt_groups)
+    return merge_detection_rates(df_drs, df_detg, time_bin_length, metadata, auto_dr,
+                                 executor=executor)
+
+
+def merge_detection_rates(df_drs, df_detg, time_bin_length, metadata, auto_dr=False,
+                          engine="vectorized", executor=None):
+    """
+    Add metadata and detection rates to the bin counts and combine them with the detection events.
+    Used by py:detection_rate_grid(), see there for the return values.
+
+    :param df_drs: Detection counts per bin, as returned by py:bin_counts_grid()
+    :type df_drs: pandas.DataFrame
+
+    :param df_detg: Detection events with 'datetimeb' column
+    :type df_detg: pandas.DataFrame
+
+    :param engine: "vectorized" (default) normalizes the detection rates of all groups at once
+        with py:normalize_detection_rates() if `auto_dr` is set, "loop" uses the original
+        per-group loop. Both produce identical results.
+    :type engine: str
+
+    :param executor: See py:normalize_detection_rates()
+    :type executor: GroupExecutor
+    """
     #if 'Receiver.ID' not in df_drs:
     drs_idx = index_columns(df_drs)
-    df_drs = (
-        clean_raw_detections(df_drs.reset_index(),
-            dates=False, rt_ids=True, select_cols=False)
-        .merge(metadata.receiver).merge(metadata.transmitter))
+    # device names of bins and events share categorical dtypes, joins run on their codes
+    df_drs = encode_devices(df_drs.reset_index(), like=df_detg)
+    df_detg = encode_devices(df_detg, like=df_drs)
+    df_drs = clean_raw_detections(df_drs, dates=False, rt_ids=True, select_cols=False)
+    dimensions = metadata.get('dimensions')
+    if dimensions is not None:
+        # normalized metadata: keep the bins narrow, take the delays from the dimension tables
+        keep = has_device_attributes(df_drs, dimensions)
+        if not keep.all():
+            df_drs = df_drs[keep].reset_index(drop=True)
+        avg_delay = resolve_attributes(df_drs, dimensions, ['Transmitter.Avg delay']).iloc[:, 0]
+    else:
+        df_drs = merge_devices(merge_devices(df_drs, metadata.receiver), metadata.transmitter)
+        avg_delay = df_drs['Transmitter.Avg delay']
     df_drs.set_index(drs_idx, inplace=True)
 
-    df_drs['detection_rate'] = df_drs['detection_count'] * (df_drs['Transmitter.Avg delay'] / time_bin_length.seconds)
+    df_drs['detection_rate'] = df_drs['detection_count'] * (avg_delay.values / time_bin_length.total_seconds())
     #df_drs['interval'] = df_drs['Transmitter.Avg delay'] / df_drs['detection_rate']
 
-    if auto_dr:
+    if auto_dr and engine != "loop":
+        df_drs = normalize_detection_rates(df_drs, executor=executor)
+    elif auto_dr:
         drs = []
         dfield = 'detection_rate' # 'detection_count'
-        for _, df_tdr in df_drs.groupby(['Transmitter', 'Receiver']):
+        for _, df_tdr in iter_rt_groups(df_drs, ['Transmitter', 'Receiver']):
             d_max, cutoff, cutoff_loc = dr_estimate_and_cutoff(df_tdr[dfield])
             #print(d_max, cutoff, cutoff_loc)
             df_tdr = df_tdr.iloc[cutoff_loc:].copy()
@@ -262,12 +866,49 @@ def detection_rate_grid(detection_df, time_bin_length, metadata, auto_dr=False):
     #if 'datetime' not in df_drs:
     df_drs['datetime'] = df_drs.index.get_level_values('datetimeb')
 
-    detection_df = pd.concat((df_detg,
-                             df_drs.reset_index())).reset_index(drop=True)
+    df_drs = encode_devices(df_drs.reset_index(), like=df_detg)
+    detection_df = pd.concat((encode_devices(df_detg, like=df_drs),
+                             df_drs)).reset_index(drop=True)
     event_bin_split = df_detg.shape[0]
     #same as: event_bin_split = detection_df.index[detection_df['interval'].isna()][0]
     return detection_df, event_bin_split
 
+
+def detection_rate_grid_loop(detection_df, time_bin_length, metadata, auto_dr=False):
+    """
+    Per-time-bin loop implementation of py:detection_rate_grid(), see there for parameters and
+    return values.
+    """
+    time_bin_length = pd.Timedelta(time_bin_length)
+    df_drs = []
+    df_detg = []
+    tgrouper = detection_df.set_index('datetime').groupby(pd.Grouper(freq=time_bin_length))
+    for tg, tgroup in tgrouper:
+        # detection count in time window
+        gcodes, rt_detected = rt_group_codes(tgroup)
+        df_tdr = pd.Series(np.bincount(gcodes[gcodes >= 0], minlength=len(rt_detected)),
+                           index=rt_detected)
+        rt_detected = df_tdr.index
+        # determine which transmitters are still between their first and last detection
+        active_rt = metadata.rt_groups[(metadata.rt_groups['tstart'] <= tg+time_bin_length) & 
+                                  (metadata.rt_groups['tend'] >= tg)]
+        # append zero counts for missing detections
+        missing_rt = pd.Series(0, index=active_rt.index.difference(rt_detected.values))
+        df_tdr = pd.concat((df_tdr, missing_rt))
+        df_tdr = pd.DataFrame(df_tdr, columns=['detection_count'])
+        df_tdr['interval'] = time_bin_length.total_seconds() / df_tdr.loc[rt_detected, 'detection_count']
+        df_tdr['datetimeb'] = tg
+        df_tdr = df_tdr.set_index(['datetimeb'], append=True)
+        
+        df_drs.append(df_tdr)
+        # individual detection events within this time window
+        tgroup = tgroup.reset_index()
+        tgroup['datetimeb'] = tg
+        df_detg.append(tgroup)
+    df_drs = pd.concat(df_drs)
+    df_detg = pd.concat(df_detg)
+    return merge_detection_rates(df_drs, df_detg, time_bin_length, metadata, auto_dr, "loop")
+
 # ----------------------------------------------------------------------------
 # detection interval calculation
 
@@ -297,17 +938,95 @@ def group_info(grdf=None, metadata=None):
     ivs = grdf['interval']
     return len(grdf), ivs.min(), ivs.max(), rt_name(grdf, metadata), rt_dist(grdf, metadata)
 
-def get_all_group_info(detections_df, metadata):
-    """Create a dataframe with group_info() for each group in detections_df"""
-    rt_groupby = detections_df.groupby(["Receiver","Transmitter"])
-    groups = [rt_groupby.get_group(x) for x in rt_groupby.groups]
-    return pd.DataFrame((group_info(grdf, metadata) for grdf in groups),
-                        columns=[*group_info()], index=rt_groupby.groups)
+def make_rt_pair_info(pairs, metadata):
+    """
+    Precompute metadata for receiver/transmitter pairs with one lookup per table, as an
+    alternative to calling py:rt_info() for each group.
+
+    :param pairs: Receiver/transmitter pairs
+    :type pairs: pandas.MultiIndex
 
+    :param metadata: Metadata with 'deploy', 'transmitter', and optionally 'station_dists_m'
+    :type metadata: sklearn.utils.Bunch
 
-def add_rt_group_info(events_df, metadata):
+    :return: DataFrame indexed by (Receiver, Transmitter) with device IDs, deployment station
+             numbers 'RECV_STATION_NO' and 'TAG_STATION_NO', distance 'dist_m', tag family and
+             power, and the group name 'Receiver/Transmitter' as constructed by py:rt_name()
+    :rtype: pandas.DataFrame
+    """
+    pair_info = pd.DataFrame(index=pd.MultiIndex.from_tuples(pairs, names=['Receiver', 'Transmitter']))
+    receivers = pair_info.index.get_level_values('Receiver')
+    transmitters = pair_info.index.get_level_values('Transmitter')
+    pair_info['Receiver.ID'] = get_device_id(receivers.to_series()).values
+    pair_info['Transmitter.ID'] = get_device_id(transmitters.to_series()).values
+
+    # station of first deployment of each serial number, like the left merges in rt_info()
+    station_no = (metadata.deploy.drop_duplicates('INS_SERIAL_NO')
+                  .set_index('INS_SERIAL_NO')['STATION_NO'])
+    pair_info['RECV_STATION_NO'] = station_no.reindex(pair_info['Receiver.ID']).values
+    pair_info['TAG_STATION_NO'] = station_no.reindex(pair_info['Transmitter.ID']).values
+    pair_info['dist_m'] = np.nan
+    station_dists_m = metadata.get('station_dists_m')
+    if station_dists_m is not None:
+        ridx = station_dists_m.index.get_indexer(pair_info['RECV_STATION_NO'])
+        tidx = station_dists_m.columns.get_indexer(pair_info['TAG_STATION_NO'])
+        known = (ridx >= 0) & (tidx >= 0)
+        pair_info.loc[known, 'dist_m'] = station_dists_m.values[ridx[known], tidx[known]].astype(float)
+
+    tag_info = metadata.transmitter.reindex(transmitters)
+    for col in ['Transmitter.Tag Family', 'Transmitter.Power']:
+        if col in tag_info.columns:
+            pair_info[col] = tag_info[col].values
+
+    # group names as in rt_name()
+    names = receivers + "/tag-" + pair_info['Transmitter.ID'].astype(str).values
+    if {'Tag Family', 'Power'}.issubset(tag_info.columns):
+        metainf = tag_info['Tag Family'] + "-" + tag_info['Power']
+        names = names + np.where(metainf.notna(), "/" + metainf.fillna(''), '')
+    pair_info['Receiver/Transmitter'] = names
+    return pair_info
+
+
+def group_interval_range(interval, gsize):
+    """Smallest and largest interval of each group of consecutive rows, ignoring NaN"""
+    if not len(gsize):
+        return interval[:0], interval[:0]
+    gstart = np.cumsum(gsize) - gsize
+    return np.fmin.reduceat(interval, gstart), np.fmax.reduceat(interval, gstart)
+
+
+def get_all_group_info(detections_df, metadata, executor=None):
+    """Create a dataframe with group_info() for each group in detections_df
+
+    Pair metadata is taken from `metadata`.rt_pairs (see py:make_rt_pair_info()), which is built
+    if missing or not covering all groups. The interval ranges of the groups are computed by
+    `executor` (see py:group_interval_range()), serially if None.
+    """
+    if executor is None:
+        executor = serial_executor
+    gcodes, pairs = rt_group_codes(detections_df)
+    order, gsize = group_sizes(gcodes)
+    min_interval, max_interval = executor.map_groups(group_interval_range, gsize,
+                                                     rows=(detections_df['interval'].values[order],))
+    gsdf = pd.DataFrame({"count": gsize, "min_interval": min_interval,
+                         "max_interval": max_interval},
+                        index=pairs[gcodes[order][np.cumsum(gsize) - gsize]])
+    pair_info = metadata.get('rt_pairs')
+    if pair_info is None or not gsdf.index.isin(pair_info.index).all():
+        pair_info = metadata.rt_pairs = make_rt_pair_info(gsdf.index, metadata)
+    gsdf = gsdf.join(pair_info[['Receiver/Transmitter', 'dist_m']])
+    gsdf.index.names = [None, None]
+    return gsdf[[*group_info()]]
+
+
+def add_rt_group_info(events_df, metadata, executor=None):
     """Calls get_all_group_info() for `events_df` and merges the info into `metadata`.rt_groups"""
-    gsdf = get_all_group_info(events_df, metadata)
+    join_rt_group_info(get_all_group_info(events_df, metadata, executor), metadata)
+
+
+def join_rt_group_info(gsdf, metadata):
+    """Merges the group info `gsdf` of get_all_group_info() into `metadata`.rt_groups, with the
+    distance class of each group in its name"""
     gsdf.index.names = index_columns(metadata.rt_groups)
     gsdf = metadata.rt_groups.join(gsdf).join(metadata.transmitter)
 
@@ -378,43 +1097,66 @@ def read_otn_data(detections_csv,
                   otn_metadata=None,
                   vendor_tag_specs=None,
                   merge=True,
-                  bunch=False):
+                  bunch=False,
+                  start=None,
+                  end=None,
+                  receivers=None,
+                  columns=None,
+                  transmitters=None,
+                  chunksize=None,
+                  normalized=False,
+                  cache=None,
+                  out_of_core=None):
     """ All in one function to read OTN data
 
     Args:
-        detections_csv      - csv file name for detection data
+        detections_csv      - csv file name for detection data, or a Parquet dataset written by
+                              convert_detections_to_parquet()
         otn_metadata        - xls file name for OTN-style metadata
         vendor_tag_specs    - xls file name for vendor extracted metadata
         merge               - bool whether to merge metadata into detections 
         bunch               - bool whether to return metadata as Bunch dict
+        start, end          - optional time range [start, end) of detections to read
+        receivers           - optional list of receivers to read detections of
+        columns             - optional list of detection columns to read
+        transmitters        - optional list of transmitters to read detections of
+        chunksize           - optional number of CSV rows to read and clean at a time
+        normalized          - bool whether to keep metadata in dimension tables instead, see
+                              normalize_detections()
+        cache               - optional DiskCache of the parsed metadata workbooks
+        out_of_core         - optional dict with the `directory` and number of `partitions` to
+                              partition the detections into, see read_out_of_core(). The
+                              detections are then a dask DataFrame, merged lazily.
 
     Returns:
         df_detections, df_deploy_meta, transmitter  - if bunch == False, else
         df_decetions, metadata                      - where metadata is a dict with metadata
     """
     # Read & clean raw detections
-    df_detections_raw = pd.read_csv(detections_csv)
-    df_detections = clean_raw_detections(df_detections_raw)
+    if out_of_core:
+        df_detections, _ = read_out_of_core(detections_csv, "otn", out_of_core, normalized, start,
+                                            end, receivers, columns, transmitters, chunksize)
+    else:
+        df_detections = read_detections(detections_csv, "otn", start, end, receivers, columns,
+                                        transmitters, chunksize)
     metadata = Bunch()
     metadata.receiver, metadata.transmitter, metadata.datadict = (None, ) * 3
 
     if otn_metadata:
         # Read deployment information for receivers
-        metadata.datadict, metadata.deploy = read_otn_metadata(otn_metadata)
+        metadata.datadict, metadata.deploy = read_otn_metadata(otn_metadata, cache=cache)
         deploy_cols = ['DEPLOY_LAT', 'DEPLOY_LONG', 'BOTTOM_DEPTH', 'INSTRUMENT_DEPTH', 'INS_SERIAL_NO']
         metadata.receiver = metadata.deploy[deploy_cols]
         metadata.receiver.columns = ['Receiver.lat', 'Receiver.lon', 'Receiver.bottom_depth',
                                 'Receiver.depth', 'Receiver.ID']
-        if merge:
+        if merge and not normalized:
             # Merge Metadata & Detection Data
-            df_detections = df_detections.merge(metadata.receiver)
+            df_detections = apply_partitionwise(merge_devices, df_detections, metadata.receiver)
 
     if vendor_tag_specs:
-        metadata.transmitter = pd.read_excel(vendor_tag_specs)
-        metadata.transmitter = clean_vendor_tag_specs(metadata.transmitter)
-        metadata.transmitter['Transmitter.Avg delay'] = (metadata.transmitter['Transmitter.Min delay'] + metadata.transmitter['Transmitter.Max delay'])/2
-        if merge:
-            df_detections = df_detections.merge(metadata.transmitter)
+        metadata.transmitter = read_vendor_tag_specs(vendor_tag_specs, cache)
+        if merge and not normalized:
+            df_detections = apply_partitionwise(merge_devices, df_detections, metadata.transmitter)
         metadata.transmitter.set_index('Transmitter', inplace=True)
         if otn_metadata:
             ## Merge tag ID Code with INS_SERIAL_NO
@@ -426,15 +1168,77 @@ def read_otn_data(detections_csv,
                 .merge(metadata.deploy, 'left', left_on='Transmitter.ID', right_on='INS_SERIAL_NO')
                 .set_index(iname))
 
+    if normalized:
+        # like the merges, these renumber the detections
+        df_detections = normalize_detections(df_detections, metadata).reset_index(drop=True)
+
     if bunch:
         return df_detections, metadata
     else:
         return df_detections, metadata.receiver, metadata.transmitter
 
+
+def read_out_of_core(detections_path, reader, out_of_core, normalized=False, start=None, end=None,
+                     receivers=None, columns=None, transmitters=None, chunksize=None):
+    """
+    Partition cleaned detections by receiver/transmitter pair (see py:partition_detections())
+    into the `detections` subdirectory of out_of_core['directory'], replacing earlier partitions.
+
+    :param out_of_core: `directory` for the partitions and outputs of out-of-core processing,
+        and the number of `partitions` (default 16)
+    :type out_of_core: dict
+
+    :return: - **df_detections** (`dask.dataframe.DataFrame`) - the partitioned detections
+             - **first_detections** (`pandas.DataFrame`) - first detection of each receiver
+    """
+    if normalized:
+        raise ValueError("Normalized metadata is not supported with out-of-core detections")
+    if out_of_core.get('directory') is None:
+        raise ValueError("Out-of-core detections require a directory")
+    parts = partition_detections(detections_path, os.path.join(out_of_core['directory'], 'detections'),
+                                 reader, out_of_core.get('partitions', 16), start, end, receivers,
+                                 columns, transmitters, chunksize or 1000000, overwrite=True)
+    return read_partitioned_detections(parts.partitions), parts.first_detections
+
+
+def normalize_detections(df_detections, metadata, drop_columns=()):
+    """
+    Keep receiver and transmitter metadata in dimension tables instead of merging it into each
+    detection, so the detections stay narrow. Attributes like 'Receiver.lat' or
+    'Transmitter.Avg delay' are resolved by integer position when a processing step needs them
+    (see py:resolve_attributes()).
+
+    Detections of devices without metadata are dropped, as by an inner merge with the metadata
+    tables. Devices with several metadata rows use the first one rather than duplicating their
+    detections.
+
+    :param df_detections: Cleaned detections
+    :type df_detections: pandas.DataFrame
+
+    :param metadata: Metadata with `receiver` and `transmitter` tables. The dimension tables (see
+                     py:make_device_dimensions()) are stored as metadata.dimensions.
+    :type metadata: sklearn.utils.Bunch
+
+    :param drop_columns: Per-detection device attribute columns to remove from the detections,
+                         as they are available from the dimension tables
+    :type drop_columns: list
+
+    :return: Detections of devices with metadata
+    :rtype: pandas.DataFrame
+    """
+    df_detections = encode_devices(df_detections)
+    metadata.dimensions = make_device_dimensions(df_detections, metadata)
+    keep = has_device_attributes(df_detections, metadata.dimensions)
+    if not keep.all():
+        df_detections = df_detections[keep]
+    drop_columns = [c for c in drop_columns if c in df_detections.columns]
+    return df_detections.drop(columns=drop_columns) if drop_columns else df_detections
+
+
 def clean_raw_detections(df_detections_raw, dates=True, rt_ids=True, select_cols=True):
     # Deal with Dates
     if dates:
-        detection_datetimes = pd.to_datetime(df_detections_raw['Date and Time (UTC)'])
+        detection_datetimes = parse_datetimes(df_detections_raw['Date and Time (UTC)'])
         #df_detections_raw['Date'] = detection_datetimes.dt.strftime('%Y-%m-%d')
         #df_detections_raw['Time'] = detection_datetimes.dt.strftime('%I:%M:%S %p')
         #df_detections_raw['Date and Time'] = df_detections_raw['Date and Time (UTC)']
@@ -457,53 +1261,76 @@ def clean_raw_detections(df_detections_raw, dates=True, rt_ids=True, select_cols
 def read_nsog_data(detections_csv,
                    vendor_tag_specs=None,
                    merge=False,
-                   bunch=False):
+                   bunch=False,
+                   start=None,
+                   end=None,
+                   receivers=None,
+                   columns=None,
+                   transmitters=None,
+                   chunksize=None,
+                   normalized=False,
+                   cache=None,
+                   out_of_core=None):
     """ All in one function to read NSOG data
 
     Args:
-        detections_csv      - csv file name for detection data
+        detections_csv      - csv file name for detection data, or a Parquet dataset written by
+                              convert_detections_to_parquet()
         otn_metadata        - xls file name for OTN-style metadata
         vendor_tag_specs    - xls file name for vendor extracted metadata
         merge               - bool whether to merge metadata into detections
         bunch               - bool whether to return metadata as Bunch dict
+        start, end          - optional time range [start, end) of detections to read
+        receivers           - optional list of receivers to read detections of
+        columns             - optional list of detection columns to read
+        transmitters        - optional list of transmitters to read detections of
+        chunksize           - optional number of CSV rows to read and clean at a time
+        normalized          - bool whether to keep metadata in dimension tables instead, see
+                              normalize_detections(). The per-detection receiver columns move
+                              into metadata.dimensions.Receiver.
+        cache               - optional DiskCache of the parsed metadata workbooks
+        out_of_core         - optional dict with the `directory` and number of `partitions` to
+                              partition the detections into, see read_out_of_core(). The
+                              detections are then a dask DataFrame, merged lazily.
 
     Returns:
         df_detections, df_deploy_meta, transmitter  - if bunch == False, else
         df_detections, metadata                      - where metadata is a dict with metadata
     """
-    # Read & clean raw detections
-    df_detections_raw = pd.read_csv(detections_csv)
-    df_detections_raw = df_detections_raw[df_detections_raw['rcvrcatnumber'].str.contains("NSOG")] # Filter for the specific region
-    df_detections = clean_nsog_raw_detections(df_detections_raw)
+    # Read & clean raw detections, filtered for the specific region
+    if columns is not None:
+        columns = list(columns) + ['station']
+    if out_of_core:
+        # deployments are the first detection of each receiver, collected while partitioning
+        df_detections, deploy = read_out_of_core(detections_csv, "nsog", out_of_core, normalized,
+                                                 start, end, receivers, columns, transmitters,
+                                                 chunksize)
+        df_detections = apply_partitionwise(add_nsog_deploy_columns, df_detections)
+        deploy = add_nsog_deploy_columns(deploy)
+    else:
+        df_detections = read_detections(detections_csv, "nsog", start, end, receivers, columns,
+                                        transmitters, chunksize)
+        df_detections = deploy = add_nsog_deploy_columns(df_detections)
     metadata = Bunch()
     metadata.receiver, metadata.transmitter, metadata.datadict = (None, ) * 3
 
     # Read deployment information for receivers
-    metadata.deploy = df_detections
-    pd.options.mode.chained_assignment = None  # default='warn'
-    metadata.deploy['STATION_NO'] = df_detections_raw['station']
-    metadata.deploy['DEPLOY_LONG'] = metadata.deploy['Receiver.lon']
-    metadata.deploy['DEPLOY_LAT'] = metadata.deploy['Receiver.lat']
-    metadata.deploy['INS_SERIAL_NO'] = metadata.deploy['Receiver.ID']
-    metadata.deploy = metadata.deploy.drop_duplicates(subset=['INS_SERIAL_NO'])
-    pd.options.mode.chained_assignment = 'warn'
+    metadata.deploy = deploy.drop_duplicates(subset=['INS_SERIAL_NO'])
 
     receiver_cols = ['Receiver.lat', 'Receiver.lon', 'Receiver.bottom_depth',
                      'Receiver.depth', 'Receiver']
     metadata.receiver = metadata.deploy[receiver_cols]
     metadata.receiver.columns = ['Receiver.lat', 'Receiver.lon', 'Receiver.bottom_depth',
                                  'Receiver.depth', 'Receiver']
-    if merge:
+    if merge and not normalized:
         # Merge Metadata & Detection Data
-        df_detections = df_detections.merge(metadata.receiver)
+        df_detections = apply_partitionwise(merge_devices, df_detections, metadata.receiver)
 
     # Add the transmitter information
     if vendor_tag_specs:
-        metadata.transmitter = pd.read_excel(vendor_tag_specs)
-        metadata.transmitter = clean_vendor_tag_specs(metadata.transmitter)
-        metadata.transmitter['Transmitter.Avg delay'] = (metadata.transmitter['Transmitter.Min delay'] + metadata.transmitter['Transmitter.Max delay'])/2
-        if merge:
-            df_detections = df_detections.merge(metadata.transmitter)
+        metadata.transmitter = read_vendor_tag_specs(vendor_tag_specs, cache)
+        if merge and not normalized:
+            df_detections = apply_partitionwise(merge_devices, df_detections, metadata.transmitter)
         metadata.transmitter.set_index('Transmitter', inplace=True)
 
         # Merge tag ID Code with
@@ -515,16 +1342,30 @@ def read_nsog_data(detections_csv,
             .merge(metadata.deploy, 'left', left_on='Transmitter', right_on='Transmitter')
             .set_index(iname))
 
+    if normalized:
+        df_detections = normalize_detections(df_detections, metadata,
+                                             drop_columns=metadata.receiver.columns.drop('Receiver'))
+
     if bunch:
         return df_detections, metadata
     else:
         return df_detections, metadata.receiver, metadata.transmitter
 
 
+def add_nsog_deploy_columns(df_detections):
+    """NSOG detections with the deployment columns STATION_NO, DEPLOY_LONG, DEPLOY_LAT, and
+    INS_SERIAL_NO, taken from their `station` and receiver columns, in place of `station`"""
+    return df_detections.drop(columns='station').assign(
+        STATION_NO=df_detections['station'],
+        DEPLOY_LONG=df_detections['Receiver.lon'],
+        DEPLOY_LAT=df_detections['Receiver.lat'],
+        INS_SERIAL_NO=df_detections['Receiver.ID'])
+
+
 def clean_nsog_raw_detections(df_detections_raw, dates=True, rt_ids=True, select_cols=True):
     # Deal with Dates
     if dates:
-        detection_datetimes = pd.to_datetime(df_detections_raw['datecollected'])
+        detection_datetimes = parse_datetimes(df_detections_raw['datecollected'])
         df_detections_raw['datetime'] = detection_datetimes
 
     # Receiver & Transmitter IDs
@@ -563,6 +1404,466 @@ def clean_nsog_raw_detections(df_detections_raw, dates=True, rt_ids=True, select
         return df_detections_raw
 
 
+# ----------------------------------------------------------------------------
+# Parquet ingest of detections
+
+# raw CSV columns used by the cleaning functions of each reader
+raw_detection_columns = {
+    'otn': ['Date and Time (UTC)', 'Receiver', 'Transmitter'],
+    'nsog': ['datecollected', 'rcvrcatnumber', 'collectornumber', 'catalognumber', 'latitude',
+             'longitude', 'bottom_depth', 'receiver_depth', 'station'],
+}
+
+
+def read_detections_csv(detections_csv, reader="otn", start=None, end=None, receivers=None,
+                        transmitters=None, columns=None, chunksize=None):
+    """
+    Read and clean a detections CSV export as done by read_otn_data() and read_nsog_data().
+
+    Only the raw columns needed for cleaning are parsed. With `chunksize`, the file is streamed in
+    chunks of that many rows, and the region filter (NSOG), the cleaning, the filters given here,
+    and the column selection are applied to each chunk. Peak memory is then bounded by the chunk
+    size and the size of the result rather than by the size of the file.
+
+    :param detections_csv: CSV file name for detection data
+    :type detections_csv: str
+
+    :param reader: "otn" or "nsog", the layout of the export
+    :type reader: str
+
+    :param start, end, receivers, transmitters: Optional filters, see py:filter_detections()
+
+    :param columns: Optional list of cleaned columns to keep
+    :type columns: list
+
+    :param chunksize: Optional number of rows to read per chunk
+    :type chunksize: int
+
+    :return: Cleaned detections, with categorical device names (see py:encode_devices()). NSOG
+             detections are filtered for the region and include the `station` column.
+    :rtype: pandas.DataFrame
+    """
+    chunks = list(iter_detections_csv(detections_csv, reader, start, end, receivers,
+                                      transmitters, columns, chunksize))
+    if len(chunks) == 1:
+        return chunks[0]
+    # common categories for all chunks, so that concat() keeps the device names categorical
+    dtypes = {col: pd.CategoricalDtype(device_categories(*[chunk[col] for chunk in chunks]))
+              for col in device_columns if col in chunks[0].columns}
+    return pd.concat([chunk.astype(dtypes) for chunk in chunks])
+
+
+def iter_detections_csv(detections_csv, reader="otn", start=None, end=None, receivers=None,
+                        transmitters=None, columns=None, chunksize=None):
+    """
+    Cleaned detections of a CSV export, chunk by chunk, as read by py:read_detections_csv(). The
+    row index continues across chunks, as if the whole file was read at once. Without
+    `chunksize`, the whole file is a single chunk.
+
+    :rtype: Iterator[pandas.DataFrame]
+    """
+    try:
+        usecols = raw_detection_columns[reader]
+    except KeyError:
+        raise ValueError("Unknown detections reader {}, use one of {}".format(
+            reader, list(raw_detection_columns)))
+
+    def clean_chunk(df_detections_raw):
+        if reader == "otn":
+            df_detections = clean_raw_detections(df_detections_raw)
+        else:
+            # Filter for the specific region
+            df_detections_raw = df_detections_raw[df_detections_raw['rcvrcatnumber'].str.contains("NSOG")]
+            df_detections = clean_nsog_raw_detections(df_detections_raw).assign(
+                station=df_detections_raw['station'])
+        df_detections = filter_detections(df_detections, start, end, receivers, transmitters)
+        if columns is not None:
+            df_detections = df_detections[list(columns)]
+        return encode_devices(df_detections)
+
+    if chunksize is None:
+        yield clean_chunk(pd.read_csv(detections_csv, usecols=usecols))
+        return
+    with pd.read_csv(detections_csv, usecols=usecols, chunksize=chunksize) as chunks:
+        for chunk in chunks:
+            yield clean_chunk(chunk)
+
+
+def filter_detections(df_detections, start=None, end=None, receivers=None, transmitters=None):
+    """
+    Select the detections in time range [start, end) of the given receivers and transmitters.
+    Filters that are None are not applied.
+
+    :param start, end: Time range
+    :type start, end: str or pandas.Timestamp
+
+    :param receivers, transmitters: Lists of device names, like "VR2W-123456"
+    :type receivers, transmitters: list
+
+    :rtype: pandas.DataFrame
+    """
+    mask = np.ones(len(df_detections), dtype=bool)
+    if start is not None:
+        mask &= (df_detections['datetime'] >= pd.Timestamp(start)).values
+    if end is not None:
+        mask &= (df_detections['datetime'] < pd.Timestamp(end)).values
+    if receivers is not None:
+        mask &= df_detections['Receiver'].isin(receivers).values
+    if transmitters is not None:
+        mask &= df_detections['Transmitter'].isin(transmitters).values
+    if mask.all():
+        return df_detections
+    return df_detections[mask]
+
+
+def convert_detections_to_parquet(detections_csv, dataset_path, reader="otn", partition_by="month",
+                                  overwrite=False, chunksize=None):
+    """
+    Convert a detections CSV export into a partitioned Parquet dataset, to be read by
+    read_otn_data() / read_nsog_data() instead of the CSV.
+
+    The dataset holds the cleaned detections with typed columns: `datetime` as datetime64,
+    `Receiver` and `Transmitter` as categoricals, and integer device IDs. The row index of the
+    cleaned CSV is kept, so that both sources give identical detections.
+
+    :param detections_csv: CSV file name for detection data
+    :type detections_csv: str
+
+    :param dataset_path: Directory of the Parquet dataset
+    :type dataset_path: str
+
+    :param reader: "otn" or "nsog", the layout of the export (see py:read_detections_csv())
+    :type reader: str
+
+    :param partition_by: "month" to partition by month of detection, "Receiver" to partition by
+                         receiver, or None for no partitioning
+    :type partition_by: str
+
+    :param overwrite: Whether to replace an existing dataset at `dataset_path`
+    :type overwrite: bool
+
+    :param chunksize: Optional number of CSV rows to read per chunk
+    :type chunksize: int
+    """
+    if os.path.exists(dataset_path):
+        if not overwrite:
+            raise FileExistsError("Parquet dataset {} exists, use overwrite=True to replace it"
+                                  .format(dataset_path))
+        if os.path.isdir(dataset_path):
+            shutil.rmtree(dataset_path)
+        else:
+            os.remove(dataset_path)
+    df_detections = read_detections_csv(detections_csv, reader, chunksize=chunksize)
+    df_detections = df_detections.astype({'Receiver': 'category', 'Transmitter': 'category',
+                                          'Receiver.ID': 'int64', 'Transmitter.ID': 'int64'})
+    df_detections.index.name = parquet_index_column
+    df_detections = df_detections.reset_index()
+    partition_cols = None
+    if partition_by == "month":
+        df_detections[partition_by] = df_detections['datetime'].dt.strftime('%Y-%m')
+        partition_cols = [partition_by]
+    elif partition_by == "Receiver":
+        partition_cols = [partition_by]
+    elif partition_by is not None:
+        raise ValueError("Unknown partitioning {}, use 'month', 'Receiver', or None"
+                         .format(partition_by))
+    if partition_cols is None:
+        # a dataset directory in any case
+        os.makedirs(dataset_path)
+        df_detections.to_parquet(os.path.join(dataset_path, 'part-0.parquet'), index=False)
+    else:
+        df_detections.to_parquet(dataset_path, partition_cols=partition_cols, index=False)
+
+
+parquet_index_column = 'csv_row'
+# columns of cleaned detections of all readers, in order
+detection_columns = ['datetime', 'Receiver', 'Transmitter', 'Receiver.ID', 'Transmitter.ID',
+                     'Receiver.lat', 'Receiver.lon', 'Receiver.bottom_depth', 'Receiver.depth',
+                     'station']
+
+
+def is_parquet_dataset(path):
+    """Whether `path` is a Parquet file or dataset directory rather than a CSV file"""
+    return os.path.isdir(path) or str(path).endswith('.parquet')
+
+
+def detection_parquet_filters(dataset_path, start=None, end=None, receivers=None,
+                              transmitters=None):
+    """Parquet read filters of py:read_detections_parquet(), including filters on the month
+    partitions of datasets partitioned by month"""
+    filters = []
+    partitions = os.listdir(dataset_path) if os.path.isdir(dataset_path) else []
+    by_month = any(p.startswith('month=') for p in partitions)
+    if start is not None:
+        start = pd.Timestamp(start)
+        filters.append(('datetime', '>=', start))
+        if by_month:
+            filters.append(('month', '>=', start.strftime('%Y-%m')))
+    if end is not None:
+        end = pd.Timestamp(end)
+        filters.append(('datetime', '<', end))
+        if by_month:
+            filters.append(('month', '<=', end.strftime('%Y-%m')))
+    if receivers is not None:
+        filters.append(('Receiver', 'in', list(receivers)))
+    if transmitters is not None:
+        filters.append(('Transmitter', 'in', list(transmitters)))
+    return filters
+
+
+def read_detections_parquet(dataset_path, start=None, end=None, receivers=None, columns=None,
+                            transmitters=None):
+    """
+    Read detections from a Parquet dataset written by convert_detections_to_parquet().
+
+    Only the requested columns are read. Time range, receiver, and transmitter filters are pushed
+    down to the Parquet reader, which skips non-matching partitions and row groups.
+
+    :param dataset_path: Directory of the Parquet dataset
+    :type dataset_path: str
+
+    :param start, end: Optional time range [start, end) of detections to read
+    :type start, end: str or pandas.Timestamp
+
+    :param receivers: Optional list of receivers to read detections of
+    :type receivers: list
+
+    :param columns: Optional list of columns to read, default all
+    :type columns: list
+
+    :param transmitters: Optional list of transmitters to read detections of
+    :type transmitters: list
+
+    :return: Detections in the order of the original CSV, with categorical device names as returned
+             by py:read_detections_csv()
+    :rtype: pandas.DataFrame
+    """
+    filters = detection_parquet_filters(dataset_path, start, end, receivers, transmitters)
+    if columns is not None:
+        columns = [parquet_index_column] + [c for c in columns if c != parquet_index_column]
+    df_detections = pd.read_parquet(dataset_path, columns=columns, filters=filters or None)
+
+    df_detections = df_detections.sort_values(parquet_index_column).set_index(parquet_index_column)
+    df_detections.index.name = None
+    # partition columns are read last, restore the column order of the cleaned CSV
+    df_detections = df_detections[columns[1:] if columns is not None else
+                                  [c for c in detection_columns if c in df_detections.columns]]
+    for col in device_columns:
+        if col in df_detections.columns and df_detections[col].dtype == 'category':
+            # categories of all partitions, not only of those read
+            df_detections[col] = df_detections[col].cat.remove_unused_categories()
+    return encode_devices(df_detections)
+
+
+def read_detections(detections_path, reader="otn", start=None, end=None, receivers=None,
+                    columns=None, transmitters=None, chunksize=None):
+    """
+    Read cleaned detections from a CSV export or a Parquet dataset, optionally restricted to the
+    time range [start, end), lists of receivers and transmitters, and a list of columns. CSV
+    exports can be read in chunks of `chunksize` rows (see py:read_detections_csv()).
+    """
+    if is_parquet_dataset(detections_path):
+        return read_detections_parquet(detections_path, start, end, receivers, columns,
+                                       transmitters)
+    return read_detections_csv(detections_path, reader, start, end, receivers, transmitters,
+                               columns, chunksize)
+
+
+def iter_detections_parquet(dataset_path, start=None, end=None, receivers=None, columns=None,
+                            transmitters=None, chunksize=None):
+    """
+    Detections of a Parquet dataset written by convert_detections_to_parquet(), in batches of at
+    most `chunksize` rows, with the same filters as py:read_detections_parquet(). Batches are in
+    the order of the dataset files rather than of the original CSV, the rows keep their CSV row
+    number as index.
+
+    :rtype: Iterator[pandas.DataFrame]
+    """
+    if pq is None:
+        raise ImportError("Reading Parquet detections in batches requires pyarrow")
+    filters = detection_parquet_filters(dataset_path, start, end, receivers, transmitters)
+    dataset = pyarrow.dataset.dataset(dataset_path, format='parquet', partitioning='hive')
+    if columns is None:
+        columns = [c for c in detection_columns if c in dataset.schema.names]
+    kwargs = {} if chunksize is None else {'batch_size': chunksize}
+    batches = dataset.to_batches(columns=[parquet_index_column, *columns],
+                                 filter=pq.filters_to_expression(filters) if filters else None,
+                                 **kwargs)
+    for batch in batches:
+        if batch.num_rows:
+            df_detections = batch.to_pandas().set_index(parquet_index_column)
+            df_detections.index.name = None
+            yield encode_devices(df_detections[list(columns)])
+
+
+def iter_detections(detections_path, reader="otn", start=None, end=None, receivers=None,
+                    columns=None, transmitters=None, chunksize=None):
+    """
+    Cleaned detections of a CSV export or a Parquet dataset in chunks of `chunksize` rows, see
+    py:iter_detections_csv() and py:iter_detections_parquet()
+    """
+    if is_parquet_dataset(detections_path):
+        return iter_detections_parquet(detections_path, start, end, receivers, columns,
+                                       transmitters, chunksize)
+    return iter_detections_csv(detections_path, reader, start, end, receivers, transmitters,
+                               columns, chunksize)
+
+
+# ----------------------------------------------------------------------------
+# out-of-core detections, partitioned by receiver/transmitter pair
+
+def pair_partitions(df, npartitions):
+    """
+    Partition number of each detection, from a hash of its receiver and transmitter names. All
+    detections of a receiver/transmitter pair get the same number, whichever chunk of the
+    detections they are in.
+
+    :param df: Detections with device name columns
+    :type df: pandas.DataFrame
+
+    :param npartitions: Number of partitions
+    :type npartitions: int
+
+    :return: Partition numbers in [0, npartitions)
+    :rtype: numpy.ndarray
+    """
+    pair_hash = np.zeros(len(df), dtype=np.uint64)
+    for col in device_columns:
+        codes, categories = device_codes(df[col])
+        # the hashes of the names are stable across processes and sessions, missing names hash to 0
+        name_hash = np.append(pd.util.hash_array(np.asarray(categories, dtype=object)),
+                              np.uint64(0))
+        pair_hash = pair_hash * np.uint64(1000003) + name_hash[codes]
+    return (pair_hash % np.uint64(npartitions)).astype(np.int64)
+
+
+def partition_detections(detections_path, directory, reader="otn", npartitions=16, start=None,
+                         end=None, receivers=None, columns=None, transmitters=None,
+                         chunksize=1000000, overwrite=False):
+    """
+    Stream cleaned detections into `npartitions` partitions by receiver/transmitter pair (see
+    py:pair_partitions()), for out-of-core processing. Only one chunk of `chunksize` rows is in
+    memory at a time. Each partition is a directory of Parquet files, one per chunk, which
+    py:read_detection_partition() reads back in the original row order.
+
+    As all detections of a pair are in the same partition, the per-pair processing steps need no
+    detections of other partitions.
+
+    :param detections_path: CSV export or Parquet dataset of detections, see py:iter_detections()
+    :type detections_path: str
+
+    :param directory: Directory for the partitions
+    :type directory: str
+
+    :param reader: "otn" or "nsog", the layout of a CSV export
+    :type reader: str
+
+    :param npartitions: Number of partitions
+    :type npartitions: int
+
+    :param start, end, receivers, columns, transmitters: Optional filters, see
+        py:read_detections()
+
+    :param chunksize: Number of rows to read at a time
+    :type chunksize: int
+
+    :param overwrite: Whether to replace existing partitions in `directory`
+    :type overwrite: bool
+
+    :return: Bunch with the directories of the non-empty partitions, `partitions`, and the first
+             detection of each receiver, `first_detections`, which NSOG exports take the
+             deployment metadata from
+    :rtype: sklearn.utils.Bunch
+    """
+    if os.path.exists(directory):
+        if not overwrite:
+            raise FileExistsError("Partitions directory {} exists, use overwrite=True to replace it"
+                                  .format(directory))
+        shutil.rmtree(directory)
+    os.makedirs(directory)
+    partitions, first_detections = set(), []
+    chunks = iter_detections(detections_path, reader, start, end, receivers, columns,
+                             transmitters, chunksize)
+    for i, chunk in enumerate(chunks):
+        if 'Receiver' in chunk.columns:
+            first_detections.append(chunk[~chunk['Receiver'].duplicated().values])
+        part = pair_partitions(chunk, npartitions)
+        # device names as strings, each chunk has its own categories
+        chunk = chunk.astype({col: object for col in device_columns if col in chunk.columns})
+        chunk.index.name = parquet_index_column
+        for k in np.unique(part):
+            part_dir = os.path.join(directory, 'part-{:04d}'.format(k))
+            os.makedirs(part_dir, exist_ok=True)
+            chunk[part == k].reset_index().to_parquet(
+                os.path.join(part_dir, 'chunk-{:06d}.parquet'.format(i)), index=False)
+            partitions.add(part_dir)
+    if first_detections:
+        first_detections = encode_devices(
+            pd.concat([df.astype({col: object for col in device_columns if col in df.columns})
+                       for df in first_detections]).sort_index(kind='stable'))
+        first_detections = first_detections[~first_detections['Receiver'].duplicated().values]
+    else:
+        first_detections = None
+    return Bunch(partitions=sorted(partitions), first_detections=first_detections)
+
+
+def read_detection_partition(path):
+    """
+    Detections of a partition written by py:partition_detections(), in the order of the original
+    detections and with categorical device names
+
+    :param path: Directory of the partition
+    :type path: str
+
+    :rtype: pandas.DataFrame
+    """
+    df_detections = pd.concat([pd.read_parquet(os.path.join(path, name))
+                               for name in sorted(os.listdir(path))], ignore_index=True)
+    df_detections = (df_detections.sort_values(parquet_index_column, kind='stable')
+                     .set_index(parquet_index_column))
+    df_detections.index.name = None
+    return encode_devices(missing_as_nan(df_detections))
+
+
+def read_partitioned_detections(partitions):
+    """
+    Lazy dask DataFrame of the detections of `partitions` (see py:partition_detections()), one
+    dask partition per directory. Requires dask.
+
+    :param partitions: Partition directories
+    :type partitions: list
+
+    :rtype: dask.dataframe.DataFrame
+    """
+    if dd is None:
+        raise ImportError("Out-of-core detections require dask")
+    if not partitions:
+        raise ValueError("No detections to partition")
+    # the device categories differ between partitions
+    meta = clear_known_categories(read_detection_partition(partitions[0]).iloc[:0])
+    return dd.from_map(read_detection_partition, partitions, meta=meta, enforce_metadata=False)
+
+
+def is_partitioned(df):
+    """Whether `df` is a partitioned (dask) DataFrame rather than a pandas DataFrame"""
+    return dd is not None and isinstance(df, dd.DataFrame)
+
+
+def apply_partitionwise(func, df, *args):
+    """func(df, *args), for a partitioned `df` applied lazily to each partition. The arguments are
+    passed as they are to each call, e.g. metadata tables."""
+    if not is_partitioned(df):
+        return func(df, *args)
+    meta = clear_known_categories(func(df._meta, *args))
+    return df.map_partitions(partial(call_with, func=func, args=args), meta=meta,
+                             enforce_metadata=False)
+
+
+def call_with(df, func, args):
+    """func(df, *args), a picklable partial for py:apply_partitionwise()"""
+    return func(df, *args)
+
+
 def process_detections(ev_df, params):
     """ Perform some computations on the detection event dataframe
     """
@@ -616,15 +1917,25 @@ def old_process_detections(gr, params):
 
 # ----------------------------------------------------------------------------
 # invoke operations defined by config
-def read_via_config(config):
+def read_via_config(config, cache=None):
     """
     Invoke configured data loading & processing.
 
     :param config: A Bunch dictionary containing the configuration parameters for data loading &
-                   pre-processing. Created via yload() of the YAML config file.
+                   pre-processing. Created via yload() of the YAML config file. The optional
+                   `reader.chunksize` streams the detections CSV in chunks of that many rows.
+                   With `reader.normalized: true` metadata is kept in dimension tables, see
+                   py:normalize_detections(). With `reader.out_of_core: {directory: ...,
+                   partitions: ...}` the detections are partitioned on disk by
+                   receiver/transmitter pair and returned as a dask DataFrame, see
+                   py:read_out_of_core().
     :type config: sklearn.utils.Bunch
 
-    :return: - **detection_df** (`pandas.DataFrame`) - DataFrame containing the detection events.
+    :param cache: Optional cache of the parsed metadata workbooks
+    :type cache: range_driver.cache.DiskCache
+
+    :return: - **detection_df** (`pandas.DataFrame` or `dask.dataframe.DataFrame`) - DataFrame
+               containing the detection events.
              - **mdb** (`sklearn.utils.Bunch`) - Metadata associated with the detection events.
 
     """
@@ -633,10 +1944,13 @@ def read_via_config(config):
         rdconf = config.reader
     except:
         raise YAMLProcessingError("Missing reader section in config YAML file")
+    # reader.chunksize, normalized, and out_of_core apply to any reader, unless set in its own section
+    options = {'chunksize': rdconf.get('chunksize'), 'normalized': rdconf.get('normalized', False),
+               'cache': cache, 'out_of_core': rdconf.get('out_of_core')}
     if 'otn' in rdconf.keys():
-        return read_otn_data(**rdconf.otn, merge=True, bunch=True)
+        return read_otn_data(**{**options, **rdconf.otn}, merge=True, bunch=True)
     elif 'nsog' in rdconf.keys():
-        return read_nsog_data(**rdconf.nsog, merge=False, bunch=True)
+        return read_nsog_data(**{**options, **rdconf.nsog}, merge=False, bunch=True)
     else:
         raise YAMLProcessingError("None of the available readers (otn, ...) found. "
                              "Instead the following readers were requested: {}".format(list(rdconf.keys())))
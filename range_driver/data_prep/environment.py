@@ -1,19 +1,26 @@
 """
     Functions to help integrate environmental data processing. Includes kadlu integration.
 """
-from scipy.interpolate import griddata
+from collections import OrderedDict
 import kadlu
-import copy
 import numpy as np
 import pandas as pd
 import xarray as xr
 
+from range_driver.dict_utils import Bunch
+from .interpolation import GridIndex, array_digest, interpolate_points
+from .metadata import receiver_position_columns, resolve_attributes
+from .parallel import executor_classes
 
-def add_kadlu_env_data(bounds, sources, detection_df):
+
+def add_kadlu_env_data(bounds, sources, detection_df, method="nearest", time_resolution=None,
+                       workers=1, executor="thread", load_func=None, dimensions=None):
     """
     Fetches the requested environmental data for the given region & time. The data is interpolated
     across space (2D or 3D) and time before being merged into a new version of detection_df.
 
+    Variables are independent of each other and can be loaded and interpolated concurrently.
+
     :param bounds: Dictionary containing the boundaries (space & time) which will be used to fetch
                    data from kadlu. Must include `north`, `south`, `east`, `west`, `start`, `end`,
                    `top`, and `bottom`.
@@ -25,29 +32,85 @@ def add_kadlu_env_data(bounds, sources, detection_df):
     :param detection_df: Dataframe containing detection data.
     :type detection_df: pandas.DataFrame
 
-    :return: - **detection_df_env** (`pandas.DataFrame`) - A copy of detection_df where interpolated
-               environment data has been added.
-             - **kadlu_result** (`numpy.array`) - The raw result from kadlu (not interpolated)
+    :param method: Interpolation method, "nearest" or "linear" (see py:interpolate())
+    :type method: str
+
+    :param time_resolution: Optional quantization of detection times before interpolation (see
+                            py:unique_queries())
+    :type time_resolution: float or str or pandas.Timedelta
+
+    :param workers: Number of variables to load and interpolate concurrently, 1 for serial
+                    processing, None for the executor's default
+    :type workers: int
+
+    :param executor: "thread" or "process" pool. With processes, `load_func` must be picklable.
+    :type executor: str
+
+    :param load_func: Function called like kadlu.load(source=, var=, **bounds), defaults to
+                      kadlu.load
+    :type load_func: callable
+
+    :param dimensions: Metadata dimension tables to take the receiver positions from if
+                       detection_df has none (see py:query_axes())
+    :type dimensions: sklearn.utils.Bunch
+
+    :return: - **detection_df_env** (`pandas.DataFrame`) - A shallow copy of detection_df where
+               interpolated environment data has been added. Existing columns are shared with
+               detection_df rather than copied.
+             - **kadlu_results** (`dict`) - The raw results from kadlu (not interpolated) by
+               variable name
     """
-    detection_df_copy = copy.copy(detection_df)
+    if load_func is None:
+        load_func = kadlu.load
+    detection_df_copy = detection_df.copy(deep=False)
+
+    # interpolate each distinct (location, time) once
+    axes_to_interpolate, inverse = unique_queries(query_axes(detection_df_copy, dimensions),
+                                                 time_resolution)
+
+    col_names = [kadlu_var_name(load_name) for load_name in sources]
+    tasks = [(load_func, source, col_name, bounds, axes_to_interpolate, method)
+             for col_name, source in zip(col_names, sources.values())]
+    if workers == 1 or len(tasks) < 2:
+        results = [load_and_interpolate(*task) for task in tasks]
+    else:
+        try:
+            pool_class = executor_classes[executor]
+        except KeyError:
+            raise ValueError("Unknown executor {}, use one of {}".format(
+                executor, list(executor_classes)))
+        with pool_class(max_workers=workers) as pool:
+            results = list(pool.map(load_and_interpolate, *zip(*tasks)))
+
+    kadlu_results = {col_name: kadlu_result for col_name, (kadlu_result, _) in zip(col_names, results)}
+    if col_names:
+        # set all columns at once
+        detection_df_copy[col_names] = pd.DataFrame(
+            {col_name: interpolations[inverse] for col_name, (_, interpolations) in zip(col_names, results)},
+            index=detection_df_copy.index)
+
+    return detection_df_copy, kadlu_results
 
-    axes_to_interpolate = [detection_df_copy['Receiver.lat'],
-                           detection_df_copy['Receiver.lon'],
-                           [d.timestamp() for d in detection_df_copy['datetime']],
-                           detection_df_copy['Receiver.depth']]
 
-    for load_func, source in sources.items():
-        col_name = '_'.join(load_func.split('_')[1:])
-        kadlu_result = kadlu.load(source=source, var=col_name, **bounds)
-        interpolations = interpolate(kadlu_result, axes_to_interpolate)
+def kadlu_var_name(load_name):
+    """Variable name of a kadlu source entry, e.g. "waveheight" for "load_waveheight" """
+    return '_'.join(load_name.split('_')[1:])
 
-        detection_df_copy[col_name] = interpolations
 
-    # TODO: kadlu_result is currently only the last result. Should probably be a list of results
-    return detection_df_copy, kadlu_result
+def load_and_interpolate(load_func, source, col_name, bounds, axes_to_interpolate, method):
+    """
+    Load one variable and interpolate it at the query axes, the unit of work of
+    py:add_kadlu_env_data().
+
+    :return: - **kadlu_result** - The raw result of `load_func`
+             - **interpolations** (`numpy.ndarray`) - Interpolated values
+    """
+    kadlu_result = load_func(source=source, var=col_name, **bounds)
+    return kadlu_result, interpolate(kadlu_result, axes_to_interpolate, method)
 
 
-def add_custom_env_data(axes_to_interpolate, variable_file_map, detection_df):
+def add_custom_env_data(axes_to_interpolate, variable_file_map, detection_df, method="nearest",
+                        time_resolution=None, window_margin=1, chunks=None):
     """
     Loads the specified custom environmental data. The loaded data is interpolated across space
     (2D or 3D) and time before being merged into a new version of detection_df.
@@ -60,71 +123,250 @@ def add_custom_env_data(axes_to_interpolate, variable_file_map, detection_df):
 
     :param variable_file_map: A bunch dictionary specifying which files should be used to load
                               environmental data. Keys are the names of variables to load while
-                              values are the paths to the files containing the data.
+                              values are the paths to the files containing the data. Several
+                              variables may be read from the same file. Variables on identical
+                              grids share one interpolation lookup.
     :type variable_file_map: sklearn.utils.Bunch
 
     :param detection_df: Dataframe containing detection data.
     :type detection_df: pandas.DataFrame
 
+    :param method: Interpolation method, "nearest" or "linear" (see py:interpolate())
+    :type method: str
+
+    :param time_resolution: Optional quantization of times before interpolation (see
+                            py:unique_queries())
+    :type time_resolution: float or str or pandas.Timedelta
+
+    :param window_margin: Only the window of the file covering the query points plus this many
+                          grid cells on each side is read (see py:dataset_grid()). Points without
+                          valid grid values around them, e.g. on land, take the nearest valid
+                          value of the whole variable, which is then read as well. None reads the
+                          whole variable right away.
+    :type window_margin: int
+
+    :param chunks: Optional dask chunks passed to xarray.open_dataset(), e.g. {"time": 24}, to
+                   read the window chunk by chunk
+    :type chunks: dict
+
     :return: A copy of detection_df where the interpolated custom environment data has been added.
     :rtype: pandas.DataFrame
     """
+    # interpolate each distinct (location, time) once
+    axes_to_interpolate, inverse = unique_queries(axes_to_interpolate, time_resolution)
 
-    for colname, file in variable_file_map.items():
-        # Read in the XArray & Convert into a DF
-        data_set = xr.open_dataset(file)
-        df = data_set.to_dataframe()
-        df_no_nans = df[~df[colname].isna()]
-        df_no_index = df_no_nans.reset_index()
-
-        # Retrieve the data to interpolate
-        df_no_index['time_int'] = df_no_index['time'].astype('int64') // 1e9
-        try:
-            data_to_interpolate = df_no_index[[colname, 'lat', 'lon', 'time_int', 'depth']]
-        except KeyError:
-            data_to_interpolate = df_no_index[[colname, 'lat', 'lon', 'time_int']]
+    points = np.column_stack(axes_to_interpolate)
+    data_sets = {}
+    try:
+        # Group the variables by grid, opening each file once
+        grids = OrderedDict()
+        for colname, file in variable_file_map.items():
+            if file not in data_sets:
+                data_sets[file] = xr.open_dataset(file, chunks=chunks)
+            # Variable on its native grid, restricted to the window around the queries
+            data_array, axes = grid_variable(data_sets[file], colname,
+                                             None if window_margin is None else points,
+                                             window_margin)
+            grid = grids.setdefault(array_digest(*axes), Bunch(axes=axes, variables=[]))
+            grid.variables.append((colname, data_array))
 
-        # Do the interpolation
-        interpolations = interpolate(data_to_interpolate, axes_to_interpolate)
+        # Do the interpolation: one lookup per grid, one gather for all of its variables
+        interpolations = {}
+        for grid in grids.values():
+            lookup = GridIndex(grid.axes).lookup(points[:, :len(grid.axes)], method)
+            values = np.stack([data_array.values.astype(float)
+                               for _, data_array in grid.variables])
+            # the nearest valid grid node of points without valid neighbours may be outside of
+            # the window, those are filled from the whole variable below
+            for (colname, _), interpolation in zip(grid.variables,
+                                                   lookup.gather(values, window_margin is None)):
+                interpolations[colname] = interpolation
+        if window_margin is not None:
+            for colname, file in variable_file_map.items():
+                missing = np.isnan(interpolations[colname])
+                if missing.any():
+                    data_array, axes = grid_variable(data_sets[file], colname)
+                    lookup = GridIndex(axes).lookup(points[missing][:, :len(axes)], method)
+                    interpolations[colname][missing] = lookup.gather(data_array.values.astype(float))
+    finally:
+        for data_set in data_sets.values():
+            data_set.close()
 
-        # Set the column
-        detection_df[colname] = interpolations
+    # Set the columns
+    for colname in variable_file_map:
+        detection_df[colname] = interpolations[colname][inverse]
 
     return detection_df
 
 
-def interpolate(data_to_interpolate, axes_to_interpolate):
-    # Check if time is timestamp or not
-    if isinstance(data_to_interpolate, pd.DataFrame):
-        data_to_interpolate = np.array([list(data_to_interpolate[x]) for x in data_to_interpolate])
-        val = data_to_interpolate[0]
-        lat = data_to_interpolate[1]
-        lon = data_to_interpolate[2]
-        ts = data_to_interpolate[3]
+grid_dims = ['lat', 'lon', 'time', 'depth']
+
+
+def dataset_grid(data_set, colname, points=None, margin=1):
+    """
+    Grid index and values of variable `colname` in an xarray Dataset.
+
+    Only the selected window is loaded from file, so that memory scales with the window and not
+    with the file.
+
+    :param data_set: Dataset with coordinates `lat`, `lon`, `time`, and optionally `depth`
+    :type data_set: xarray.Dataset
+
+    :param colname: Name of the data variable
+    :type colname: str
+
+    :param points: Optional query points (n x 4 array of lat, lon, time in seconds, depth). If
+                   given, only the grid window covering the points is read.
+    :type points: numpy.ndarray
+
+    :param margin: Number of extra grid cells on each side of the window
+    :type margin: int
+
+    :return: - **grid_index** (`GridIndex`) - index over the (lat, lon, time[, depth]) axes, time
+               in seconds since the unix epoch
+             - **values** (`numpy.ndarray`) - float values with axes in the same order
+    """
+    data_array, axes = grid_variable(data_set, colname, points, margin)
+    return GridIndex(axes), data_array.values.astype(float)
+
 
+def grid_variable(data_set, colname, points=None, margin=1):
+    """
+    Variable `colname` of an xarray Dataset with dimensions in (lat, lon, time[, depth]) order,
+    restricted to the window around `points`, without loading its values (see py:dataset_grid()).
+
+    :return: - **data_array** (`xarray.DataArray`) - the lazily loaded variable
+             - **axes** (`list`) - coordinate arrays of its dimensions, time in seconds since the
+               unix epoch
+    """
+    data_array = data_set[colname]
+    extra_dims = [d for d in data_array.dims if d not in grid_dims]
+    data_array = data_array.squeeze(extra_dims, drop=True)
+    dims = [d for d in grid_dims if d in data_array.dims]
+    data_array = data_array.transpose(*dims)
+    axes = [data_array[d].values for d in dims]
+    axes[2] = datetime_seconds(axes[2])
+    if points is not None:
+        window = [axis_window(ax, points[:, k], margin) for k, ax in enumerate(axes)]
+        data_array = data_array.isel(dict(zip(dims, window)))
+        axes = [ax[w] for ax, w in zip(axes, window)]
+    return data_array, axes
+
+
+def axis_window(coord, x, margin=1):
+    """
+    Index range of the sorted (ascending or descending) coordinate array `coord` that brackets all
+    values of `x`, extended by `margin` elements on each side.
+
+    Nearest and linear interpolation within the window give the same result as on the full axis.
+
+    :return: The index range
+    :rtype: slice
+    """
+    n = len(coord)
+    x = x[~np.isnan(x)]
+    if not len(x) or n < 2:
+        return slice(0, n)
+    flip = coord[0] > coord[-1]
+    ascending = coord[::-1] if flip else coord
+    i0 = max(np.searchsorted(ascending, x.min(), 'right') - 1 - margin, 0)
+    i1 = min(np.searchsorted(ascending, x.max(), 'left') + 1 + margin, n)
+    if flip:
+        i0, i1 = n - i1, n - i0
+    return slice(i0, i1)
+
+
+def datetime_seconds(datetimes):
+    """Seconds since the unix epoch for an array or Series of naive (UTC) datetimes"""
+    return np.asarray(datetimes, dtype='datetime64[ns]').astype('int64') / 1e9
+
+
+def kadlu_epoch_seconds(epoch_hours):
+    """Seconds since the unix epoch for kadlu's hours since 2000-01-01"""
+    return (np.asarray(epoch_hours, dtype=float) * 3600.
+            + (np.datetime64('2000-01-01', 's') - np.datetime64('1970-01-01', 's')).astype(float))
+
+
+def query_axes(detection_df, dimensions=None):
+    """
+    Axes to interpolate for each row of `detection_df`: receiver latitude, longitude, time in
+    seconds since the unix epoch, and receiver depth, as NumPy arrays.
+
+    Detections without receiver position columns, as read with normalized metadata, take them
+    from the Receiver table of `dimensions` (see py:resolve_attributes()).
+    """
+    if dimensions is not None and 'Receiver' in dimensions \
+            and not set(receiver_position_columns).issubset(detection_df.columns):
+        positions = resolve_attributes(detection_df, dimensions, receiver_position_columns)
     else:
-        val = data_to_interpolate[0]
-        lat = data_to_interpolate[1]
-        lon = data_to_interpolate[2]
-        ts_tmp = pd.Series(map(kadlu.epoch_2_dt, data_to_interpolate[3]))
-        ts = pd.Series([d.timestamp() for d in ts_tmp])
+        positions = detection_df
+    return [positions['Receiver.lat'].values,
+            positions['Receiver.lon'].values,
+            datetime_seconds(detection_df['datetime']),
+            positions['Receiver.depth'].values]
 
-    # Interpolate
-    try:
-        # 4D Grid Data
-        depth = data_to_interpolate[4]
-        points = np.array(list(zip(lat, lon, ts, depth)))
-        values = np.array(val)
-        points_to_interpolate = list(zip(*axes_to_interpolate))
-        requests = np.array(points_to_interpolate)
-        interpolations = griddata(points, values, requests, method='nearest')
-    except IndexError:
-        # 3D Grid Data
-        points = np.array(list(zip(lat, lon, ts)))
-        values = np.array(val)
-        points_to_interpolate = list(zip(*axes_to_interpolate[:3]))
-        requests = np.array(points_to_interpolate)
-        interpolations = griddata(points, values, requests, method='nearest')
-
-    return interpolations
 
+def unique_queries(axes_to_interpolate, time_resolution=None):
+    """
+    Deduplicate interpolation queries. Receivers are fixed, so the detections of a receiver share
+    lat, lon, and depth, and many share their time once it is rounded to the resolution of the
+    environmental data.
+
+    :param axes_to_interpolate: Arrays of latitude, longitude, time (seconds), and optionally
+        depth of the query points, see py:query_axes()
+    :type axes_to_interpolate: list
+
+    :param time_resolution: If given, times are rounded to the nearest multiple of this resolution
+        (seconds, or a pandas Timedelta / string like "3H") before deduplication. With the native
+        resolution of a source, nearest neighbour results are unchanged.
+    :type time_resolution: float or str or pandas.Timedelta
+
+    :return: - **unique_axes** (`list`) - float arrays of the distinct queries, in order of first
+               occurrence
+             - **inverse** (`numpy.ndarray`) - integer index such that `unique_axes[k][inverse]`
+               reproduces the (quantized) query axes
+    """
+    axes = [np.asarray(ax, dtype=float) for ax in axes_to_interpolate]
+    if time_resolution is not None:
+        if not isinstance(time_resolution, (int, float)):
+            time_resolution = pd.Timedelta(time_resolution).total_seconds()
+        axes[2] = np.round(axes[2] / time_resolution) * time_resolution
+    queries = pd.DataFrame(dict(enumerate(axes)))
+    inverse = queries.groupby(list(queries.columns), sort=False, dropna=False).ngroup().values
+    # ngroup() without sorting numbers the groups in order of first occurrence
+    first = queries.index.values[~queries.duplicated().values]
+    return [ax[first] for ax in axes], inverse
+
+
+def interpolate(data_to_interpolate, axes_to_interpolate, method="nearest"):
+    """
+    Interpolate environmental data at the query points given by `axes_to_interpolate`.
+
+    :param data_to_interpolate: Either a DataFrame with value, lat, lon, time (seconds), and
+        optionally depth columns in this order, or a kadlu result tuple (value, lat, lon, epoch
+        hours[, depth]).
+    :type data_to_interpolate: pandas.DataFrame or tuple
+
+    :param axes_to_interpolate: Arrays of latitude, longitude, time (seconds), and depth of the
+        query points, see py:query_axes()
+    :type axes_to_interpolate: list
+
+    :param method: "nearest" or "linear". Linear interpolation requires the source points to form
+        a rectilinear grid and falls back to the nearest valid grid node near NaN values.
+    :type method: str
+
+    :return: Interpolated values for each query point
+    :rtype: numpy.ndarray
+    """
+    # Check if time is timestamp or not
+    if isinstance(data_to_interpolate, pd.DataFrame):
+        columns = [data_to_interpolate[c].values for c in data_to_interpolate]
+    else:
+        columns = [np.asarray(c) for c in data_to_interpolate]
+        columns[3] = kadlu_epoch_seconds(columns[3])
+    val, coords = columns[0], np.column_stack(columns[1:5])
+
+    # 3D grid data (lat, lon, time) or 4D grid data including depth
+    points = np.column_stack([np.asarray(ax, dtype=float)
+                              for ax in axes_to_interpolate[:coords.shape[1]]])
+    return interpolate_points(val, coords, points, method)
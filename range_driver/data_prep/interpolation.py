@@ -0,0 +1,220 @@
+"""
+    Interpolation of environmental data at detection locations and times.
+
+    Gridded sources (HYCOM, ERA5, ...) are indexed per axis with searchsorted, which supports
+    nearest neighbour and multilinear interpolation. Scattered sources use a KD-tree over
+    coordinates scaled to their typical sample spacing, so that degrees, seconds, and meters are
+    comparable. Indexes are cached and lookups can be reused for all variables on the same grid.
+"""
+
+from collections import OrderedDict
+import hashlib
+import itertools
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+
+def axis_spacing(coord):
+    """Typical spacing of the distinct values of `coord` (median of positive differences), 1 if
+    there is only one value."""
+    diffs = np.diff(np.unique(coord))
+    diffs = diffs[diffs > 0]
+    return np.median(diffs) if len(diffs) else 1.
+
+
+def array_digest(*arrays):
+    """Hash of array contents, used as cache key"""
+    h = hashlib.sha1()
+    for a in arrays:
+        a = np.ascontiguousarray(a)
+        h.update(str((a.dtype, a.shape)).encode())
+        h.update(a.tobytes())
+    return h.hexdigest()
+
+
+class GridIndex:
+    """ Index of a rectilinear grid given by one coordinate array per axis.
+
+    Args:
+        axes: list of 1D coordinate arrays, each sorted ascending or descending
+    """
+    def __init__(self, axes):
+        self.axes = [np.asarray(ax, dtype=float) for ax in axes]
+        self.shape = tuple(len(ax) for ax in self.axes)
+        # searchsorted needs ascending coordinates, remember which axes are flipped
+        self.flipped = [len(ax) > 1 and ax[0] > ax[-1] for ax in self.axes]
+        self.sorted_axes = [ax[::-1] if flip else ax for ax, flip in zip(self.axes, self.flipped)]
+
+    @classmethod
+    def from_points(cls, coords, values):
+        """Detect a full rectilinear grid in scattered `coords` (n x d array).
+
+        Returns:
+            (GridIndex, grid values) if every combination of the distinct coordinate values
+            occurs exactly once, otherwise None
+        """
+        axes, codes = zip(*(np.unique(c, return_inverse=True) for c in coords.T))
+        shape = tuple(len(ax) for ax in axes)
+        if np.prod(shape, dtype='int64') != len(values):
+            return None
+        flat = np.ravel_multi_index([c.ravel() for c in codes], shape)
+        if len(np.unique(flat)) != len(flat):
+            return None
+        grid_values = np.empty(shape, dtype=float)
+        grid_values.ravel()[flat] = values
+        return cls(axes), grid_values
+
+    def _axis_nearest(self, ax, x, flip):
+        n = len(ax)
+        if n == 1:
+            return np.zeros(len(x), dtype='int64')
+        i = np.clip(np.searchsorted(ax, x), 1, n - 1)
+        i -= (x - ax[i - 1]) <= (ax[i] - x)
+        return n - 1 - i if flip else i
+
+    def _axis_linear(self, ax, x, flip):
+        n = len(ax)
+        if n == 1:
+            zeros = np.zeros(len(x), dtype='int64')
+            return zeros, zeros, np.zeros(len(x))
+        i = np.clip(np.searchsorted(ax, x) - 1, 0, n - 2)
+        t = np.clip((x - ax[i]) / (ax[i + 1] - ax[i]), 0, 1)
+        if flip:
+            return n - 1 - i, n - 2 - i, t
+        return i, i + 1, t
+
+    def lookup(self, points, method="nearest"):
+        """Grid cells and weights for interpolation at `points` (n x d array).
+
+        Points outside of the grid are clamped to the grid boundary.
+
+        Returns:
+            GridLookup that can be applied to any value array of this grid
+        """
+        points = np.asarray(points, dtype=float)
+        if method == "nearest":
+            idx = [self._axis_nearest(ax, points[:, k], flip)
+                   for k, (ax, flip) in enumerate(zip(self.sorted_axes, self.flipped))]
+            flat_idx = np.ravel_multi_index(idx, self.shape)[:, None]
+            weights = np.ones(flat_idx.shape)
+        elif method == "linear":
+            lin = [self._axis_linear(ax, points[:, k], flip)
+                   for k, (ax, flip) in enumerate(zip(self.sorted_axes, self.flipped))]
+            flat_idx, weights = [], []
+            # all 2^d corners of the enclosing grid cell
+            for corner in itertools.product((0, 1), repeat=len(lin)):
+                flat_idx.append(np.ravel_multi_index([l[c] for l, c in zip(lin, corner)], self.shape))
+                weights.append(np.prod([l[2] if c else 1 - l[2] for l, c in zip(lin, corner)], axis=0))
+            flat_idx, weights = np.stack(flat_idx, axis=1), np.stack(weights, axis=1)
+        else:
+            raise ValueError("Unknown interpolation method {}".format(method))
+        return GridLookup(self, points, flat_idx, weights)
+
+
+class GridLookup:
+    """ Precomputed grid cells and weights for a set of query points.
+
+    Apply with gather() to every variable that shares the grid.
+    """
+    def __init__(self, index, points, flat_idx, weights):
+        self.index = index
+        self.points = points
+        self.flat_idx = flat_idx
+        self.weights = weights
+
+    def gather(self, values, fill_nearest=True):
+        """Interpolate grid `values` at the query points.
+
+        Args:
+            values: array of the grid's shape, optionally with leading dimensions for several
+                    variables, e.g. (num_variables, *grid shape)
+            fill_nearest: NaN grid values (e.g. land, below bottom) are left out of the weights.
+                          Query points without any valid neighbour take the value of the nearest
+                          valid grid node if True, otherwise they are NaN.
+        Returns:
+            Interpolated values with shape (*leading dimensions, num_points)
+        """
+        values = np.asarray(values, dtype=float)
+        lead = values.shape[:values.ndim - len(self.index.shape)]
+        flat = values.reshape(lead + (-1,))
+        corner_vals = flat[..., self.flat_idx]
+        valid = ~np.isnan(corner_vals)
+        # accumulate corner by corner, so results do not depend on the leading dimensions
+        wsum, wval = np.zeros(corner_vals.shape[:-1]), np.zeros(corner_vals.shape[:-1])
+        for k in range(corner_vals.shape[-1]):
+            wsum += self.weights[:, k] * valid[..., k]
+            wval += self.weights[:, k] * np.where(valid[..., k], corner_vals[..., k], 0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            result = wval / wsum
+        missing = ~(wsum > 0)
+        if fill_nearest and missing.any():
+            self._fill_nearest(flat.reshape(-1, flat.shape[-1]), result.reshape(-1, result.shape[-1]),
+                               missing.reshape(-1, missing.shape[-1]))
+        return result
+
+    def _fill_nearest(self, flat, result, missing):
+        index = self.index
+        scales = [axis_spacing(ax) for ax in index.axes]
+        for k in np.flatnonzero(missing.any(axis=1)):
+            valid_nodes = np.flatnonzero(~np.isnan(flat[k]))
+            if not len(valid_nodes):
+                continue
+            node_coords = np.stack([ax[i] for ax, i in
+                                    zip(index.axes, np.unravel_index(valid_nodes, index.shape))], axis=1)
+            nearest = scattered_index(node_coords, scales).lookup(self.points[missing[k]])
+            result[k, missing[k]] = flat[k][valid_nodes][nearest]
+
+
+class ScatteredIndex:
+    """ Nearest neighbour index for scattered source points.
+
+    Coordinates are divided by per-axis `scales` before building the KD-tree. By default the scale
+    of an axis is the typical spacing of its distinct values, so one step of the source sampling
+    along any axis has unit length.
+    """
+    def __init__(self, coords, scales=None):
+        coords = np.asarray(coords, dtype=float)
+        if scales is None:
+            scales = [axis_spacing(c) for c in coords.T]
+        self.scales = np.asarray(scales, dtype=float)
+        self.tree = cKDTree(coords / self.scales)
+
+    def lookup(self, points):
+        """Index of the nearest source point for each of the query `points`"""
+        _, idx = self.tree.query(np.asarray(points, dtype=float) / self.scales)
+        return idx
+
+
+_index_cache = OrderedDict()
+index_cache_size = 16
+
+
+def scattered_index(coords, scales=None):
+    """Return cached ScatteredIndex for `coords` (n x d array), building it if needed."""
+    key = array_digest(coords, np.asarray(scales if scales is not None else []))
+    try:
+        _index_cache.move_to_end(key)
+        return _index_cache[key]
+    except KeyError:
+        pass
+    index = _index_cache[key] = ScatteredIndex(coords, scales)
+    while len(_index_cache) > index_cache_size:
+        _index_cache.popitem(last=False)
+    return index
+
+
+def interpolate_points(values, coords, points, method="nearest"):
+    """Interpolate `values` given at source `coords` (n x d array) at query `points` (m x d).
+
+    Uses grid lookup if the source points form a full rectilinear grid, otherwise nearest
+    neighbour lookup in a cached, scaled KD-tree. NaN source values are ignored.
+    """
+    values = np.asarray(values, dtype=float)
+    coords = np.asarray(coords, dtype=float)
+    grid = GridIndex.from_points(coords, values)
+    if grid is not None:
+        grid_index, grid_values = grid
+        return grid_index.lookup(points, method).gather(grid_values)
+    valid = ~np.isnan(values)
+    return values[valid][scattered_index(coords[valid]).lookup(points)]
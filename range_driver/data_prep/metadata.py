@@ -7,6 +7,10 @@
 import pandas as pd
 import numpy as np
 
+from range_driver.cache import cached_frames, file_identity, fingerprint
+from range_driver.dict_utils import Bunch
+from .timestamps import parse_datetimes
+
 # ----------------------------------------------------------------------------
 # OTN metadata
 # TODO: replace with resonate metadata load function
@@ -14,10 +18,33 @@ import numpy as np
 sheet_skips = {'Data Dictionary': 4, 'Deployment': 0}
 
 
-def read_otn_metadata(metadata_file, sheet_skips=sheet_skips):
-    dfmeta_data = dict((sname,
-                        pd.read_excel(metadata_file, sheet_name=sname, skiprows=skipr))
-                       for sname, skipr in sheet_skips.items())
+def read_otn_metadata(metadata_file, sheet_skips=sheet_skips, cache=None):
+    """
+    Read the data dictionary and the deployment table of an OTN metadata workbook.
+
+    :param metadata_file: xls file name of OTN-style metadata
+    :type metadata_file: str
+
+    :param sheet_skips: Names of the sheets to read and the number of rows to skip in each
+    :type sheet_skips: dict
+
+    :param cache: Optional cache of the parsed tables, keyed by a hash of the workbook contents
+    :type cache: range_driver.cache.DiskCache
+
+    :return: - **datadict** (`pandas.DataFrame`) - data dictionary indexed by field name
+             - **deploy** (`pandas.DataFrame`) - deployments of receivers and tags
+    """
+    key = fingerprint('otn_metadata', file_identity(metadata_file, content_hash=True),
+                      sheet_skips) if cache is not None else None
+    return cached_frames(cache, key, lambda: parse_otn_metadata(metadata_file, sheet_skips))
+
+
+def parse_otn_metadata(metadata_file, sheet_skips=sheet_skips):
+    """Parse an OTN metadata workbook, see py:read_otn_metadata()"""
+    # open the workbook once for all sheets
+    with pd.ExcelFile(metadata_file) as workbook:
+        dfmeta_data = {sname: workbook.parse(sname, skiprows=skipr)
+                       for sname, skipr in sheet_skips.items()}
 
     dfmeta_datadict = dfmeta_data['Data Dictionary'].set_index('Field Name')
     dfmeta_deploy = dfmeta_data['Deployment']
@@ -51,8 +78,7 @@ def read_otn_metadata(metadata_file, sheet_skips=sheet_skips):
 
     for col in dfmeta_datadict.index[dfmeta_datadict.index.str.match('.*DATE_TIME.*')]:
         #format_str = dfmeta_datadict.loc[col, 'Format']
-        dfmeta_deploy[col.replace("DATE_TIME", "DATETIME")] = pd.to_datetime(dfmeta_deploy[col],
-                                                                             infer_datetime_format=True)
+        dfmeta_deploy[col.replace("DATE_TIME", "DATETIME")] = parse_datetimes(dfmeta_deploy[col])
     return dfmeta_datadict, dfmeta_deploy
 
 
@@ -79,24 +105,241 @@ def clean_vendor_tag_specs(tag_specs_df):
     return tag_specs
 
 
+def read_vendor_tag_specs(vendor_tag_specs, cache=None):
+    """
+    Read and clean the transmitter table of a vendor tag specs workbook (see
+    py:clean_vendor_tag_specs()), with the average delay of each transmitter added.
+
+    :param vendor_tag_specs: xls file name of vendor extracted metadata
+    :type vendor_tag_specs: str
+
+    :param cache: Optional cache of the parsed table, keyed by a hash of the workbook contents
+    :type cache: range_driver.cache.DiskCache
+
+    :return: Transmitter table with a 'Transmitter' column
+    :rtype: pandas.DataFrame
+    """
+    def parse():
+        transmitter = clean_vendor_tag_specs(pd.read_excel(vendor_tag_specs))
+        transmitter['Transmitter.Avg delay'] = (transmitter['Transmitter.Min delay']
+                                                + transmitter['Transmitter.Max delay']) / 2
+        return (transmitter,)
+    key = fingerprint('vendor_tag_specs', file_identity(vendor_tag_specs, content_hash=True)) \
+        if cache is not None else None
+    return cached_frames(cache, key, parse)[0]
+
+
 # ----------------------------------------------------------------------------
 # receiver / transmitter ID string construction and metadata processing
 
+# device name columns of detections, stored as categoricals with sorted categories
+device_columns = ['Receiver', 'Transmitter']
+
+
+def device_codes(names):
+    """
+    Integer codes of device names, in the sort order of the names.
+
+    Categorical names use their codes, after reordering the categories if they are not sorted.
+    Other names are factorized.
+
+    :param names: Device names like "VR2W-123456"
+    :type names: pandas.Series or array-like
+
+    :return: - **codes** (`numpy.ndarray`) - position of each name in `categories`, -1 if missing
+             - **categories** (`pandas.Index`) - sorted distinct device names
+    """
+    if isinstance(getattr(names, 'dtype', None), pd.CategoricalDtype):
+        values = pd.Categorical(names)
+        codes, categories = values.codes, values.categories
+        if not categories.is_monotonic_increasing:
+            order = categories.argsort()
+            categories = categories[order]
+            codes = np.append(np.argsort(order), -1)[codes]
+        return codes, categories
+    codes, categories = pd.factorize(np.asarray(names, dtype=object), sort=True)
+    return codes, pd.Index(categories)
+
+
+def device_categories(*names):
+    """Sorted union of the device names (categories of categoricals, including unused ones)"""
+    categories = [n.cat.categories if isinstance(n.dtype, pd.CategoricalDtype)
+                  else pd.Index(n.dropna().unique()) for n in map(pd.Series, names)]
+    union = categories[0]
+    for c in categories[1:]:
+        if not union.equals(c):
+            union = union.union(c, sort=False)
+    return union.sort_values() if not union.is_monotonic_increasing else union
+
+
+def encode_devices(df, like=None, columns=device_columns):
+    """
+    Store the device name columns of `df` as categoricals with sorted categories, so that groupbys
+    and joins on them work on integer codes, and the order of the codes is that of the names.
+
+    Each column's categories are the names in `df` and, if given, in the same column of DataFrame
+    `like`. Encoding two DataFrames like each other gives them the same categorical dtypes, which
+    concat() and merge() preserve.
+
+    :param df: DataFrame with device name columns, e.g. cleaned detections
+    :type df: pandas.DataFrame
+
+    :param like: Optional other DataFrame with device name columns
+    :type like: pandas.DataFrame
+
+    :return: Shallow copy of `df` with categorical device name columns, `df` itself if they
+             already have the required dtype
+    :rtype: pandas.DataFrame
+    """
+    encoded = {}
+    for col in columns:
+        if col not in df.columns:
+            continue
+        names = [df[col]] + ([like[col]] if like is not None and col in like.columns else [])
+        dtype = pd.CategoricalDtype(device_categories(*names))
+        if df[col].dtype != dtype:
+            encoded[col] = df[col].astype(dtype)
+    if not encoded:
+        return df
+    df = df.copy(deep=False)
+    for col, values in encoded.items():
+        df[col] = values
+    return df
+
+
+def merge_devices(left, right, *args, **kwargs):
+    """left.merge(right) with device name columns encoded like each other, which keeps them
+    categorical in the result"""
+    right = encode_devices(right, like=left)
+    left = encode_devices(left, like=right)
+    return left.merge(right, *args, **kwargs)
+
+
+def map_device_names(names, func):
+    """Apply `func`, a function of a pandas.Index of strings, to each distinct name of Series
+    `names` only. Returns a Series with the index of `names`, NaN where names are missing."""
+    codes, categories = device_codes(names)
+    if not len(categories):
+        return pd.Series(np.nan, index=names.index, name=names.name)
+    result = pd.Series(np.asarray(func(categories)).take(codes), index=names.index, name=names.name)
+    return result.where(codes >= 0) if (codes < 0).any() else result
+
+
 def get_device_id(device_str):
-    "Return last part of '-'-separated string as int. Works on str and DataFrames of strings."
-    try:
-        return device_str.str.split("-").str[-1].astype(int)
-    except:
+    """Return last part of '-'-separated string as int. Works on str and Series of strings or
+    categoricals, whose distinct values are parsed once."""
+    if isinstance(device_str, str):
         return int(device_str.split("-")[-1])
+    return map_device_names(device_str, lambda names: names.str.split("-").str[-1].astype(int))
 
 
 def get_device_from_catalog(catalog_str):
     """Return 2nd last part of '-' separated string as an int. Works on str and DataFrames of
     strings"""
-    try:
-        return catalog_str.str.split("-").str[:-1].str.join("-")
-    except:
+    if isinstance(catalog_str, str):
         return '-'.join(catalog_str.split("-")[:-1])
+    return map_device_names(catalog_str,
+                            lambda names: names.str.split("-").str[:-1].str.join("-").astype(object))
+
+
+# ----------------------------------------------------------------------------
+# normalized metadata: dimension tables of device attributes, resolved by integer take
+
+# receiver attributes that the environmental data stages query (see environment.query_axes())
+receiver_position_columns = ['Receiver.lat', 'Receiver.lon', 'Receiver.depth']
+
+
+def device_dimension(names, table):
+    """
+    Attributes of the devices in `names` from metadata `table`, one row per device.
+
+    Devices are matched on the columns that `table` shares with the device name and ID columns,
+    e.g. 'Receiver.ID' for metadata.receiver of read_otn_data(), like when merging `table` into
+    the detections. An index of `table` named like the device column is matched as well. If a
+    device matches several rows (e.g. redeployed receivers), the first one is used.
+
+    :param names: Device names, e.g. the 'Receiver' column of the detections
+    :type names: pandas.Series
+
+    :param table: Metadata table, e.g. metadata.receiver or metadata.transmitter
+    :type table: pandas.DataFrame
+
+    :return: Attributes indexed by device name, for the devices that match a row of `table`
+    :rtype: pandas.DataFrame
+    """
+    col = names.name
+    _, categories = device_codes(names)
+    if table.index.name == col:
+        table = table.reset_index()
+    devices = pd.DataFrame({col: np.asarray(categories, dtype=object)})
+    devices[col + '.ID'] = get_device_id(devices[col]).values
+    on = [c for c in devices.columns if c in table.columns]
+    if not on:
+        raise ValueError("Metadata table has neither a {0} nor a {0}.ID column".format(col))
+    table = table.astype({c: devices[c].dtype for c in on if c == col})
+    dimension = devices.merge(table, on=on).drop_duplicates(subset=[col])
+    return dimension.set_index(col)
+
+
+def make_device_dimensions(df, metadata):
+    """
+    Dimension tables (see py:device_dimension()) of the receivers and transmitters of detections
+    `df`, built from metadata.receiver and metadata.transmitter where these are available.
+
+    :return: Dimension tables keyed by device column ('Receiver', 'Transmitter')
+    :rtype: sklearn.utils.Bunch
+    """
+    dimensions = Bunch()
+    for col, table in zip(device_columns, [metadata.get('receiver'), metadata.get('transmitter')]):
+        if table is not None and col in df.columns:
+            dimensions[col] = device_dimension(df[col], table)
+    return dimensions
+
+
+def device_rows(df, dimensions, col):
+    """Row position in dimensions[col] of the device of each row of `df`, -1 if the device has
+    no attributes"""
+    codes, categories = device_codes(df[col])
+    return np.append(dimensions[col].index.get_indexer(categories), -1)[codes]
+
+
+def has_device_attributes(df, dimensions):
+    """Boolean mask of the rows of `df` whose devices have a row in every dimension table, i.e. the
+    rows that an inner merge with the metadata tables keeps"""
+    keep = np.ones(len(df), dtype=bool)
+    for col in dimensions:
+        keep &= device_rows(df, dimensions, col) >= 0
+    return keep
+
+
+def resolve_attributes(df, dimensions, columns):
+    """
+    Device attributes of each row of `df`, taken from the dimension tables by integer position
+    instead of merging them into `df`.
+
+    :param df: DataFrame with device name columns, e.g. detections or bins
+    :type df: pandas.DataFrame
+
+    :param dimensions: Dimension tables, as returned by py:make_device_dimensions()
+    :type dimensions: sklearn.utils.Bunch
+
+    :param columns: Attribute columns, e.g. ['Receiver.lat', 'Transmitter.Avg delay']
+    :type columns: list
+
+    :return: Attributes with the index of `df`, NaN for devices without attributes
+    :rtype: pandas.DataFrame
+    """
+    rows = {}
+    resolved = {}
+    for column in columns:
+        col = next((c for c, dim in dimensions.items() if column in dim.columns), None)
+        if col is None:
+            raise KeyError("No dimension table has a {} column".format(column))
+        if col not in rows:
+            rows[col] = device_rows(df, dimensions, col)
+        resolved[column] = pd.api.extensions.take(dimensions[col][column].values, rows[col],
+                                                  allow_fill=True)
+    return pd.DataFrame(resolved, index=df.index, columns=list(columns))
 
 
 def rt_info(grdf, metabunch):
@@ -0,0 +1,156 @@
+"""
+    Independent per-group work on chunks of receiver/transmitter groups, run serially or in a pool
+    of threads or processes.
+
+    The rows of each group are consecutive. Workers receive the NumPy arrays of a chunk of whole
+    groups, which are much cheaper to send to other processes than pickled DataFrames.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import numpy as np
+
+executor_classes = {
+    'thread': ThreadPoolExecutor,
+    'process': ProcessPoolExecutor,
+}
+
+
+class GroupExecutor:
+    """ Runs functions of group arrays on chunks of consecutive groups with about the same number
+    of rows, one chunk per worker.
+
+    Args:
+        backend: "serial", "thread", or "process". Functions run with "process" must be picklable,
+            i.e. defined at module level.
+        workers: number of threads or processes, None for the number of CPUs
+        min_chunk_rows: fewest rows worth sending to a worker, smaller inputs run serially
+    """
+    backends = ['serial', *executor_classes]
+
+    def __init__(self, backend='serial', workers=None, min_chunk_rows=100000):
+        if backend not in self.backends:
+            raise ValueError("Unknown group executor backend {}, use one of {}".format(
+                backend, self.backends))
+        self.backend = backend
+        self.workers = 1 if backend == 'serial' else (workers or os.cpu_count() or 1)
+        self.min_chunk_rows = min_chunk_rows
+        self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+
+    def __getstate__(self):
+        # the pool stays with the process that created it
+        state = self.__dict__.copy()
+        state['_pool'] = None
+        return state
+
+    def pool(self):
+        """The thread or process pool, started on first use and reused by later calls"""
+        if self._pool is None:
+            self._pool = executor_classes[self.backend](max_workers=self.workers)
+        return self._pool
+
+    def shutdown(self):
+        """Stop the workers, a later call starts new ones"""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def chunk_bounds(self, gsize):
+        """
+        Split groups into chunks of consecutive groups with about the same number of rows.
+
+        :param gsize: Number of rows of each group
+        :type gsize: numpy.ndarray
+
+        :return: Index of the first group of each chunk, followed by the number of groups
+        :rtype: numpy.ndarray
+        """
+        num_rows = int(np.sum(gsize))
+        num_chunks = max(min(self.workers, num_rows // self.min_chunk_rows, len(gsize)), 1)
+        row_ends = np.cumsum(gsize)
+        # chunks end with the first group that reaches each equal share of the rows
+        inner = np.searchsorted(row_ends, num_rows * np.arange(1, num_chunks) / num_chunks) + 1
+        return np.unique(np.concatenate(([0], inner, [len(gsize)])))
+
+    def map_groups(self, func, gsize, rows=(), groups=(), **kwargs):
+        """
+        Call func(*rows, gsize, *groups, **kwargs) for chunks of consecutive groups and concatenate
+        the results, which are the same as of a single call for all groups.
+
+        :param func: Function that returns a tuple of NumPy arrays, each with one value per row or
+            one value per group of its input
+        :type func: callable
+
+        :param gsize: Number of rows of each group
+        :type gsize: numpy.ndarray
+
+        :param rows: Arrays with one value per row, the rows of each group are consecutive
+        :type rows: tuple
+
+        :param groups: Arrays with one value per group
+        :type groups: tuple
+
+        :return: Concatenated results of all chunks
+        :rtype: tuple
+        """
+        bounds = self.chunk_bounds(gsize)
+        if len(bounds) <= 2:
+            return func(*rows, gsize, *groups, **kwargs)
+        row_bounds = np.concatenate(([0], np.cumsum(gsize)))[bounds]
+        pool = self.pool()
+        futures = [pool.submit(func,
+                               *(r[row_start:row_stop] for r in rows),
+                               gsize[start:stop],
+                               *(g[start:stop] for g in groups),
+                               **kwargs)
+                   for start, stop, row_start, row_stop in zip(bounds[:-1], bounds[1:],
+                                                               row_bounds[:-1], row_bounds[1:])]
+        results = [future.result() for future in futures]
+        return tuple(np.concatenate(parts) for parts in zip(*results))
+
+
+serial_executor = GroupExecutor()
+
+
+def make_group_executor(parallel=None):
+    """
+    Group executor for the `settings.parallel` config entry.
+
+    :param parallel: None or False for serial execution, a backend name ("serial", "thread",
+        "process"), or a dict of py:GroupExecutor arguments, e.g. {backend: process, workers: 32}
+    :type parallel: str or dict
+
+    :rtype: GroupExecutor
+    """
+    if not parallel:
+        return GroupExecutor()
+    if isinstance(parallel, str):
+        return GroupExecutor(parallel)
+    return GroupExecutor(**parallel)
+
+
+def group_sizes(gcodes):
+    """
+    Order of the rows by group, keeping the row order within each group, and the size of each
+    group.
+
+    :param gcodes: Group number of each row, -1 for rows that belong to no group, see
+        py:rt_group_codes()
+    :type gcodes: numpy.ndarray
+
+    :return: - **order** (`numpy.ndarray`) - positions of the rows of all groups, group by group
+             - **gsize** (`numpy.ndarray`) - number of rows of each group that occurs
+    """
+    order = np.argsort(gcodes, kind='stable')
+    order = order[gcodes[order] >= 0]
+    gcodes = gcodes[order]
+    new_group = np.ones(len(order), dtype=bool)
+    new_group[1:] = gcodes[1:] != gcodes[:-1]
+    gstart = np.flatnonzero(new_group)
+    return order, np.diff(np.append(gstart, len(order)))
@@ -2,35 +2,39 @@
     tidal table processing
 """
 
+import os
+import uuid
+import zipfile
+
 import pandas as pd
 import numpy as np
 from range_driver.utils import *
+from .timestamps import datetime_from_components, month_number, parse_datetimes
 
 
 def flatten_tidal_table(df, year, format_str="%d %B %Y %H%M", display=False):
     """ Convert a multi-column tidal table (up to 4 extrema per day) into a flat
         datetime indexed DataFrame.
-        `df` is expected to have time1, height1, time2, height2, ..., height4 columns
+        `df` is expected to have time1, height1, time2, height2, ..., height4 columns.
+        With the default `format_str`, times are assembled from the numeric Day, Month (name),
+        `year`, and HHMM time components. Other formats are parsed from the concatenated strings.
     """
-    dflat = None
+    dffs = []
     for cn in range(1,5):
         tc = "time{}".format(cn)
         hc = "height{}".format(cn)
         timehhmm = df[tc]
         heights = df[hc]
-        if False: # don't interpolate, just drop NaN's
-            heights = heights.interpolate("linear")
-            timehhmm = timehhmm.interpolate("pad")
-        is_miss = df[hc].isnull()
-        dff = pd.concat([pd.to_datetime(
-                            df['Day'].map(int).map(str) + " " + df['Month'] + " {} ".format(year) + timehhmm,
-                            format=format_str).rename("time"),
-                         heights.rename("height")],
-                        axis=1).set_index("time")
-        if dflat is None:
-            dflat = dff
+        if format_str == "%d %B %Y %H%M":
+            hhmm = pd.to_numeric(timehhmm, errors='coerce').values
+            times = datetime_from_components(year, month_number(df['Month']), df['Day'].values,
+                                             hhmm // 100, hhmm % 100)
         else:
-            dflat = dflat.append(dff)
+            times = parse_datetimes(
+                df['Day'].map(int).map(str) + " " + df['Month'] + " {} ".format(year) + timehhmm,
+                format=format_str).values
+        dffs.append(pd.DataFrame({"time": times, "height": heights.values}).set_index("time"))
+    dflat = pd.concat(dffs)
     dflat = dflat.dropna().sort_values(by="time")
     rising = (dflat["height"].diff(-1) < 0).values   # diff(-1) is current - next value, last is NaN
     rising[-1] = not rising[-2]
@@ -51,6 +55,11 @@ def ipf_cos(t):
     return 0.5 * (1-np.cos(t*np.pi))
 
 
+def ipf_cos_derivative(t):
+    """ Derivative of py:ipf_cos() with respect to t """
+    return 0.5 * np.pi * np.sin(t*np.pi)
+
+
 def tidal_phase(dflat, new_times=None, interpolation_func=ipf_cos):
     """ Calcualte tidal phase and tidal height changes
         `dflat` DataFrame is expected to have datetime index and columns
@@ -90,3 +99,183 @@ def tidal_phase(dflat, new_times=None, interpolation_func=ipf_cos):
 
     dfi['dheight_cm_per_hr'] = -dfi['height'].diff(-1)[:-1] / ((dfi.index[1:] - dfi.index[:-1]) / pd.Timedelta("1h"))
     return dfi
+
+
+def tidal_phase_at(dflat, times, interpolation_func=ipf_cos, derivative_func=ipf_cos_derivative):
+    """
+    Tidal phase and height at the given times, evaluated directly from the tidal extrema.
+
+    Each time is located between the preceding and the following extremum of `dflat` by a binary
+    search, like the padding of py:tidal_phase(), but without a table of the union of all times.
+    The rate of change of the height is the derivative of the interpolation rather than a finite
+    difference to the next time.
+
+    :param dflat: Tidal extrema as returned by py:flatten_tidal_table(), with a sorted datetime
+        index and columns 'height' and 'highlow'
+    :type dflat: pandas.DataFrame
+
+    :param times: Times to evaluate the tide at, in any order and with repetitions
+    :type times: array-like of datetime64
+
+    :param interpolation_func: Interpolation of the height between extrema, a function of the
+        phase t in [0, 1]
+    :type interpolation_func: callable
+
+    :param derivative_func: Derivative of `interpolation_func`
+    :type derivative_func: callable
+
+    :return: DataFrame indexed by `times` with the phase 't' in [0, 1] since the last extremum,
+             't2' in [0, 2] since the last high tide, the interpolated 'height', and its rate of
+             change per hour 'dheight_cm_per_hr'. Times before the first extremum have NaN values,
+             times after the last one continue the interval before it.
+    :rtype: pandas.DataFrame
+    """
+    times = pd.DatetimeIndex(np.asarray(times, dtype='datetime64[ns]'))
+    tns = dflat.index.values.astype('datetime64[ns]').astype('int64')
+    heights = dflat['height'].values.astype(float)
+    # duration and height change to the next extremum, the last extremum continues the interval
+    # before it
+    duration = np.diff(tns).astype(float)
+    duration = np.append(duration, duration[-1])
+    height_change = np.diff(heights)
+    height_change = np.append(height_change, height_change[-1])
+    is_high = (dflat['highlow'].values == 'h')
+
+    # last extremum at or before each time
+    idx = np.searchsorted(tns, times.asi8, side='right') - 1
+    valid = (idx >= 0) & ~times.isna()
+    idx = np.where(valid, idx, 0)
+
+    t = np.where(valid, (times.asi8 - tns[idx]) / duration[idx], np.nan)
+    change = np.where(valid, height_change[idx], np.nan)
+    return pd.DataFrame({
+        't': t,
+        't2': t + is_high[idx],
+        'height': heights[idx] + change * interpolation_func(t),
+        'dheight_cm_per_hr': change * derivative_func(t) / (duration[idx] / 3600e9),
+    }, index=times)
+
+
+class TidalLookup:
+    """ Tidal phase and height precomputed on a regular time grid (see py:tidal_phase_at()), so
+    that queries are answered by integer indexing rather than by a search of the extrema. Build
+    with py:TidalLookup.from_extrema(), or load a saved table with py:TidalLookup.load().
+
+    Args:
+        origin: time of the first grid point
+        step: grid spacing
+        values: array with a row per grid point and a column for each of `columns`
+        dflat: the tidal extrema the table was computed from
+        key: optional identity of the inputs, to check that a saved table is current
+    """
+    columns = ['t', 't2', 'height', 'dheight_cm_per_hr']
+    # phases restart at each extremum, linear refinement interpolates across the restart
+    periods = {'t': 1., 't2': 2.}
+
+    def __init__(self, origin, step, values, dflat, key=None):
+        self.origin = pd.Timestamp(origin)
+        self.step = pd.Timedelta(step)
+        self.values = values
+        self.dflat = dflat
+        self.key = key
+
+    @classmethod
+    def from_extrema(cls, dflat, resolution='1min', start=None, end=None, key=None):
+        """
+        Tidal lookup table of the extrema `dflat` as returned by py:flatten_tidal_table(), with
+        grid spacing `resolution`, from `start` to `end` (default: the range of the extrema)
+        """
+        step = pd.Timedelta(resolution)
+        start = pd.Timestamp(dflat.index[0] if start is None else start).floor(step)
+        end = pd.Timestamp(dflat.index[-1] if end is None else end).ceil(step)
+        grid = pd.date_range(start, end, freq=step)
+        values = tidal_phase_at(dflat, grid.values)[cls.columns].values
+        return cls(start, step, values, dflat[['height', 'highlow']], key)
+
+    def lookup(self, times, linear=True):
+        """
+        Tidal values at `times` interpolated linearly between the grid points around each time, or
+        without `linear`, from the nearest grid point. Times outside of the grid are evaluated
+        exactly by py:tidal_phase_at().
+
+        :param times: Times to look up, in any order and with repetitions
+        :type times: array-like of datetime64
+
+        :param linear: Whether to interpolate linearly between grid points
+        :type linear: bool
+
+        :return: DataFrame indexed by `times` with the columns of py:tidal_phase_at()
+        :rtype: pandas.DataFrame
+        """
+        times = pd.DatetimeIndex(np.asarray(times, dtype='datetime64[ns]'))
+        pos = (times.asi8 - self.origin.value) / self.step.value
+        num = len(self.values)
+        if not linear:
+            idx = np.rint(pos)
+            valid = (idx >= 0) & (idx < num) & ~times.isna()
+            values = self.values[np.where(valid, idx, 0).astype(np.int64)]
+        else:
+            valid = (pos >= 0) & (pos <= num - 1) & ~times.isna()
+            pos = np.where(valid, pos, 0)
+            idx = np.minimum(np.floor(pos).astype(np.int64), max(num - 2, 0))
+            frac = (pos - idx)[:, None]
+            low, high = self.values[idx], self.values[np.minimum(idx + 1, num - 1)]
+            for col, period in self.periods.items():
+                c = self.columns.index(col)
+                wrapped = high[:, c] < low[:, c]
+                high[wrapped, c] += period
+            values = low + frac * (high - low)
+            for col, period in self.periods.items():
+                c = self.columns.index(col)
+                values[:, c] = np.where(values[:, c] >= period, values[:, c] - period, values[:, c])
+        values[~valid] = np.nan
+        outside = np.isnan(values).any(axis=1) & ~times.isna()
+        if outside.any():
+            values[outside] = tidal_phase_at(self.dflat, times[outside].values)[self.columns].values
+        return pd.DataFrame(values, columns=self.columns, index=times)
+
+    def frame(self, start=None, end=None):
+        """The grid points from `start` to `end` as a DataFrame indexed by time"""
+        index = self.origin + np.arange(len(self.values)) * self.step
+        df = pd.DataFrame(self.values, columns=self.columns, index=index)
+        return df.loc[start:end]
+
+    def save(self, path):
+        """Save the table as a NumPy .npz file `path`, atomically"""
+        # write to a temporary file first, so that readers never see a partial table
+        tmp_path = os.path.join(os.path.dirname(os.path.abspath(path)),
+                                '.{}.tmp.npz'.format(uuid.uuid4().hex))
+        try:
+            np.savez(tmp_path, origin=self.origin.value, step=self.step.value, values=self.values,
+                     flat_time=self.dflat.index.values.astype('datetime64[ns]').astype('int64'),
+                     flat_height=self.dflat['height'].values.astype(float),
+                     flat_highlow=self.dflat['highlow'].values.astype(str),
+                     key=str(self.key))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, key=None):
+        """The table saved to `path` by py:TidalLookup.save(), None if there is none or if `key`
+        is given and differs from the key of the saved table. Unreadable files, e.g. truncated
+        ones, count as missing, so that the caller rebuilds and saves the table."""
+        try:
+            with np.load(path) as data:
+                if key is not None and str(data['key']) != str(key):
+                    return None
+                dflat = pd.DataFrame({'height': data['flat_height'],
+                                      'highlow': data['flat_highlow'].astype(object)},
+                                     index=pd.DatetimeIndex(data['flat_time'].astype('datetime64[ns]'),
+                                                            name='time'))
+                return cls(pd.Timestamp(int(data['origin'])), pd.Timedelta(int(data['step'])),
+                           data['values'], dflat, str(data['key']))
+        except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile):
+            return None
+
+
+def tidal_lookup_path(tidal_interpolation_output_csv):
+    """Path of the py:TidalLookup table saved next to the tidal interpolation output CSV"""
+    return os.path.splitext(tidal_interpolation_output_csv)[0] + '_lookup.npz'
@@ -0,0 +1,195 @@
+"""
+    Fast parsing of timestamps in detection exports, metadata, and tidal tables.
+
+    The format of a column is detected once from a sample of its values. Fixed-width ISO 8601
+    timestamps ("2016-03-09 14:23:05") are converted to int64 nanoseconds directly from their
+    digits. Other formats are parsed with the detected format, once per distinct value.
+"""
+
+import calendar
+import re
+
+import numpy as np
+import pandas as pd
+
+try:
+    from pandas._libs.tslibs.parsing import guess_datetime_format
+except ImportError:
+    guess_datetime_format = None
+
+# fixed-width ISO formats handled by parse_iso_fixed_width(), with their string widths
+iso_fixed_formats = {
+    '%Y-%m-%d %H:%M': 16,
+    '%Y-%m-%d %H:%M:%S': 19,
+    '%Y-%m-%dT%H:%M': 16,
+    '%Y-%m-%dT%H:%M:%S': 19,
+}
+iso_fraction_pattern = re.compile(r'^\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}\.\d{1,9}$')
+
+month_numbers = {name.lower(): number
+                 for names in (calendar.month_name, calendar.month_abbr)
+                 for number, name in enumerate(names) if name}
+
+
+def days_from_civil(year, month, day):
+    """Days since 1970-01-01 of proleptic Gregorian dates given as integer arrays"""
+    year = year - (month <= 2)
+    era = np.floor_divide(year, 400)
+    year_of_era = year - era * 400
+    day_of_year = (153 * (month + np.where(month > 2, -3, 9)) + 2) // 5 + day - 1
+    day_of_era = year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year
+    return era * 146097 + day_of_era - 719468
+
+
+def datetime_from_components(year, month, day, hour=0, minute=0, second=0):
+    """
+    Assemble datetimes from numeric date and time components, which are broadcast against each
+    other. Rows with a missing (NaN) component are NaT.
+
+    :rtype: numpy.ndarray of datetime64[ns]
+    """
+    components = np.broadcast_arrays(*(np.asarray(c, dtype=float)
+                                       for c in (year, month, day, hour, minute, second)))
+    valid = np.logical_and.reduce([~np.isnan(c) for c in components])
+    year, month, day, hour, minute, second = (np.where(valid, c, 1).astype('int64')
+                                              for c in components)
+    seconds = days_from_civil(year, month, day) * 86400 + hour * 3600 + minute * 60 + second
+    ns = np.where(valid, seconds * 10**9, np.iinfo('int64').min)
+    return ns.view('datetime64[ns]')
+
+
+def month_number(month_names):
+    """Month numbers (1-12) of full or abbreviated English month names, NaN if unknown"""
+    return pd.Series(month_names).str.strip().str.lower().map(month_numbers).values
+
+
+def detect_datetime_format(values, sample_size=100):
+    """
+    Detect the strftime format of string timestamps from a sample of non-null values.
+
+    :return: The format if all sampled values share it, otherwise None
+    :rtype: str
+    """
+    values = np.asarray(values, dtype=object)
+    sample_size = min(sample_size, len(values))
+    sample = pd.Series(values[np.linspace(0, len(values) - 1, sample_size).astype(int)]).dropna()
+    if len(sample) < sample_size // 2:
+        # mostly nulls at the sampled positions, sample the non-null values instead
+        non_null = values[~pd.isnull(values)]
+        sample = pd.Series(non_null[np.linspace(0, len(non_null) - 1,
+                                                min(sample_size, len(non_null))).astype(int)])
+    if not len(sample) or not all(isinstance(v, str) for v in sample):
+        return None
+    if all(iso_fraction_pattern.match(v) for v in sample):
+        return '%Y-%m-%d' + sample.iloc[0][10] + '%H:%M:%S.%f'
+    if guess_datetime_format is None:
+        return None
+    formats = set(guess_datetime_format(v) for v in sample)
+    if len(formats) == 1:
+        return formats.pop()
+    return None
+
+
+def parse_iso_fixed_width(values, width):
+    """
+    Parse ISO 8601 timestamps of the given fixed width ("YYYY-MM-DD HH:MM[:SS[.fffffffff]]",
+    with " " or "T" separator) from their digits.
+
+    :return: Parsed timestamps, or None if any value does not have this form
+    :rtype: numpy.ndarray of datetime64[ns]
+    """
+    try:
+        # one extra byte to detect longer values, which would otherwise be truncated
+        chars = np.asarray(values, dtype='S{}'.format(width + 1))
+    except UnicodeEncodeError:
+        return None
+    # one contiguous row of bytes per character position
+    chars = chars.view(np.uint8).reshape(len(chars), width + 1).T.copy()
+    if chars[width].any():
+        return None
+    separators = {4: b'-', 7: b'-', 10: b' T', 13: b':', 16: b':', 19: b'.'}
+    for k, sep in separators.items():
+        if k < width and not np.logical_or.reduce([chars[k] == c for c in sep]).all():
+            return None
+    # digits wrap around to large values for characters below '0'
+    digits = chars - np.uint8(ord('0'))
+    if not all((digits[k] <= 9).all() for k in range(width) if k not in separators):
+        return None
+
+    def number(start, stop):
+        result = digits[start].astype('int32')
+        for k in range(start + 1, stop):
+            result *= 10
+            result += digits[k]
+        return result
+
+    year, month, day = number(0, 4), number(5, 7), number(8, 10)
+    hour, minute = number(11, 13), number(14, 16)
+    second = number(17, 19) if width >= 19 else 0
+    leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    month_days = np.array([0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+    if not (((month >= 1) & (month <= 12)).all() and (hour < 24).all() and (minute < 60).all()
+            and (np.asarray(second) < 60).all() and (day >= 1).all()
+            and (day <= month_days[np.clip(month, 0, 12)] + (leap & (month == 2))).all()):
+        return None
+    seconds = (days_from_civil(year, month, day) * 86400 + hour * 3600 + minute * 60
+               + second).astype('int64')
+    nanoseconds = seconds * 10**9
+    if width > 20:
+        nanoseconds += number(20, width).astype('int64') * 10**(9 - (width - 20))
+    return nanoseconds.view('datetime64[ns]')
+
+
+def parse_datetimes(values, format=None):
+    """
+    Parse timestamps, equivalent to pd.to_datetime(values) but faster for large columns.
+    Timestamps with UTC offsets are time zone aware, like those of pd.to_datetime().
+
+    Values that are already datetimes are passed to pd.to_datetime(). Otherwise the format is
+    detected once (see py:detect_datetime_format()) unless given. Fixed-width ISO timestamps are
+    parsed from their digits (see py:parse_iso_fixed_width()). Other values are parsed with the
+    format, once per distinct value.
+
+    :param values: Timestamps, typically strings
+    :type values: pandas.Series or array-like
+
+    :param format: Optional strftime format of the values
+    :type format: str
+
+    :return: Parsed timestamps, a Series with the index and name of `values` if it is a Series
+    :rtype: pandas.Series or pandas.DatetimeIndex
+    """
+    series = values if isinstance(values, pd.Series) else None
+    values = pd.Series(values) if series is None else series
+    if values.dtype != object:
+        return pd.to_datetime(series if series is not None else values.values)
+    if format is None:
+        format = detect_datetime_format(values)
+
+    isnull = pd.isnull(values.values)
+    parsed = None
+    if format is not None and ('%Y-%m-%d %H:%M:%S.%f' == format.replace('T', ' ')
+                               or format in iso_fixed_formats):
+        non_null = values.values[~isnull] if isnull.any() else values.values
+        if len(non_null):
+            width = iso_fixed_formats.get(format) or len(non_null[0])
+            parsed_non_null = parse_iso_fixed_width(non_null, width)
+            if parsed_non_null is not None:
+                parsed = np.full(len(values), np.datetime64('NaT'), dtype='datetime64[ns]')
+                parsed[~isnull] = parsed_non_null
+    if parsed is None:
+        # parse each distinct value once
+        codes, uniques = pd.factorize(values)
+        if not len(uniques):
+            parsed = np.full(len(values), np.datetime64('NaT'), dtype='datetime64[ns]')
+        else:
+            try:
+                parsed_uniques = pd.to_datetime(uniques, format=format)
+            except (ValueError, TypeError):
+                parsed_uniques = pd.to_datetime(uniques)
+            # an index rather than its values keeps the time zone of UTC offsets
+            parsed = parsed_uniques.take(codes, allow_fill=True, fill_value=pd.NaT)
+
+    if series is not None:
+        return pd.Series(parsed, index=series.index, name=series.name)
+    return pd.DatetimeIndex(parsed)
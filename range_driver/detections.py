@@ -1,48 +1,249 @@
+import os
+import pickle
+import shutil
+from functools import partial
+try:
+    import resource
+except ImportError:     # not available on Windows
+    resource = None
 from pandas_ods_reader import read_ods
 from .data_prep import *   # (process_intervals, detection_rate_grid)
 from .data_prep import environment
+from .data_prep.parallel import make_group_executor
+from . import partitioned
 from .dict_utils import *
+from .cache import DiskCache, file_identity, file_identities, fingerprint
+from .pandas_utils import array_owners, downcast_frame, owners_bytes, with_columns
 
 class Detections:
     """ Manage detections: load, process, enhance, access """
 
+    # tidal lookup tables by fingerprint of their inputs, shared by all instances
+    tidal_lookups = {}
+
     def __init__(self, config=None, do_processing=True):
+        if config is not None and config.settings.get('pipeline', False):
+            if config.reader.get('out_of_core'):
+                raise ValueError("Pipeline mode is not supported with out-of-core detections")
+            self.reset()
+            self.config = config
+            self.run_pipeline(None if do_processing else 'read')
+            return
         self.init_via_config(config)
-        if do_processing:
-            self.make_detection_rate()
-            self.events_df, self.bins_df = self.get_events_bins(self.detection_df)
-            self.prepare_rt_groups()
-            self.add_env_data()
-            self.add_custom_data()
-            self.add_tidal_data()
-            self.add_calculated_columns()
-            self.prepare_group_data()
+        if do_processing and self.out_of_core:
+            self.process_out_of_core()
+        elif do_processing:
+            self.run_stage('detection_rate')
+            self.process_bins()
+
+    def process_bins(self):
+        """Run the processing stages that follow the detection rate calculation"""
+        for name in ['events_bins', 'rt_groups', 'env_data', 'custom_data', 'tidal_data',
+                     'calculated_columns', 'group_data']:
+            self.run_stage(name)
 
     def reset(self):
         self.config = None
         self.detection_df = None
         self.mdb = None
+        self.raw_detection_df = None
         self.df_dets = None
         self.df_inits = None
+        self.dr_cube = None
         self.event_bin_split = None
         self.events_df = None
         self.bins_df = None
         self.detection_env_df = None
         self.axes_to_interpolate = None
+        self.stage_keys = []
+        self.checkpoints = {}
+        self.stage_memory = {}
+        # sizes of the object arrays measured by memory_usage(), see py:memory_bytes()
+        self.object_sizes = {}
+        self.ingested = []
+        self._group_executor = None
  
     def init_via_config(self, config):
         self.reset()
         self.config = config
-        self.detection_df, self.mdb = read_via_config(self.config)
+        self.run_stage('read')
+
+    # ------------------------------------------------------------------------
+    # pipeline mode: checkpoint each stage, rerun only the stages whose inputs changed
+
+    # (stage name, method, config entries the stage depends on, attributes it sets)
+    pipeline_stages = [
+        ('read', 'read_data', ['reader', 'settings.memory_lean'], ['detection_df', 'mdb']),
+        ('detection_rate', 'make_detection_rate',
+         ['settings.time_bin_length', 'settings.base_bin_length', 'settings.auto_dr',
+          'settings.ingest'],
+         ['raw_detection_df', 'df_dets', 'df_inits', 'dr_cube', 'detection_df', 'event_bin_split',
+          'mdb']),
+        ('events_bins', 'make_events_bins', [], ['events_df', 'bins_df']),
+        ('rt_groups', 'prepare_rt_groups', ['settings.distance_method'], ['mdb']),
+        ('env_data', 'add_env_data',
+         ['data.sources', 'bounds', 'settings.interpolation', 'settings.env_time_resolution'],
+         ['df_detections_env', 'kadlu_result']),
+        ('custom_data', 'add_custom_data',
+         ['file_map', 'settings.interpolation', 'settings.env_time_resolution'],
+         ['df_detections_env', 'axes_to_interpolate']),
+        ('tidal_data', 'add_tidal_data', ['data.tidal'],
+         ['df_detections_env', 'df_tidal_times', 'df_tidal_flat', 'df_tidal_interp']),
+        ('calculated_columns', 'add_calculated_columns', ['data.calculated_columns'],
+         ['df_detections_env']),
+        ('group_data', 'prepare_group_data', [],
+         ['detection_events_df', 'detection_bins_df', 'rt_group_detections']),
+    ]
+
+    def read_data(self):
+        self.detection_df, self.mdb = read_via_config(self.config, self.cache)
+        self.detection_df = self.lean_frame(self.detection_df)
+
+    def run_stage(self, name):
+        """Run processing stage `name` of pipeline_stages and record the memory usage after it"""
+        method = next(method for stage, method, *_ in self.pipeline_stages if stage == name)
+        getattr(self, method)()
+        self.record_memory(name)
+
+    def make_events_bins(self):
+        self.events_df, self.bins_df = self.get_events_bins(self.detection_df)
+
+    def config_value(self, path):
+        """Config entry for dotted `path` like "settings.auto_dr", None if it is not set. Paths
+        of existing files are replaced by their py:file_identity(), so that changed input files
+        invalidate the stages that read them."""
+        value = self.config
+        for key in path.split('.'):
+            try:
+                value = value[key]
+            except (KeyError, TypeError):
+                return None
+        return file_identities(value)
+
+    def stage_fingerprints(self):
+        """Fingerprint of each pipeline stage from its config entries and the fingerprint of the
+        preceding stage, which stands for the upstream outputs. Detections added by py:ingest()
+        are part of the inputs of the first stage."""
+        keys, key = [], fingerprint(*self.ingested) if self.ingested else None
+        for name, _, config_paths, _ in self.pipeline_stages:
+            key = fingerprint(name, key, *[self.config_value(path) for path in config_paths])
+            keys.append(key)
+        return keys
+
+    def get_checkpoint(self, key):
+        cache = self.cache
+        if cache is not None:
+            return cache.get_object(key)
+        return pickle.loads(self.checkpoints[key]) if key in self.checkpoints else None
+
+    def put_checkpoint(self, key, outputs):
+        cache = self.cache
+        if cache is not None:
+            cache.put_object(key, outputs)
+        else:
+            self.checkpoints[key] = pickle.dumps(outputs, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def has_checkpoint(self, key):
+        cache = self.cache
+        return key in cache if cache is not None else key in self.checkpoints
+
+    def run_pipeline(self, last_stage=None):
+        """Run the processing stages up to and including `last_stage` (default: all).
+
+        The outputs of each stage are checkpointed under a fingerprint of its inputs, in
+        `settings.cache_dir` if configured, otherwise in memory. Stages whose fingerprint did not
+        change since a previous run are restored from their checkpoints instead of being rerun.
+        E.g. after editing `data.calculated_columns` only the last two stages run, and changing
+        `settings.time_bin_length` does not re-read the detections and metadata.
+
+        :return: Names of the stages that were run
+        :rtype: list
+        """
+        stages = self.pipeline_stages
+        if last_stage is not None:
+            stages = stages[:[name for name, *_ in stages].index(last_stage) + 1]
+        keys = self.stage_fingerprints()[:len(stages)]
+        if self.stage_keys[:len(keys)] == keys:
+            return []
+
+        # first stage without checkpoint
+        start = next((i for i, key in enumerate(keys) if not self.has_checkpoint(key)), len(keys))
+        while True:
+            # restore each attribute from the last checkpointed stage that set it
+            restore = {}
+            for i in range(start):
+                restore.update(dict.fromkeys(stages[i][3], i))
+            outputs = {}
+            for i in sorted(set(restore.values())):
+                outputs[i] = self.get_checkpoint(keys[i])
+                if outputs[i] is None:
+                    break
+            else:
+                break
+            # the checkpoint was evicted from the cache since has_checkpoint(), resume before it
+            start = i
+        for attr, i in restore.items():
+            setattr(self, attr, outputs[i][attr])
+
+        for (name, method, _, attrs), key in zip(stages[start:], keys[start:]):
+            self.run_stage(name)
+            self.put_checkpoint(key, {attr: getattr(self, attr, None) for attr in attrs})
+        self.stage_keys = keys
+        return [name for name, *_ in stages[start:]]
+
+    # ------------------------------------------------------------------------
 
     def make_detection_rate(self):
+        # detections as read, the history that py:ingest() appends to, only kept if enabled
+        self.raw_detection_df = self.detection_df if self.ingest_enabled else None
         self.df_dets, self.df_inits, _ = process_intervals(self.detection_df,
-                                                           self.mdb)
-        self.detection_df, self.event_bin_split = detection_rate_grid(self.df_dets, 
-                                                                      self.config.settings.time_bin_length,
-                                                                      self.mdb,
-                                                                      self.config.settings.auto_dr)
-    
+                                                           self.mdb,
+                                                           executor=self.group_executor)
+        self.dr_cube = detection_rate_cube(self.df_dets, self.mdb, self.base_bin_length)
+        if self.memory_lean:
+            # the cube holds the time sorted detection events
+            self.dr_cube.events = self.lean_frame(self.dr_cube.events)
+            self.df_dets = None
+        self.detection_df, self.event_bin_split = detection_rate_level(self.dr_cube,
+                                                                       self.config.settings.time_bin_length,
+                                                                       self.mdb,
+                                                                       self.config.settings.auto_dr,
+                                                                       self.group_executor)
+        self.detection_df = self.lean_frame(self.detection_df)
+
+    def set_time_bin_length(self, time_bin_length):
+        """Switch to another time bin length without re-reading or re-processing the detections.
+
+        Detection rates are derived from the detection rate cube, which requires `time_bin_length`
+        to be a multiple of `settings.base_bin_length`. Later processing stages are rerun.
+        """
+        self.config.settings.time_bin_length = time_bin_length
+        self.detection_df, self.event_bin_split = detection_rate_level(self.dr_cube,
+                                                                       time_bin_length,
+                                                                       self.mdb,
+                                                                       self.config.settings.auto_dr,
+                                                                       self.group_executor)
+        self.detection_df = self.lean_frame(self.detection_df)
+        self.process_bins()
+
+    @property
+    def group_executor(self):
+        """py:GroupExecutor for the per-group processing steps, as configured by
+        `settings.parallel` (see py:make_group_executor()), serial if not configured"""
+        parallel = self.config.settings.get('parallel')
+        if self._group_executor is None or self._group_executor_config != parallel:
+            if self._group_executor is not None:
+                self._group_executor.shutdown()
+            self._group_executor = make_group_executor(parallel)
+            self._group_executor_config = parallel
+        return self._group_executor
+
+    @property
+    def base_bin_length(self):
+        """Finest time bin length of the detection rate cube, `settings.base_bin_length` if
+        configured, otherwise `settings.time_bin_length`"""
+        return self.config.settings.get('base_bin_length', self.config.settings.time_bin_length)
+
     @property
     def bounds(self):
         bounds_keys = ['north','south','east','west','top','bottom','start','end']
@@ -52,6 +253,37 @@ class Detections:
     def sources(self):
         return self.config.data.sources
 
+    @property
+    def interpolation_method(self):
+        """Interpolation of environmental data, `settings.interpolation` or "nearest" """
+        return self.config.settings.get('interpolation', 'nearest')
+
+    @property
+    def env_time_resolution(self):
+        """Resolution to which detection times are rounded before environmental data lookup,
+        `settings.env_time_resolution` or None for exact times"""
+        return self.config.settings.get('env_time_resolution')
+
+    @property
+    def ingest_enabled(self):
+        """Whether py:ingest() is enabled, `settings.ingest`: the detections as read are kept, so
+        that new detections can be appended to them"""
+        return bool(self.config.settings.get('ingest', False))
+
+    @property
+    def memory_lean(self):
+        """Memory-lean mode, `settings.memory_lean`: detection frames are stored with compact
+        dtypes (see py:downcast_frame()), df_dets is not kept since the detection rate cube holds
+        the events, and rt_group_detections holds row positions instead of group copies."""
+        return self.config.settings.get('memory_lean', False)
+
+    def lean_frame(self, df):
+        """`df` with compact dtypes in memory-lean mode, otherwise `df` itself"""
+        if self.memory_lean and df is not None and not is_partitioned(df):
+            # keep the precision of the time bins and the coordinates used for lookups
+            return downcast_frame(df, exclude=['Receiver.lat', 'Receiver.lon', 'Receiver.depth'])
+        return df
+
     @property
     def show_details(self):
         """Boolean to indicate whether details should be displayed"""
@@ -60,7 +292,8 @@ class Detections:
     @property
     def node_locations(self):
         try:
-            return set(list(zip(self.kadlu_result[1], self.kadlu_result[2])))
+            return set(zip(np.concatenate([r[1] for r in self.kadlu_result.values()]),
+                           np.concatenate([r[2] for r in self.kadlu_result.values()])))
         except:
             return []
 
@@ -75,40 +308,308 @@ class Detections:
 
     def add_env_data(self):
         if self.sources:
+            col_names = [environment.kadlu_var_name(load_name) for load_name in self.sources]
+            key = self.env_cache_key('kadlu', self.detection_df, self.bounds, self.sources)
+            cached = self.get_cached(key)
+            if cached is not None:
+                self.kadlu_result = {col_name: self.get_cached(fingerprint(key, col_name))
+                                     for col_name in col_names}
+            if cached is not None and all(r is not None for r in self.kadlu_result.values()):
+                self.df_detections_env = self.lean_frame(
+                    with_columns(self.detection_df, **{c: cached[c].values for c in cached}))
+                self.kadlu_result = {col_name: tuple(r[c].values for c in r)
+                                     for col_name, r in self.kadlu_result.items()}
+                return
             self.df_detections_env, self.kadlu_result = add_kadlu_env_data(self.bounds,
                                                                            self.sources,
-                                                                           self.detection_df)
+                                                                           self.detection_df,
+                                                                           self.interpolation_method,
+                                                                           self.env_time_resolution,
+                                                                           self.config.settings.get('env_workers', 1),
+                                                                           self.config.settings.get('env_executor', 'thread'),
+                                                                           dimensions=self.mdb.get('dimensions'))
+            self.df_detections_env = self.lean_frame(self.df_detections_env)
+            self.put_cached(key, self.df_detections_env[col_names].reset_index(drop=True))
+            for col_name, result in self.kadlu_result.items():
+                self.put_cached(fingerprint(key, col_name),
+                                pd.DataFrame({str(i): np.asarray(a) for i, a in enumerate(result)}))
         else:
             self.df_detections_env = self.detection_df
 
     def add_custom_data(self):
         # Specify axes to interpolate (the axes which specify the points to interpolate)
         if 'file_map' in self.config.keys():
-            self.axes_to_interpolate = [self.df_detections_env['Receiver.lat'],
-                                        self.df_detections_env['Receiver.lon'],
-                                        [d.timestamp() for d in self.df_detections_env['datetime']],
-                                        self.df_detections_env['Receiver.depth']]
-            # Add custom environment data
-            self.df_detections_env = environment.add_custom_env_data(self.axes_to_interpolate, self.config.file_map, self.df_detections_env)
+            self.axes_to_interpolate = self.query_axes(self.df_detections_env)
+            file_identities = {colname: file_identity(file)
+                               for colname, file in self.config.file_map.items()}
+            key = self.env_cache_key('custom', self.df_detections_env, file_identities)
+            custom = self.get_cached(key)
+            if custom is None:
+                # Add custom environment data, as columns of an empty frame, since
+                # add_custom_env_data() sets them in place and df_detections_env may be detection_df
+                custom = environment.add_custom_env_data(self.axes_to_interpolate,
+                                                         self.config.file_map,
+                                                         pd.DataFrame(index=self.df_detections_env.index),
+                                                         self.interpolation_method,
+                                                         self.env_time_resolution,
+                                                         chunks=self.config.settings.get('env_chunks'))
+                self.put_cached(key, custom.reset_index(drop=True))
+            self.df_detections_env = self.lean_frame(
+                with_columns(self.df_detections_env, **{c: custom[c].values for c in custom}))
+
+    @property
+    def cache(self):
+        """DiskCache in `settings.cache_dir` limited to `settings.cache_max_bytes`, None if no
+        cache directory is configured"""
+        cache_dir = self.config.settings.get('cache_dir')
+        if cache_dir:
+            return DiskCache(cache_dir, self.config.settings.get('cache_max_bytes'))
+
+    def get_cached(self, key):
+        """Cached DataFrame for `key`, None if not cached or caching is disabled"""
+        cache = self.cache
+        return cache.get(key) if cache is not None else None
+
+    def put_cached(self, key, df):
+        cache = self.cache
+        if cache is not None:
+            cache.put(key, df)
+
+    def clear_cache(self):
+        """Invalidate all cached results"""
+        cache = self.cache
+        if cache is not None:
+            cache.invalidate()
+
+    def env_cache_key(self, stage, df, *inputs):
+        """Fingerprint of an environmental data stage: its inputs, the interpolation settings,
+        and the query points of `df`"""
+        return fingerprint(stage, *inputs, self.interpolation_method, self.env_time_resolution,
+                           *self.query_axes(df))
+
+    def query_axes(self, df):
+        """Environmental data query axes of `df` (see environment.query_axes()), with receiver
+        positions from the metadata dimension tables if the detections were read normalized"""
+        return environment.query_axes(df, self.mdb.get('dimensions'))
+
+    def load_tidal_lookup(self):
+        """
+        Tidal lookup table of `data.tidal`, with grid spacing `data.tidal.lookup_resolution`
+        (default 1min), see TidalLookup. Detections get values interpolated linearly between grid
+        points, or with `data.tidal.lookup_linear: false`, those of the nearest grid point. The
+        table is computed from the tidal times ODS file once, saved next to
+        `data.tidal.tidal_interpolation_output_csv` if configured, and shared by all Detections,
+        so that the ODS file is only read when it or the tidal config changed.
+        df_tidal_times is the ODS table if it was read, otherwise None.
+
+        :rtype: TidalLookup
+        """
+        tidal = self.config.data.tidal
+        resolution = pd.Timedelta(tidal.get('lookup_resolution', '1min'))
+        key = fingerprint('tidal_lookup', file_identities(tidal.tidal_times_ods), tidal.year,
+                          resolution.value)
+        path = tidal.get('tidal_interpolation_output_csv')
+        path = path and tidal_lookup_path(path)
+        self.df_tidal_times = None
+        lookup = self.tidal_lookups.get(key)
+        if lookup is None and path:
+            lookup = TidalLookup.load(path, key)
+        if lookup is None:
+            self.df_tidal_times = read_ods(tidal.tidal_times_ods, 1)
+            dflat = flatten_tidal_table(self.df_tidal_times, year=tidal.year)
+            lookup = TidalLookup.from_extrema(dflat, resolution, key=key)
+            if path:
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+                lookup.save(path)
+        self.tidal_lookups[key] = lookup
+        return lookup
 
     def add_tidal_data(self):
         if 'tidal' in self.config.data.keys():
-            self.df_tidal_times = read_ods(self.config.data.tidal.tidal_times_ods, 1)
-            self.df_tidal_flat = flatten_tidal_table(self.df_tidal_times, year=self.config.data.tidal.year)
-            self.df_tidal_interp = tidal_phase(self.df_tidal_flat, new_times = self.df_detections_env.datetime)
-            self.df_detections_env = self.df_detections_env.reset_index().merge(
-                self.df_tidal_interp[["t2","height","dheight_cm_per_hr"]], 
-                how="left",
-                left_on="datetime", right_index=True).set_index("index")
+            lookup = self.load_tidal_lookup()
+            self.df_tidal_flat = lookup.dflat
+            # look up each distinct time once, then take the values of each detection
+            times, inverse = np.unique(self.df_detections_env['datetime'].values, return_inverse=True)
+            self.df_tidal_interp = lookup.lookup(times, self.config.data.tidal.get('lookup_linear', True))
+            self.df_detections_env = self.lean_frame(with_columns(
+                self.df_detections_env,
+                **{c: self.df_tidal_interp[c].values[inverse] for c in ["t2","height","dheight_cm_per_hr"]}))
 
     def add_calculated_columns(self):
         if "calculated_columns" in self.config.data.keys():
             for colname in self.config.data.calculated_columns:
                 make_column(self.df_detections_env, column_name=colname)
+            self.df_detections_env = self.lean_frame(self.df_detections_env)
 
     def prepare_group_data(self):
         self.detection_events_df, self.detection_bins_df = self.get_events_bins(self.df_detections_env)
-        self.rt_group_detections = list(self.df_detections_env.groupby(['Transmitter', 'Receiver']))
+        if self.memory_lean:
+            self.rt_group_detections = rt_group_views(self.df_detections_env,
+                                                      ['Transmitter', 'Receiver'])
+        else:
+            self.rt_group_detections = list(iter_rt_groups(self.df_detections_env,
+                                                           ['Transmitter', 'Receiver']))
+
+    # ------------------------------------------------------------------------
+    # incremental ingest of new detections
+
+    def ingest(self, new_detections):
+        """
+        Add a batch of new detections, e.g. of a receiver offload, without reprocessing the
+        previous ones. Gives the same result as processing all detections at once.
+
+        Only the receiver/transmitter pairs with new detections are reprocessed: their detection
+        intervals and init sequence cutoff, their rt_groups entry (`tstart`, `tend`), and their
+        counts in the detection rate cube. The detection rates of the time bins are derived from
+        the cube. Environmental data is only interpolated for the receivers and times that were
+        not looked up before. The stages after that are rerun.
+
+        Requires `settings.ingest`, which keeps the detections as read in raw_detection_df.
+
+        :param new_detections: Detections not ingested before, as returned by the configured
+            reader (see read_via_config()). They are numbered after the previous detections.
+        :type new_detections: pandas.DataFrame
+
+        :return: Receiver/transmitter pairs with new detections
+        :rtype: pandas.MultiIndex
+        """
+        if self.dr_cube is None:
+            raise ValueError("Detections must be processed before new detections are ingested")
+        if self.raw_detection_df is None:
+            raise ValueError("Ingesting new detections requires settings.ingest")
+        pairs = self.append_detections(new_detections)
+        if not len(pairs):
+            return pairs
+        previous_env = self.df_detections_env
+        # the groups are rebuilt by the group_data stage
+        self.rt_group_detections = None
+        self.update_detection_rate(pairs)
+        for name in ['events_bins', 'rt_groups']:
+            self.run_stage(name)
+        self.update_env_data(previous_env)
+        self.record_memory('env_data')
+        for name in ['tidal_data', 'calculated_columns', 'group_data']:
+            self.run_stage(name)
+        if self.stage_keys:
+            # checkpoint the new state, so that pipeline runs continue from it
+            self.ingested.append(fingerprint(new_detections))
+            self.stage_keys = self.stage_fingerprints()
+            for (name, _, _, attrs), key in zip(self.pipeline_stages, self.stage_keys):
+                outputs = {attr: getattr(self, attr, None) for attr in attrs}
+                if name == 'read':
+                    outputs['detection_df'] = self.raw_detection_df
+                self.put_checkpoint(key, outputs)
+        return pairs
+
+    def append_detections(self, new_detections):
+        """Append new detections to raw_detection_df, numbered after the previous ones, and
+        return their receiver/transmitter pairs"""
+        raw = self.raw_detection_df
+        batch = new_detections.copy(deep=False)
+        start = raw.index.max() + 1 if len(raw) else 0
+        batch.index = pd.RangeIndex(start, start + len(batch))
+        batch, raw = encode_devices(batch, like=raw), encode_devices(raw, like=batch)
+        if self.mdb.get('dimensions') is not None:
+            # as read with normalized metadata, see normalize_detections()
+            self.mdb.dimensions = make_device_dimensions(batch, self.mdb)
+            batch = batch[has_device_attributes(batch, self.mdb.dimensions)]
+        self.raw_detection_df = self.lean_frame(pd.concat((raw, batch)))
+        _, pairs = rt_group_codes(batch)
+        return pairs
+
+    def update_detection_rate(self, pairs):
+        """py:make_detection_rate() for the receiver/transmitter `pairs` only"""
+        raw = self.raw_detection_df
+        dets, inits, rt_groups = process_intervals(raw[rt_pair_mask(raw, pairs)],
+                                                   Bunch(transmitter=self.mdb.transmitter),
+                                                   executor=self.group_executor)
+        self.mdb.rt_groups = splice_rt_groups(self.mdb.rt_groups[['tstart', 'tend']], rt_groups,
+                                              pairs)
+        if self.df_dets is not None:
+            self.df_dets = splice_rt_groups(self.df_dets, dets, pairs, like=raw)
+        self.df_inits = splice_rt_groups(self.df_inits, inits, pairs, like=raw)
+        self.dr_cube = update_detection_rate_cube(self.dr_cube, dets, self.mdb, pairs)
+        if self.memory_lean:
+            self.dr_cube.events = self.lean_frame(self.dr_cube.events)
+        self.detection_df, self.event_bin_split = detection_rate_level(self.dr_cube,
+                                                                       self.config.settings.time_bin_length,
+                                                                       self.mdb,
+                                                                       self.config.settings.auto_dr,
+                                                                       self.group_executor)
+        self.detection_df = self.lean_frame(self.detection_df)
+
+    def update_env_data(self, previous):
+        """
+        Environmental data of detection_df like py:add_env_data() and py:add_custom_data(),
+        taken from `previous` df_detections_env for the receivers and times it has, and
+        interpolated for the others only.
+        """
+        df = self.detection_df
+        kadlu_columns = [environment.kadlu_var_name(load_name) for load_name in self.sources or {}]
+        custom_columns = list(self.config.get('file_map') or {})
+        # custom variables replace kadlu variables of the same name
+        columns = list(dict.fromkeys(kadlu_columns + custom_columns))
+        if not columns:
+            self.df_detections_env = df
+            return
+        query_cols = ['Receiver', 'datetime']
+        known = merge_devices(df[query_cols],
+                              previous[query_cols + columns].drop_duplicates(query_cols),
+                              how='left', indicator=True)
+        missing = (known['_merge'] == 'left_only').values
+        values = {col: known[col].values.astype(float) for col in columns}
+        if missing.any():
+            new_env = df[missing]
+            if self.sources:
+                new_env, self.kadlu_result = add_kadlu_env_data(self.bounds,
+                                                                self.sources,
+                                                                new_env,
+                                                                self.interpolation_method,
+                                                                self.env_time_resolution,
+                                                                self.config.settings.get('env_workers', 1),
+                                                                self.config.settings.get('env_executor', 'thread'),
+                                                                dimensions=self.mdb.get('dimensions'))
+            if 'file_map' in self.config.keys():
+                new_env = environment.add_custom_env_data(self.query_axes(new_env),
+                                                          self.config.file_map,
+                                                          new_env.copy(deep=False),
+                                                          self.interpolation_method,
+                                                          self.env_time_resolution,
+                                                          chunks=self.config.settings.get('env_chunks'))
+            for col in columns:
+                values[col][missing] = new_env[col].values
+
+        self.df_detections_env = self.lean_frame(with_columns(df, **{c: values[c] for c in columns}))
+
+    # ------------------------------------------------------------------------
+    # memory usage
+
+    # attributes that hold detection frames
+    frame_attributes = ['raw_detection_df', 'detection_df', 'df_dets', 'df_inits', 'dr_cube', 'events_df', 'bins_df',
+                        'df_detections_env', 'detection_events_df', 'detection_bins_df',
+                        'rt_group_detections']
+
+    def memory_usage(self):
+        """Memory held by each detection frame attribute in bytes, and their 'total'. Row slices
+        and columns shared between frames count only once in the total (see py:memory_bytes())."""
+        owners = {attr: array_owners(getattr(self, attr, None)) for attr in self.frame_attributes}
+        usage = pd.Series({attr: owners_bytes(arrays, self.object_sizes)
+                           for attr, arrays in owners.items()})
+        # each frame is only visited once
+        usage['total'] = owners_bytes({k: a for arrays in owners.values() for k, a in arrays.items()},
+                                      self.object_sizes)
+        if resource is not None:
+            # peak resident set size of the process so far, reported in KB on Linux
+            usage['peak_rss'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        return usage
+
+    def record_memory(self, stage):
+        self.stage_memory[stage] = self.memory_usage()
+
+    def memory_report(self):
+        """Memory usage in MB after each processing stage that ran: one row per stage, with the
+        columns of py:memory_usage()"""
+        return pd.DataFrame(self.stage_memory).T / 2**20
 
     def get_events_bins(self, df=None):
         if df is None:
@@ -116,7 +617,101 @@ class Detections:
         return split_by_index(df, self.event_bin_split)
     
     def prepare_rt_groups(self):
-        deploy_lat_lon = self.mdb.deploy.groupby('STATION_NO')[['DEPLOY_LAT','DEPLOY_LONG']].nth(0)
-        self.mdb.station_dists_m = calc_station_dists_m(deploy_lat_lon)
+        self.add_station_dists()
+        self.mdb.rt_pairs = make_rt_pair_info(self.mdb.rt_groups.index, self.mdb)
         if "Receiver/Transmitter" not in self.mdb.rt_groups.columns:
-            add_rt_group_info(self.events_df, self.mdb)
+            add_rt_group_info(self.events_df, self.mdb, self.group_executor)
+
+    def add_station_dists(self):
+        deploy_lat_lon = self.mdb.deploy.groupby('STATION_NO')[['DEPLOY_LAT','DEPLOY_LONG']].nth(0)
+        self.mdb.station_dists_m = calc_station_dists_m(deploy_lat_lon,
+                                                        self.config.settings.get('distance_method',
+                                                                                 'vincenty'))
+
+    # ------------------------------------------------------------------------
+    # out-of-core mode: process the detections partition by partition
+
+    @property
+    def out_of_core(self):
+        """`reader.out_of_core` settings: the `directory` of the partitions and outputs, the number
+        of `partitions`, and the dask `scheduler` and number of `workers` to process them with.
+        None for in-memory processing."""
+        return self.config.reader.get('out_of_core')
+
+    def process_out_of_core(self):
+        """Run the processing stages on the detections partitioned by receiver/transmitter pair by
+        read_via_config(), one partition at a time per worker (see range_driver.partitioned).
+
+        Only the time bins are materialized, as detection_bins_df, sorted by time bin and pair.
+        The processed events are written to the `events` subdirectory of the out-of-core directory,
+        detection_events_df is a lazy dask DataFrame of them. mdb.rt_groups covers all pairs,
+        df_tidal_interp holds the tidal data at the times of the bins.
+        """
+        directory = self.out_of_core['directory']
+        for subdirectory in ['rates', 'events']:
+            shutil.rmtree(os.path.join(directory, subdirectory), ignore_errors=True)
+        scheduler, workers = self.out_of_core.get('scheduler'), self.out_of_core.get('workers')
+        pool = partitioned.partition_pool(scheduler, workers)
+        try:
+            self.process_partitions(partial(partitioned.compute_partitions, scheduler=scheduler,
+                                            num_workers=workers, pool=pool))
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        self.record_memory('out_of_core')
+
+    def process_partitions(self, compute):
+        """Processing stages of py:process_out_of_core(), with `compute` like
+        partitioned.compute_partitions()"""
+        directory = self.out_of_core['directory']
+        parts = self.detection_df
+
+        # groups of all pairs, their earliest start is the origin of the time bins
+        rt_groups = compute(partitioned.partition_rt_groups, parts,
+                            Bunch(transmitter=self.mdb.transmitter))
+        self.mdb.rt_groups = (partitioned.concat_partition_frames([g.reset_index() for g in rt_groups])
+                              .set_index(device_columns).sort_index())
+        origin = self.mdb.rt_groups['tstart'].min().floor('D')
+        self.add_station_dists()
+        self.mdb.rt_pairs = make_rt_pair_info(self.mdb.rt_groups.index, self.mdb)
+
+        rates_paths = [os.path.join(directory, 'rates', 'part-{:04d}'.format(k))
+                       for k in range(parts.npartitions)]
+        gsdfs = compute(partitioned.partition_detection_rates,
+                        list(zip(parts.to_delayed(), rates_paths)), self.mdb,
+                        self.config.settings.time_bin_length, self.config.settings.auto_dr, origin)
+        join_rt_group_info(partitioned.concat_partition_frames(
+            [g.rename_axis(device_columns).reset_index() for g in gsdfs]).set_index(device_columns),
+            self.mdb)
+
+        self.df_tidal_flat, tidal_lookup = None, None
+        tidal_linear = False
+        if 'tidal' in self.config.data.keys():
+            tidal_lookup = self.load_tidal_lookup()
+            tidal_linear = self.config.data.tidal.get('lookup_linear', True)
+            self.df_tidal_flat = tidal_lookup.dflat
+
+        self.kadlu_result = {}
+        if self.sources:
+            # load once, rather than in each partition
+            for load_name, source in self.sources.items():
+                col_name = environment.kadlu_var_name(load_name)
+                self.kadlu_result[col_name] = environment.kadlu.load(source=source, var=col_name,
+                                                                     **self.bounds)
+        env = Bunch(bounds=self.bounds, sources=self.sources,
+                    load_func=partitioned.PreloadedLoad(self.kadlu_result),
+                    file_map=self.config.get('file_map'), chunks=self.config.settings.get('env_chunks'),
+                    method=self.interpolation_method, time_resolution=self.env_time_resolution,
+                    tidal_lookup=tidal_lookup, tidal_linear=tidal_linear,
+                    calculated_columns=self.config.data.get('calculated_columns', []))
+        events_paths = [os.path.join(directory, 'events', 'part-{:04d}.parquet'.format(k))
+                        for k in range(parts.npartitions)]
+        bins = compute(partitioned.partition_environment, list(zip(rates_paths, events_paths)),
+                       env)
+        self.detection_bins_df = (partitioned.concat_partition_frames(bins)
+                                  .sort_values(['datetime', 'Receiver', 'Transmitter'], kind='stable')
+                                  .reset_index(drop=True))
+        self.detection_events_df = partitioned.read_partition_frames(events_paths)
+        if tidal_lookup is not None:
+            self.df_tidal_interp = tidal_lookup.lookup(np.unique(self.detection_bins_df['datetime'].values),
+                                                       tidal_linear)
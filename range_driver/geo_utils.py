@@ -1,8 +1,147 @@
 # ----------------------------------------------------------------------------
 # geodesic distance calculation
 
+import numpy as np
 from geopy.distance import geodesic
 
+# WGS84 ellipsoid
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+WGS84_B = (1 - WGS84_F) * WGS84_A
+# mean earth radius (IUGG) for spherical approximations
+EARTH_RADIUS_M = 6371008.8
+
+
 def dist_m(latlon0, latlon1):
     """Geodesic distance calculation"""
     return geodesic(latlon0, latlon1).m
+
+
+def haversine_m(lat0, lon0, lat1, lon1):
+    """
+    Great circle distance on a sphere with mean earth radius, vectorized over NumPy arrays.
+
+    Fast approximation of the WGS84 geodesic distance. Due to the flattening of the earth, the
+    relative error is at most 0.56%, i.e. up to 5.6 m for stations 1 km apart.
+
+    :param lat0, lon0, lat1, lon1: Coordinates in degrees, broadcast against each other
+    :return: Distances in meters
+    :rtype: numpy.ndarray
+    """
+    lat0, lon0, lat1, lon1 = map(np.radians, (lat0, lon0, lat1, lon1))
+    hav = (np.sin((lat1 - lat0) / 2)**2
+           + np.cos(lat0) * np.cos(lat1) * np.sin((lon1 - lon0) / 2)**2)
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(hav, 0, 1)))
+
+
+def vincenty_m(lat0, lon0, lat1, lon1, tol=1e-12, max_iter=200):
+    """
+    Geodesic distance on the WGS84 ellipsoid via Vincenty's inverse formula, vectorized over NumPy
+    arrays.
+
+    Agrees with the exact geodesic (geopy.distance.geodesic) to better than 1 mm. The iteration
+    fails to converge only for nearly antipodal points, whose distances are computed with
+    py:dist_m() instead.
+
+    :param lat0, lon0, lat1, lon1: Coordinates in degrees, broadcast against each other
+    :return: Distances in meters
+    :rtype: numpy.ndarray
+    """
+    lat0, lon0, lat1, lon1 = np.broadcast_arrays(*(np.asarray(x, dtype=float)
+                                                   for x in (lat0, lon0, lat1, lon1)))
+    L = np.radians(lon1 - lon0)
+    U0 = np.arctan((1 - WGS84_F) * np.tan(np.radians(lat0)))
+    U1 = np.arctan((1 - WGS84_F) * np.tan(np.radians(lat1)))
+    sinU0, cosU0 = np.sin(U0), np.cos(U0)
+    sinU1, cosU1 = np.sin(U1), np.cos(U1)
+
+    lam = L.copy()
+    converged = np.zeros(L.shape, dtype=bool)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for _ in range(max_iter):
+            sin_lam, cos_lam = np.sin(lam), np.cos(lam)
+            sin_sigma = np.hypot(cosU1 * sin_lam, cosU0 * sinU1 - sinU0 * cosU1 * cos_lam)
+            cos_sigma = sinU0 * sinU1 + cosU0 * cosU1 * cos_lam
+            sigma = np.arctan2(sin_sigma, cos_sigma)
+            sin_alpha = np.where(sin_sigma > 0, cosU0 * cosU1 * sin_lam / sin_sigma, 0.)
+            cos2_alpha = 1 - sin_alpha**2
+            # cos2_alpha is 0 for points on the equator
+            cos_2sigma_m = np.where(cos2_alpha > 0,
+                                    cos_sigma - 2 * sinU0 * sinU1 / cos2_alpha, 0.)
+            C = WGS84_F / 16 * cos2_alpha * (4 + WGS84_F * (4 - 3 * cos2_alpha))
+            lam_next = L + (1 - C) * WGS84_F * sin_alpha * (
+                sigma + C * sin_sigma * (cos_2sigma_m + C * cos_sigma * (-1 + 2 * cos_2sigma_m**2)))
+            converged = np.abs(lam_next - lam) <= tol
+            lam = lam_next
+            if converged.all():
+                break
+
+        u2 = cos2_alpha * (WGS84_A**2 - WGS84_B**2) / WGS84_B**2
+        A = 1 + u2 / 16384 * (4096 + u2 * (-768 + u2 * (320 - 175 * u2)))
+        B = u2 / 1024 * (256 + u2 * (-128 + u2 * (74 - 47 * u2)))
+        delta_sigma = B * sin_sigma * (cos_2sigma_m + B / 4 * (
+            cos_sigma * (-1 + 2 * cos_2sigma_m**2)
+            - B / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma**2) * (-3 + 4 * cos_2sigma_m**2)))
+        dist = np.array(WGS84_B * A * (sigma - delta_sigma))
+
+    for idx in map(tuple, np.argwhere(~converged | ~np.isfinite(dist))):
+        dist[idx] = dist_m((lat0[idx], lon0[idx]), (lat1[idx], lon1[idx]))
+    return dist[()]
+
+
+def geodesic_m(lat0, lon0, lat1, lon1):
+    """
+    Exact WGS84 geodesic distance (Karney's algorithm via geopy), one call per point pair.
+    Serves as reference for py:vincenty_m() and py:haversine_m().
+
+    :param lat0, lon0, lat1, lon1: Coordinates in degrees, broadcast against each other
+    :return: Distances in meters
+    :rtype: numpy.ndarray
+    """
+    lat0, lon0, lat1, lon1 = np.broadcast_arrays(lat0, lon0, lat1, lon1)
+    dist = np.empty(lat0.shape)
+    for idx in np.ndindex(dist.shape):
+        dist[idx] = dist_m((lat0[idx], lon0[idx]), (lat1[idx], lon1[idx]))
+    return dist
+
+
+dist_methods = {
+    'haversine': haversine_m,
+    'vincenty': vincenty_m,
+    'geodesic': geodesic_m,
+}
+
+
+def dist_matrix_m(lat, lon, lat1=None, lon1=None, method="vincenty"):
+    """
+    Distances between all pairs of points as a float64 matrix.
+
+    :param lat, lon: Coordinates of n points in degrees
+    :type lat, lon: array-like
+
+    :param lat1, lon1: Coordinates of m other points in degrees. Defaults to `lat`, `lon`, which
+        gives the symmetric n x n matrix with zero diagonal.
+    :type lat1, lon1: array-like
+
+    :param method: "haversine" (spherical approximation, relative error <= 0.56%), "vincenty"
+        (WGS84, error < 1 mm, default), or "geodesic" (exact WGS84, one geopy call per pair)
+    :type method: str
+
+    :return: n x m matrix of distances in meters
+    :rtype: numpy.ndarray
+    """
+    try:
+        dist_func = dist_methods[method]
+    except KeyError:
+        raise ValueError("Unknown distance method {}, use one of {}".format(
+            method, list(dist_methods)))
+    lat, lon = np.asarray(lat, dtype=float), np.asarray(lon, dtype=float)
+    if lat1 is None:
+        # compute upper triangle only and mirror it
+        i0, i1 = np.triu_indices(len(lat), k=1)
+        dists = np.zeros((len(lat), len(lat)))
+        dists[i0, i1] = dist_func(lat[i0], lon[i0], lat[i1], lon[i1])
+        dists[i1, i0] = dists[i0, i1]
+        return dists
+    lat1, lon1 = np.asarray(lat1, dtype=float), np.asarray(lon1, dtype=float)
+    return dist_func(lat[:, None], lon[:, None], lat1[None, :], lon1[None, :])
@@ -1,5 +1,8 @@
+from collections.abc import Sequence
 import pandas as pd
+import numpy as np
 from bisect import bisect_left
+import weakref
 
 
 def index_columns(df, none_name=None):
@@ -65,6 +68,198 @@ def dataframe_schema(columns, dtypes):
     return pd.DataFrame(df_dict)
 
 
+def expand_ranges(starts, stops):
+    """Expand integer ranges [starts[i], stops[i]) into one flat array.
+
+    :param starts: First value of each range
+    :type starts: numpy.ndarray
+
+    :param stops: End of each range (exclusive). Ranges with stops <= starts are empty.
+    :type stops: numpy.ndarray
+
+    :return: - **owner** (`numpy.ndarray`) - position i of the range each value belongs to
+             - **values** (`numpy.ndarray`) - concatenated range values
+    """
+    starts = np.asarray(starts, dtype='int64')
+    lengths = np.maximum(np.asarray(stops, dtype='int64') - starts, 0)
+    owner = np.repeat(np.arange(len(starts)), lengths)
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return owner, starts[owner] + offsets
+
+
+def with_columns(df, **columns):
+    """Like df.assign(**columns), but shares the existing columns with `df` instead of copying
+    them"""
+    df = df.copy(deep=False)
+    for col, values in columns.items():
+        df[col] = values
+    return df
+
+
+def downcast_frame(df, float_dtype='float32', int_dtype='int32', category_ratio=0.5,
+                   exclude=()):
+    """
+    Store the columns of `df` in compact dtypes: float64 as `float_dtype`, int64 as `int_dtype` if
+    all values fit, and string columns with at most `category_ratio` distinct values per row as
+    categoricals. Datetime, boolean, and categorical columns are kept.
+
+    Note that float32 has about 7 significant digits, e.g. coordinates are rounded to about 1 m.
+
+    :param exclude: Columns to keep as they are
+    :type exclude: list
+
+    :return: Shallow copy of `df` with downcast columns, `df` itself if no column changed
+    :rtype: pandas.DataFrame
+    """
+    downcast = {}
+    for col, values in df.items():
+        if col in exclude:
+            continue
+        dtype = values.dtype
+        if dtype == 'float64':
+            downcast[col] = values.astype(float_dtype)
+        elif dtype == 'int64':
+            info = np.iinfo(int_dtype)
+            if not len(values) or (values.min() >= info.min and values.max() <= info.max):
+                downcast[col] = values.astype(int_dtype)
+        elif dtype == object and len(values):
+            num_distinct = values.nunique(dropna=True)
+            if (num_distinct <= category_ratio * len(values)
+                    and pd.api.types.infer_dtype(values, skipna=True) == 'string'):
+                downcast[col] = values.astype('category')
+    return with_columns(df, **downcast) if downcast else df
+
+
+def _array_owner(a):
+    # the array that owns the memory of view `a`
+    while isinstance(a.base, np.ndarray):
+        a = a.base
+    return a
+
+
+def array_owners(*objs):
+    """
+    NumPy arrays that hold the memory of DataFrames, Series, Indexes, and NumPy arrays, also inside
+    lists, tuples, dicts, and py:GroupViews. The full array of any view is taken.
+
+    :return: The arrays by their id()
+    :rtype: dict
+    """
+    owners = {}
+
+    def visit(obj):
+        if isinstance(obj, pd.DataFrame):
+            for _, values in obj.items():
+                visit(values.values)
+            visit(obj.index)
+        elif isinstance(obj, pd.MultiIndex):
+            for level, codes in zip(obj.levels, obj.codes):
+                visit(level)
+                visit(codes)
+        elif isinstance(obj, pd.RangeIndex):
+            pass
+        elif isinstance(obj, (pd.Series, pd.Index)):
+            visit(obj.values)
+            if isinstance(obj, pd.Series):
+                visit(obj.index)
+        elif isinstance(obj, pd.Categorical):
+            visit(obj.codes)
+            visit(obj.categories)
+        elif isinstance(obj, np.ndarray):
+            owner = _array_owner(obj)
+            owners[id(owner)] = owner
+        elif isinstance(obj, GroupViews):
+            visit(obj.frame)
+            visit(obj.keys)
+            visit(obj.order)
+            visit(obj.offsets)
+        elif isinstance(obj, dict):
+            for value in obj.values():
+                visit(value)
+        elif isinstance(obj, (list, tuple)):
+            for value in obj:
+                visit(value)
+
+    for obj in objs:
+        visit(obj)
+    return owners
+
+
+def owners_bytes(owners, object_sizes=None):
+    """
+    Memory held by the arrays returned by py:array_owners(). Object arrays include their elements.
+
+    :param object_sizes: Optional dict in which the sizes of object arrays are kept, to reuse them
+        in later calls for the arrays that still exist. Measuring their elements is slow.
+    :type object_sizes: dict
+
+    :return: Bytes
+    :rtype: int
+    """
+    def object_bytes(owner):
+        if object_sizes is None:
+            return pd.Series(owner.ravel()).memory_usage(deep=True, index=False)
+        ref, size = object_sizes.get(id(owner), (None, None))
+        if ref is None or ref() is not owner:
+            size = pd.Series(owner.ravel()).memory_usage(deep=True, index=False)
+            object_sizes[id(owner)] = weakref.ref(owner), size
+        return size
+
+    total = int(sum(object_bytes(owner) if owner.dtype == object else owner.nbytes
+                    for owner in owners.values()))
+    if object_sizes is not None:
+        # forget arrays that no longer exist
+        for key in [key for key, (ref, _) in object_sizes.items() if ref() is None]:
+            del object_sizes[key]
+    return total
+
+
+def memory_bytes(*objs, object_sizes=None):
+    """
+    Memory held by DataFrames, Series, Indexes, and NumPy arrays, also inside lists, tuples, dicts,
+    and py:GroupViews. Memory shared between objects, e.g. by a DataFrame and its row slices,
+    counts only once, as does the full array of any view. Object arrays include their elements.
+
+    :param object_sizes: See py:owners_bytes()
+
+    :return: Bytes
+    :rtype: int
+    """
+    return owners_bytes(array_owners(*objs), object_sizes)
+
+
+class GroupViews(Sequence):
+    """ Lazy sequence of (key, group) pairs like list(df.groupby(...)), which only stores the row
+    positions of the groups. Each group is taken from the DataFrame when it is accessed.
+
+    Args:
+        frame: DataFrame to group
+        gcodes: group number of each row, -1 for rows that belong to no group
+        keys: key of each group number
+    """
+    def __init__(self, frame, gcodes, keys):
+        self.frame = frame
+        self.keys = keys
+        gcodes = np.asarray(gcodes)
+        # rows of each group in their original order
+        order = np.argsort(gcodes, kind='stable')
+        order = order[gcodes[order] >= 0]
+        index_dtype = 'int32' if len(frame) < 2**31 else 'int64'
+        self.order = order.astype(index_dtype)
+        self.offsets = np.searchsorted(gcodes[order], np.arange(len(keys) + 1)).astype(index_dtype)
+        # groups without rows are left out, as by groupby()
+        self.groups = np.flatnonzero(np.diff(self.offsets) > 0)
+
+    def __len__(self):
+        return len(self.groups)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[k] for k in range(*i.indices(len(self)))]
+        g = self.groups[i]
+        return self.keys[g], self.frame.take(self.order[self.offsets[g]:self.offsets[g + 1]])
+
+
 def remove_microsecond(ts):
     return pd.Timestamp(year=ts.year, month=ts.month, day=ts.day, hour=ts.hour, second=ts.second)
 
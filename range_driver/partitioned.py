@@ -0,0 +1,180 @@
+"""
+    Out-of-core processing of detections partitioned by receiver/transmitter pair.
+
+    All detections of a pair are in the same partition (see data_prep.partition_detections()), so
+    the per-pair steps - interval processing, detection rates, group info - and the pointwise
+    steps - environmental data, calculated columns - run on one partition at a time, in parallel
+    by dask. The processed detection events are written back to Parquet files, only the
+    aggregated time bins are returned in memory.
+"""
+import os
+
+import pandas as pd
+try:
+    import dask
+except ImportError:     # only needed for out-of-core processing
+    dask = None
+
+from .cache import missing_as_nan
+from .data_prep import (add_kadlu_env_data, clear_known_categories, dd, detection_rate_grid,
+                        device_columns, encode_devices, get_all_group_info, is_partitioned,
+                        make_column, process_intervals)
+from .data_prep.environment import add_custom_env_data, query_axes
+from .data_prep.parallel import executor_classes
+from .dict_utils import Bunch
+from .pandas_utils import split_by_index, with_columns
+
+
+def partition_pool(scheduler=None, num_workers=None):
+    """Process pool for the "processes" scheduler, to share between calls of
+    py:compute_partitions() so that the worker processes start once. None for other schedulers."""
+    if scheduler == 'processes':
+        return executor_classes['process'](max_workers=num_workers)
+
+
+def compute_partitions(func, partitions, *args, scheduler=None, num_workers=None, pool=None):
+    """
+    Call func(*partition, *args) for each partition, in parallel by dask.
+
+    :param func: Function of module level, so that the "processes" scheduler can pickle it
+    :type func: callable
+
+    :param partitions: dask DataFrame, whose partitions are passed as pandas DataFrames, or a list
+        with a tuple of arguments for each partition, which may include delayed partitions
+    :type partitions: dask.dataframe.DataFrame or list
+
+    :param args: Arguments passed to all calls
+    :param scheduler: dask scheduler, e.g. "threads", "processes", or "synchronous", None for the
+        dask default
+    :type scheduler: str
+
+    :param num_workers: Number of threads or processes, None for the number of CPUs
+    :type num_workers: int
+
+    :param pool: Optional pool of the scheduler, see py:partition_pool()
+    :type pool: concurrent.futures.Executor
+
+    :return: The results of func(), in the order of the partitions
+    :rtype: list
+    """
+    if dask is None:
+        raise ImportError("Out-of-core processing requires dask")
+    if is_partitioned(partitions):
+        partitions = [(part, ) for part in partitions.to_delayed()]
+    # shared arguments are in the task graph once
+    args = [dask.delayed(arg, traverse=False) for arg in args]
+    tasks = [dask.delayed(func)(*partition, *args) for partition in partitions]
+    kwargs = {} if num_workers is None else {'num_workers': num_workers}
+    if pool is not None:
+        kwargs['pool'] = pool
+    return list(dask.compute(*tasks, scheduler=scheduler, **kwargs))
+
+
+def write_partition_frame(df, path):
+    """Write DataFrame `df` of a partition to Parquet file `path`, with the device names as
+    strings since the device categories of the partitions differ"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    df.astype({col: object for col in device_columns if col in df.columns}).to_parquet(path)
+
+
+def read_partition_frame(path):
+    """DataFrame written by py:write_partition_frame(), with categorical device names"""
+    return encode_devices(missing_as_nan(pd.read_parquet(path)))
+
+
+def read_partition_frames(paths):
+    """Lazy dask DataFrame of the Parquet files `paths` written by py:write_partition_frame()"""
+    meta = clear_known_categories(read_partition_frame(paths[0]).iloc[:0])
+    return dd.from_map(read_partition_frame, paths, meta=meta, enforce_metadata=False)
+
+
+def concat_partition_frames(frames):
+    """Concatenate DataFrames of several partitions, with the device names of all of them as
+    categories (see py:encode_devices())"""
+    return encode_devices(pd.concat(
+        [df.astype({col: object for col in device_columns if col in df.columns}) for df in frames]))
+
+
+class PreloadedLoad:
+    """ Replacement for kadlu.load() that returns the results of earlier calls, so that the
+    environmental data is loaded once rather than once per partition.
+
+    Args:
+        kadlu_results: raw kadlu results by variable name, see add_kadlu_env_data()
+    """
+    def __init__(self, kadlu_results):
+        self.kadlu_results = kadlu_results
+
+    def __call__(self, source, var, **bounds):
+        return self.kadlu_results[var]
+
+
+# ----------------------------------------------------------------------------
+# per-partition processing steps
+
+def partition_rt_groups(detection_df, metadata):
+    """Receiver/transmitter groups of a partition of the detections, see process_intervals()"""
+    return process_intervals(detection_df, Bunch(**metadata))[2]
+
+
+def partition_detection_rates(detection_df, path, metadata, time_bin_length, auto_dr, origin):
+    """
+    Detection rates of a partition of the detections, see process_intervals() and
+    detection_rate_grid(). The events and bins are written to `path`, in files events.parquet
+    and bins.parquet.
+
+    :param origin: Start of the first time bin of all partitions
+    :type origin: pandas.Timestamp
+
+    :return: Info of the groups, see get_all_group_info()
+    :rtype: pandas.DataFrame
+    """
+    # the steps add partition results to the metadata
+    metadata = Bunch(**metadata)
+    df_dets, _, _ = process_intervals(detection_df, metadata)
+    detection_df, event_bin_split = detection_rate_grid(df_dets, time_bin_length, metadata,
+                                                        auto_dr, origin=origin)
+    events_df, bins_df = split_by_index(detection_df, event_bin_split)
+    write_partition_frame(events_df, os.path.join(path, 'events.parquet'))
+    write_partition_frame(bins_df, os.path.join(path, 'bins.parquet'))
+    return get_all_group_info(events_df, metadata)
+
+
+def partition_environment(path, events_path, env):
+    """
+    Add environmental data, tidal data, and calculated columns to the events and bins of a
+    partition written by py:partition_detection_rates() to `path`, the same as Detections does
+    for all detections. Environmental and tidal data are evaluated at each detection, which needs
+    no detections of other partitions.
+
+    :param events_path: Parquet file to write the events to
+    :type events_path: str
+
+    :param env: `bounds`, `sources` and `load_func` for kadlu data (see add_kadlu_env_data()),
+        `file_map` and `chunks` for custom data (see add_custom_env_data()), interpolation
+        `method` and `time_resolution`, `tidal_lookup` table or None and whether to
+        interpolate linearly in it, `tidal_linear` (see TidalLookup), and `calculated_columns`
+    :type env: sklearn.utils.Bunch
+
+    :return: The bins of the partition
+    :rtype: pandas.DataFrame
+    """
+    events_df = read_partition_frame(os.path.join(path, 'events.parquet'))
+    bins_df = read_partition_frame(os.path.join(path, 'bins.parquet'))
+    detection_df = pd.concat((encode_devices(events_df, like=bins_df),
+                              encode_devices(bins_df, like=events_df))).reset_index(drop=True)
+    if env.sources:
+        detection_df, _ = add_kadlu_env_data(env.bounds, env.sources, detection_df, env.method,
+                                             env.time_resolution, load_func=env.load_func)
+    if env.file_map:
+        detection_df = add_custom_env_data(query_axes(detection_df), env.file_map, detection_df,
+                                           env.method, env.time_resolution, chunks=env.chunks)
+    if env.tidal_lookup is not None:
+        tidal_cols = env.tidal_lookup.lookup(detection_df['datetime'].values, env.tidal_linear)
+        detection_df = with_columns(detection_df, **{c: tidal_cols[c].values
+                                                     for c in ["t2", "height", "dheight_cm_per_hr"]})
+    for colname in env.calculated_columns:
+        make_column(detection_df, column_name=colname)
+    events_df, bins_df = split_by_index(detection_df, len(events_df))
+    write_partition_frame(events_df, events_path)
+    return bins_df
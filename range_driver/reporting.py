@@ -66,7 +66,7 @@ def report_group_info(dets):
 
     if dets.config.view.show_dr_plots:
         displaymd("# Detection rate plots for data screening")
-        for gn, tgroup in dets.bins_df.reset_index().groupby(['Transmitter', 'Receiver']):
+        for gn, tgroup in iter_rt_groups(dets.bins_df.reset_index(), ['Transmitter', 'Receiver']):
             gn = tuple(reversed(gn)) # TODO check this when changing T/R groupby key order
             plot_group_dr(gn, tgroup, dets.mdb)
             plt.show()
@@ -0,0 +1,22 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# the synthetic data generators of the benchmarks are shared with the tests
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def tidal_times():
+    """Table in the layout of the tidal times ODS file, with two high and two low tides a day"""
+    rng = np.random.default_rng(0)
+    days = pd.date_range('2016-03-01', '2016-06-30', freq='D')
+    df = pd.DataFrame({'Day': days.day.astype(float), 'Month': days.strftime('%B')})
+    for k in range(1, 5):
+        df['time%d' % k] = ['%02d%02d' % ((k - 1) * 6 + h, m)
+                            for h, m in zip(rng.integers(0, 5, len(days)), rng.integers(0, 60, len(days)))]
+        df['height%d' % k] = np.where(k % 2, 1.5, 0.3) + rng.normal(0, 0.1, len(days))
+    return df
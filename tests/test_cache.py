@@ -0,0 +1,156 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+from sklearn.utils import Bunch
+
+import range_driver.detections as rdd
+from range_driver.cache import DiskCache, cached_frames, fingerprint, missing_as_nan
+
+
+def frame(num, seed=0):
+    return pd.DataFrame({'x': np.random.default_rng(seed).normal(size=num)})
+
+
+def set_last_use(cache, key, seconds):
+    os.utime(cache.path(key), (seconds, seconds))
+
+
+def test_lru_eviction(tmp_path):
+    cache = DiskCache(str(tmp_path))
+    for i, key in enumerate(['a', 'b', 'c']):
+        cache.put(key, frame(1000, i))
+        set_last_use(cache, key, 1e9 + i)
+    # reading 'a' marks it as the most recently used entry
+    pd.testing.assert_frame_equal(cache.get('a'), frame(1000, 0))
+    sizes = {path: size for _, size, path in cache.entries()}
+    cache.evict(sizes[cache.path('a')] + sizes[cache.path('c')])
+    assert 'a' in cache and 'b' not in cache and 'c' in cache
+    assert cache.get('b') is None
+
+    cache.invalidate('a')
+    assert 'a' not in cache and 'c' in cache
+    cache.invalidate()
+    assert cache.entries() == []
+
+
+def test_max_bytes_evicts_on_put(tmp_path):
+    size = len(frame(1000).to_parquet())
+    cache = DiskCache(str(tmp_path), max_bytes=int(2.5 * size))
+    for i, key in enumerate(['a', 'b', 'c']):
+        cache.put(key, frame(1000))
+        set_last_use(cache, key, 1e9 + i)
+    assert 'a' not in cache and 'b' in cache and 'c' in cache
+    assert cache.size() <= cache.max_bytes
+
+
+def test_put_pickles_frames_parquet_cannot_store(tmp_path):
+    cache = DiskCache(str(tmp_path))
+    df = pd.DataFrame({'mixed': [1, 'a', 2.5], 'x': [1., 2., 3.]})
+    cache.put('mixed', df)
+    assert not os.path.exists(cache.path('mixed'))
+    assert os.path.exists(cache.path('mixed', cache.object_suffix))
+    assert 'mixed' in cache
+    pd.testing.assert_frame_equal(cache.get('mixed'), df)
+    pd.testing.assert_frame_equal(cache.get('mixed', columns=['x']), df[['x']])
+
+
+def test_failed_write_leaves_no_entry(tmp_path):
+    cache = DiskCache(str(tmp_path))
+    cache.put_object('key', 'previous')
+
+    def partial_write(path):
+        with open(path, 'wb') as fh:
+            fh.write(b'partial')
+        raise RuntimeError('disk full')
+
+    with pytest.raises(RuntimeError):
+        cache._write('key', cache.object_suffix, partial_write)
+    # the previous entry is intact, and no temporary file is left behind
+    assert cache.get_object('key') == 'previous'
+    assert sorted(os.listdir(str(tmp_path))) == ['key' + cache.object_suffix]
+
+
+def test_cached_frames(tmp_path):
+    cache = DiskCache(str(tmp_path))
+    calls = []
+    df = pd.DataFrame({'name': ['a', np.nan, 'c'], 'x': [1., np.nan, 3.]})
+
+    def func():
+        calls.append(1)
+        return df, frame(10)
+
+    key = fingerprint('frames', 1)
+    first = cached_frames(cache, key, func)
+    second = cached_frames(cache, key, func)
+    assert len(calls) == 1
+    assert second[0]['name'].isna().sum() == 1 and isinstance(second[0]['name'][1], float)
+    for left, right in zip(first, second):
+        pd.testing.assert_frame_equal(left, right)
+
+    # an entry without its count is incomplete, and recomputed
+    cache.invalidate(key)
+    cached_frames(cache, key, func)
+    assert len(calls) == 2
+    assert cached_frames(None, key, func)[0] is df
+
+
+def test_missing_as_nan():
+    df = pd.DataFrame({'name': ['a', None], 'full': ['a', 'b'], 'x': [1., np.nan]})
+    result = missing_as_nan(df)
+    assert isinstance(result['name'][1], float) and result['name'].isna()[1]
+    pd.testing.assert_frame_equal(result[['full', 'x']], df[['full', 'x']])
+    no_missing = df[['full', 'x']]
+    assert missing_as_nan(no_missing) is no_missing
+
+
+@pytest.fixture
+def temp_file(tmp_path):
+    rng = np.random.default_rng(0)
+    lat, lon = np.linspace(44.3, 44.6, 7), np.linspace(-64.3, -64.0, 7)
+    time = pd.date_range('2016-03-08', '2016-03-25', freq='3H')
+    path = str(tmp_path / 'temp.nc')
+    xr.Dataset({'temp': (('lat', 'lon', 'time'), rng.normal(size=(len(lat), len(lon), len(time))))},
+               coords={'lat': lat, 'lon': lon, 'time': time}).to_netcdf(path)
+    return path
+
+
+def custom_data(detection_df, temp_file, cache_dir):
+    dets = rdd.Detections.__new__(rdd.Detections)
+    dets.reset()
+    dets.config = Bunch(settings=Bunch(show_details=False, cache_dir=cache_dir),
+                        data=Bunch(sources={}), bounds=Bunch(), file_map=Bunch(temp=temp_file))
+    dets.detection_df, dets.mdb = detection_df.copy(), Bunch()
+    dets.add_env_data()
+    dets.add_custom_data()
+    return dets
+
+
+def test_custom_env_stage_hit_matches_miss(temp_file, tmp_path, monkeypatch):
+    rng = np.random.default_rng(1)
+    num = 300
+    detection_df = pd.DataFrame({
+        'datetime': pd.Timestamp('2016-03-09') + pd.to_timedelta(rng.integers(0, 96 * 3600, num), 's'),
+        'Receiver.lat': rng.choice([44.41, 44.52], num),
+        'Receiver.lon': rng.choice([-64.2, -64.07], num),
+        'Receiver.depth': 10.,
+    })
+    cache_dir = str(tmp_path / 'cache')
+    miss = custom_data(detection_df, temp_file, cache_dir)
+    assert len(DiskCache(cache_dir).entries()) == 1
+
+    def no_interpolation(*args, **kwargs):
+        raise AssertionError('cached custom data interpolated again')
+
+    monkeypatch.setattr(rdd.environment, 'add_custom_env_data', no_interpolation)
+    hit = custom_data(detection_df, temp_file, cache_dir)
+
+    for dets in [miss, hit]:
+        # without kadlu sources, the custom columns are not added to detection_df itself
+        pd.testing.assert_frame_equal(dets.detection_df, detection_df)
+        assert dets.df_detections_env['temp'].notna().all()
+    pd.testing.assert_frame_equal(hit.df_detections_env, miss.df_detections_env)
+    for left, right in zip(hit.axes_to_interpolate, miss.axes_to_interpolate):
+        np.testing.assert_array_equal(left, right)
@@ -0,0 +1,102 @@
+import os
+
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import write_synthetic_nsog
+from range_driver.data_prep import (convert_detections_to_parquet, read_detections,
+                                    read_detections_csv, read_detections_parquet)
+
+
+@pytest.fixture(scope='module')
+def nsog_csv(tmp_path_factory):
+    """NSOG export spanning two months, with some detections outside of the region"""
+    detections_csv, _ = write_synthetic_nsog(str(tmp_path_factory.mktemp('nsog')),
+                                             num_detections=20000, num_receivers=3,
+                                             num_transmitters=5, seed=2)
+    raw = pd.read_csv(detections_csv)
+    later = raw.index % 2 == 1
+    raw.loc[later, 'datecollected'] = (pd.to_datetime(raw.loc[later, 'datecollected'])
+                                       + pd.Timedelta('40 days')).dt.strftime('%Y-%m-%d %H:%M:%S')
+    raw.loc[raw.index % 7 == 3, 'rcvrcatnumber'] = 'HFX'
+    raw.to_csv(detections_csv, index=False)
+    return detections_csv
+
+
+@pytest.fixture(scope='module')
+def full(nsog_csv):
+    return read_detections_csv(nsog_csv, 'nsog')
+
+
+def test_full_read(full):
+    assert len(full) == 20000 - len(range(3, 20000, 7))
+    assert full['datetime'].dt.month.nunique() == 2
+
+
+@pytest.mark.parametrize('partition_by', ['month', 'Receiver', None])
+def test_parquet_round_trip(nsog_csv, full, tmp_path, partition_by):
+    dataset = str(tmp_path / 'detections')
+    convert_detections_to_parquet(nsog_csv, dataset, 'nsog', partition_by=partition_by, chunksize=3000)
+    if partition_by == 'month':
+        assert sorted(os.listdir(dataset)) == ['month=2016-03', 'month=2016-04']
+    pd.testing.assert_frame_equal(read_detections_parquet(dataset), full)
+    pd.testing.assert_frame_equal(read_detections(dataset, 'nsog'), full)
+
+    with pytest.raises(FileExistsError):
+        convert_detections_to_parquet(nsog_csv, dataset, 'nsog', partition_by=partition_by)
+    convert_detections_to_parquet(nsog_csv, dataset, 'nsog', partition_by=partition_by, overwrite=True)
+    pd.testing.assert_frame_equal(read_detections_parquet(dataset), full)
+
+
+@pytest.mark.parametrize('partition_by', ['month', None])
+def test_parquet_filters(nsog_csv, full, tmp_path, partition_by):
+    dataset = str(tmp_path / 'detections')
+    convert_detections_to_parquet(nsog_csv, dataset, 'nsog', partition_by=partition_by)
+    receivers = ['NSOG-480000', 'NSOG-480002']
+    transmitters = ['A69-1601-10001', 'A69-1601-10003']
+    columns = ['datetime', 'Receiver', 'Transmitter', 'Receiver.depth']
+    for start, end in [('2016-03-15', '2016-04-20'), ('2016-04-01', None), (None, '2016-03-12')]:
+        result = read_detections_parquet(dataset, start, end, receivers, columns, transmitters)
+        expected = full[((full['datetime'] >= pd.Timestamp(start or full['datetime'].min()))
+                         & (full['datetime'] < pd.Timestamp(end or '2100-01-01'))
+                         & full['Receiver'].isin(receivers) & full['Transmitter'].isin(transmitters))]
+        assert len(result)
+        pd.testing.assert_frame_equal(result, read_detections_csv(nsog_csv, 'nsog', start, end,
+                                                                  receivers, transmitters, columns))
+        pd.testing.assert_frame_equal(result.astype({'Receiver': str, 'Transmitter': str}),
+                                      expected[columns].astype({'Receiver': str, 'Transmitter': str}))
+
+
+@pytest.mark.parametrize('chunksize', [997, 5000, 50000])
+def test_chunked_csv_matches_full_read(nsog_csv, full, chunksize):
+    pd.testing.assert_frame_equal(read_detections_csv(nsog_csv, 'nsog', chunksize=chunksize), full)
+
+
+@pytest.mark.parametrize('chunksize', [None, 997])
+def test_csv_filters(nsog_csv, full, chunksize):
+    start, end = '2016-03-12', '2016-04-25'
+    receivers, transmitters = ['NSOG-480001'], ['A69-1601-10000', 'A69-1601-10004']
+    mask = ((full['datetime'] >= start) & (full['datetime'] < end)
+            & full['Receiver'].isin(receivers) & full['Transmitter'].isin(transmitters))
+    result = read_detections_csv(nsog_csv, 'nsog', start, end, receivers, transmitters,
+                                 ['datetime', 'Receiver', 'Transmitter', 'station'], chunksize)
+    assert 0 < len(result) < mask.size
+    # only the devices that are read are categories
+    assert list(result['Receiver'].cat.categories) == receivers
+    assert list(result['Transmitter'].cat.categories) == transmitters
+    expected = full.loc[mask, ['datetime', 'Receiver', 'Transmitter', 'station']]
+    pd.testing.assert_frame_equal(result.astype({'Receiver': str, 'Transmitter': str}),
+                                  expected.astype({'Receiver': str, 'Transmitter': str}))
+
+
+def test_chunks_without_matches(nsog_csv):
+    # chunks where no detection matches the filters are empty, not missing columns
+    result = read_detections_csv(nsog_csv, 'nsog', start='2016-04-20', chunksize=997)
+    assert len(result) and (result['datetime'] >= '2016-04-20').all()
+    empty = read_detections_csv(nsog_csv, 'nsog', receivers=['NSOG-1'], chunksize=997)
+    assert len(empty) == 0 and list(empty.columns) == list(result.columns)
+
+
+def test_unknown_reader(nsog_csv):
+    with pytest.raises(ValueError):
+        read_detections_csv(nsog_csv, 'vemco')
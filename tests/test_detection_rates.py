@@ -0,0 +1,173 @@
+import copy
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import make_synthetic_detections
+from range_driver.data_prep import (calc_station_dists_m, detection_rate_cube, detection_rate_grid,
+                                    detection_rate_level, get_all_group_info, group_info,
+                                    join_rt_group_info, process_intervals, rt_group_codes,
+                                    rt_pair_mask, update_detection_rate_cube)
+from range_driver.data_prep.parallel import GroupExecutor
+
+
+@pytest.fixture(scope='module')
+def synthetic():
+    return make_synthetic_detections(30000, 4, 6, seed=3)
+
+
+def with_string_keys(df):
+    """`df` with its device name columns or index levels as strings"""
+    if isinstance(df.index, pd.MultiIndex):
+        df = df.copy(deep=False)
+        df.index = pd.MultiIndex.from_frame(with_string_keys(df.index.to_frame(index=False)))
+        return df
+    return df.astype({col: object for col in ['Receiver', 'Transmitter'] if col in df.columns})
+
+
+def run_process_intervals(synthetic, engine, executor=None):
+    detection_df, metadata = synthetic
+    metadata = copy.deepcopy(metadata)
+    return process_intervals(detection_df.copy(), metadata, engine=engine, executor=executor), metadata
+
+
+@pytest.mark.parametrize('backend', ['serial', 'thread', 'process'])
+def test_process_intervals_matches_loop(synthetic, backend):
+    expected, _ = run_process_intervals(synthetic, 'loop')
+    with GroupExecutor(backend, workers=2, min_chunk_rows=1000) as executor:
+        result, _ = run_process_intervals(synthetic, 'vectorized', executor)
+    for left, right in zip(expected, result):
+        pd.testing.assert_frame_equal(left, right)
+
+
+@pytest.mark.parametrize('auto_dr', [False, True])
+@pytest.mark.parametrize('time_bin_length', ['60min', '20min'])
+def test_detection_rate_grid_matches_loop(synthetic, auto_dr, time_bin_length):
+    (df_dets, _, _), metadata = run_process_intervals(synthetic, 'vectorized')
+    expected = detection_rate_grid(df_dets.copy(), time_bin_length, copy.deepcopy(metadata),
+                                   auto_dr, engine='loop')
+    # with auto_dr, the rates of all pairs are normalized at once, in chunks of pairs
+    with GroupExecutor('thread', workers=2, min_chunk_rows=100) as executor:
+        result = detection_rate_grid(df_dets.copy(), time_bin_length, copy.deepcopy(metadata),
+                                     auto_dr, executor=executor)
+    assert expected[1] == result[1]
+    pd.testing.assert_frame_equal(expected[0], result[0])
+
+
+@pytest.mark.parametrize('auto_dr', [False, True])
+@pytest.mark.parametrize('time_bin_length', ['10min', '60min', '6h'])
+def test_detection_rate_level_matches_grid(synthetic, auto_dr, time_bin_length):
+    (df_dets, _, _), metadata = run_process_intervals(synthetic, 'vectorized')
+    cube = detection_rate_cube(df_dets, metadata, '10min')
+    expected = detection_rate_grid(df_dets.copy(), time_bin_length, copy.deepcopy(metadata), auto_dr)
+    result = detection_rate_level(cube, time_bin_length, copy.deepcopy(metadata), auto_dr)
+    assert expected[1] == result[1]
+    pd.testing.assert_frame_equal(expected[0], result[0])
+
+
+def test_detection_rate_level_needs_multiple_of_base(synthetic):
+    (df_dets, _, _), metadata = run_process_intervals(synthetic, 'vectorized')
+    cube = detection_rate_cube(df_dets, metadata, '20min')
+    with pytest.raises(ValueError):
+        detection_rate_level(cube, '30min', metadata)
+
+
+@pytest.mark.parametrize('update', ['later', 'earlier'])
+def test_update_detection_rate_cube_matches_fresh(synthetic, update):
+    detection_df, metadata = synthetic
+    detection_df = detection_df.copy()
+    pairs = pd.MultiIndex.from_arrays([detection_df['Receiver'].cat.categories[[0, 2]],
+                                       detection_df['Transmitter'].cat.categories[[1, 4]]],
+                                      names=['Receiver', 'Transmitter'])
+    updated = rt_pair_mask(detection_df, pairs)
+    rank = detection_df[updated].groupby(['Receiver', 'Transmitter'], observed=True).cumcount()
+    if update == 'later':
+        # the history lacks the last detections of the pairs
+        new = rank >= rank.max() * 0.7
+    else:
+        # the new detections of the pairs start days before all others, moving the cube's origin
+        detection_df.loc[updated, 'datetime'] -= pd.Timedelta('2 days')
+        new = rank < rank.max() * 0.5
+    assert new.any() and not new.all()
+    history = detection_df.drop(new.index[new.values])
+
+    old_metadata, metadata = copy.deepcopy(metadata), copy.deepcopy(metadata)
+    old_dets, _, _ = process_intervals(history.copy(), old_metadata)
+    cube = detection_rate_cube(old_dets, old_metadata, '10min')
+    df_dets, _, _ = process_intervals(detection_df, metadata)
+    expected = detection_rate_cube(df_dets, metadata, '10min')
+    result = update_detection_rate_cube(cube, df_dets[rt_pair_mask(df_dets, pairs)], metadata, pairs)
+
+    assert (result.origin == cube.origin) == (update == 'later')
+    assert result.origin == expected.origin and result.base_bin_length == expected.base_bin_length
+    pd.testing.assert_frame_equal(result.events, expected.events)
+    pd.testing.assert_index_equal(result.pairs, expected.pairs)
+    for field in ['bin_idx', 'det_keys', 'det_counts']:
+        np.testing.assert_array_equal(result[field], expected[field], err_msg=field)
+
+
+@pytest.mark.parametrize('keys', ['categorical', 'string'])
+def test_rt_group_codes_match_groupby(synthetic, keys):
+    detection_df = synthetic[0].iloc[::7].copy()
+    if keys == 'string':
+        detection_df = with_string_keys(detection_df)
+    # a missing name belongs to no group
+    detection_df.loc[detection_df.index[5], 'Receiver'] = np.nan
+    gcodes, groups = rt_group_codes(detection_df)
+    # groups sorted by name, as when grouping the names as strings
+    grouped = with_string_keys(detection_df).groupby(['Receiver', 'Transmitter'], sort=True)
+    np.testing.assert_array_equal(gcodes, grouped.ngroup().fillna(-1).astype('int64').values)
+    pd.testing.assert_index_equal(groups, grouped.size().index)
+
+
+def test_string_keys_match_categorical(synthetic):
+    """Device names as strings give the results of the categorical names of read_detections()"""
+    (df_dets, df_inits, rt_groups), metadata = run_process_intervals(synthetic, 'vectorized')
+    detection_df, string_metadata = synthetic[0], copy.deepcopy(synthetic[1])
+    string_results = process_intervals(with_string_keys(detection_df), string_metadata)
+    for left, right in zip(string_results, (df_dets, df_inits, rt_groups)):
+        pd.testing.assert_frame_equal(with_string_keys(left), with_string_keys(right),
+                                      check_index_type=False)
+    for auto_dr in [False, True]:
+        expected = detection_rate_grid(df_dets.copy(), '60min', copy.deepcopy(metadata), auto_dr)
+        result = detection_rate_grid(string_results[0].copy(), '60min',
+                                     copy.deepcopy(string_metadata), auto_dr)
+        assert expected[1] == result[1]
+        pd.testing.assert_frame_equal(with_string_keys(result[0]), with_string_keys(expected[0]))
+
+
+def group_info_loop(detection_df, metadata):
+    """group_info() of each group, with the per-group rt_info() merges"""
+    rt_groupby = with_string_keys(detection_df).groupby(['Receiver', 'Transmitter'])
+    return pd.DataFrame([group_info(grdf, metadata) for _, grdf in rt_groupby],
+                        columns=[*group_info()], index=pd.MultiIndex.from_tuples(rt_groupby.groups))
+
+
+def test_rt_pair_info_matches_group_loop(synthetic):
+    (df_dets, _, _), metadata = run_process_intervals(synthetic, 'vectorized')
+    transmitter = metadata.transmitter
+    # group names include the tag family and power, unless they are unknown
+    transmitter['Tag Family'] = transmitter['Transmitter.Tag Family'].where(
+        np.arange(len(transmitter)) != 2)
+    transmitter['Power'] = transmitter['Transmitter.Power']
+    deploy = metadata.deploy
+    # a redeployed receiver keeps its first station, a transmitter without deployment has no
+    # distance
+    metadata.deploy = pd.concat([deploy[deploy['INS_SERIAL_NO'] != 10003],
+                                 deploy[deploy['INS_SERIAL_NO'] == 480001].assign(STATION_NO=2)],
+                                ignore_index=True)
+    metadata.station_dists_m = calc_station_dists_m(
+        metadata.deploy.groupby('STATION_NO')[['DEPLOY_LAT', 'DEPLOY_LONG']].nth(0))
+
+    expected = group_info_loop(df_dets, metadata)
+    result = get_all_group_info(df_dets, copy.deepcopy(metadata))
+    assert expected['dist_m'].isna().any() and expected['dist_m'].notna().any()
+    assert expected['Receiver/Transmitter'].str.contains('/V13-').any()
+    pd.testing.assert_frame_equal(result.set_axis(expected.index), expected)
+
+    expected_metadata, result_metadata = copy.deepcopy(metadata), copy.deepcopy(metadata)
+    join_rt_group_info(expected, expected_metadata)
+    join_rt_group_info(result, result_metadata)
+    pd.testing.assert_frame_equal(with_string_keys(result_metadata.rt_groups),
+                                  with_string_keys(expected_metadata.rt_groups))
@@ -0,0 +1,203 @@
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+from range_driver.data_prep.environment import (add_custom_env_data, add_kadlu_env_data, query_axes,
+                                               unique_queries)
+
+bounds = dict(south=44., north=45., west=-64., east=-63., start='2016-03-09', end='2016-03-12',
+              top=0, bottom=0)
+sources = {'load_waveheight': 'era5', 'load_windspeed': 'era5'}
+offsets = {'waveheight': 0., 'windspeed': 100.}
+
+
+def linear_field(var, lat, lon, hours):
+    return offsets[var] + lat + 2 * lon + hours / 100
+
+
+def fake_load(source, var, south, north, west, east, start, end, top, bottom):
+    """Stand-in for kadlu.load() with a field that is linear in lat, lon, and time, on a grid"""
+    hours_2000 = (np.datetime64(start, 'h') - np.datetime64('2000-01-01', 'h')).astype(float)
+    lat, lon, hours = np.meshgrid(np.linspace(south, north, 5), np.linspace(west, east, 6),
+                                  hours_2000 + np.arange(0, 73, 3.), indexing='ij')
+    lat, lon, hours = lat.ravel(), lon.ravel(), hours.ravel()
+    return linear_field(var, lat, lon, hours), lat, lon, hours
+
+
+@pytest.fixture
+def detection_df():
+    rng = np.random.default_rng(0)
+    num = 500
+    return pd.DataFrame({
+        'datetime': pd.Timestamp('2016-03-09 06:00')
+                    + pd.to_timedelta(rng.integers(0, 48 * 3600, num), 's'),
+        'Receiver.lat': rng.choice([44.2, 44.51, 44.83], num),
+        'Receiver.lon': rng.choice([-63.9, -63.42], num),
+        'Receiver.depth': 10.,
+    })
+
+
+def expected(detection_df, var):
+    hours = ((detection_df['datetime'].values - np.datetime64('2000-01-01'))
+             / np.timedelta64(1, 'h'))
+    return linear_field(var, detection_df['Receiver.lat'].values,
+                        detection_df['Receiver.lon'].values, hours)
+
+
+def test_fake_loader_linear(detection_df):
+    df, kadlu_results = add_kadlu_env_data(bounds, sources, detection_df, method='linear',
+                                           load_func=fake_load)
+    assert set(kadlu_results) == set(offsets)
+    assert list(df.columns) == list(detection_df.columns) + ['waveheight', 'windspeed']
+    for var in offsets:
+        np.testing.assert_allclose(df[var].values, expected(detection_df, var), rtol=1e-9)
+        np.testing.assert_array_equal(kadlu_results[var][0], fake_load('era5', var, **bounds)[0])
+
+
+@pytest.mark.parametrize('executor', ['thread', 'process'])
+def test_executor_matches_serial(detection_df, executor):
+    serial, _ = add_kadlu_env_data(bounds, sources, detection_df, method='nearest',
+                                   time_resolution='1H', load_func=fake_load)
+    pooled, kadlu_results = add_kadlu_env_data(bounds, sources, detection_df, method='nearest',
+                                               time_resolution='1H', workers=2,
+                                               executor=executor, load_func=fake_load)
+    pd.testing.assert_frame_equal(pooled, serial)
+    assert set(kadlu_results) == set(offsets)
+    # nearest grid values are within half a grid step of the field along each axis, times are
+    # rounded to the hour first
+    for var in offsets:
+        assert np.abs(pooled[var].values - expected(detection_df, var)).max() <= 0.125 + 0.2 + 0.02
+
+
+def test_unknown_executor(detection_df):
+    with pytest.raises(ValueError):
+        add_kadlu_env_data(bounds, sources, detection_df, workers=2, executor='cluster',
+                           load_func=fake_load)
+
+
+@pytest.fixture
+def masked_grid_file(tmp_path):
+    """Gridded variables with a land-masked block of NaN values, as in coastal model output"""
+    rng = np.random.default_rng(2)
+    lat, lon = np.linspace(44., 46., 41), np.linspace(-64., -62., 41)
+    time = pd.date_range('2016-03-09', periods=40, freq='3H')
+    temp = rng.normal(size=(len(lat), len(lon), len(time)))
+    temp[10:30, 10:30, :] = np.nan
+    path = str(tmp_path / 'masked.nc')
+    xr.Dataset({'temp': (('lat', 'lon', 'time'), temp),
+                'salt': (('lat', 'lon', 'time'), temp * 2 + 30)},
+               coords={'lat': lat, 'lon': lon, 'time': time}).to_netcdf(path)
+    return path
+
+
+@pytest.mark.parametrize('method', ['nearest', 'linear'])
+def test_custom_env_data_window_on_masked_grid(masked_grid_file, method):
+    rng = np.random.default_rng(3)
+    num = 500
+    # receivers in the masked block and next to it
+    detection_df = pd.DataFrame({
+        'datetime': pd.Timestamp('2016-03-09 06:00')
+                    + pd.to_timedelta(rng.integers(0, 48 * 3600, num), 's'),
+        'Receiver.lat': rng.choice([44.8, 45.0, 45.2, 45.55], num),
+        'Receiver.lon': rng.choice([-63.3, -63.0, -62.6], num),
+        'Receiver.depth': 10.,
+    })
+    file_map = {'temp': masked_grid_file, 'salt': masked_grid_file}
+    results = {margin: add_custom_env_data(query_axes(detection_df), file_map, detection_df.copy(),
+                                           method, window_margin=margin)
+               for margin in [None, 1]}
+    assert results[None][['temp', 'salt']].notna().all().all()
+    pd.testing.assert_frame_equal(results[1], results[None])
+
+
+def test_unique_queries_inverse(detection_df):
+    # detections of several transmitters at the same receiver and time share their query
+    axes = query_axes(pd.concat([detection_df, detection_df.sample(frac=1, random_state=0)]))
+    unique_axes, inverse = unique_queries(axes)
+    points = np.column_stack(unique_axes)
+    assert len(points) == len(np.unique(points, axis=0)) == len(detection_df)
+    for ax, unique_ax in zip(axes, unique_axes):
+        np.testing.assert_array_equal(unique_ax[inverse], ax)
+    # in order of first occurrence
+    assert (np.diff(np.maximum.accumulate(inverse)) <= 1).all() and inverse[0] == 0
+
+
+def test_unique_queries_nan_keys():
+    lat = np.array([44.5, np.nan, 44.5, np.nan, 44.6])
+    lon = np.array([-64., -64., -64., -64., np.nan])
+    seconds = np.array([0., 10., 0., 10., 0.])
+    depth = np.array([np.nan, 5., np.nan, 5., 5.])
+    unique_axes, inverse = unique_queries([lat, lon, seconds, depth])
+    np.testing.assert_array_equal(inverse, [0, 1, 0, 1, 2])
+    for ax, unique_ax in zip([lat, lon, seconds, depth], unique_axes):
+        np.testing.assert_array_equal(unique_ax[inverse], ax)
+
+
+@pytest.mark.parametrize('time_resolution', [3600, '1H', pd.Timedelta('1H')])
+def test_unique_queries_time_resolution(detection_df, time_resolution):
+    axes = query_axes(detection_df)
+    unique_axes, inverse = unique_queries(axes, time_resolution)
+    np.testing.assert_array_equal(unique_axes[2][inverse], np.round(axes[2] / 3600) * 3600)
+    for ax, unique_ax in zip(axes[:2] + axes[3:], unique_axes[:2] + unique_axes[3:]):
+        np.testing.assert_array_equal(unique_ax[inverse], ax)
+    # 6 receiver positions over 48 hours, at most 49 rounded times each
+    assert len(unique_axes[0]) <= 6 * 49 < len(unique_queries(axes)[0][0])
+
+
+def env_field(var, lat, lon, seconds, depth=0.):
+    hours = (seconds - pd.Timestamp('2016-03-09').timestamp()) / 3600
+    return {'temp': 10 + lat - lon + hours / 10,
+            'uvel': lat * lon + hours,
+            'salt': 30 + lat + 0.1 * depth - hours / 100 + 0.01 * lon * depth,
+            'wave': 2 * lat - lon / 10 + hours / 20}[var]
+
+
+@pytest.fixture
+def multi_variable_files(tmp_path):
+    """temp, uvel (3D) and salt (4D, with depth) in one file, wave on a coarser grid in another"""
+    time = pd.date_range('2016-03-09', periods=30, freq='3H')
+    coords = dict(lat=np.linspace(44., 46., 21), lon=np.linspace(-64., -62., 17), time=time,
+                  depth=np.array([0., 5., 20., 50.]))
+    grid = np.meshgrid(coords['lat'], coords['lon'], time.values.astype('int64') / 1e9,
+                       coords['depth'], indexing='ij')
+    ocean = str(tmp_path / 'ocean.nc')
+    xr.Dataset({'temp': (('lat', 'lon', 'time'), env_field('temp', *grid[:3])[..., 0]),
+                'uvel': (('lat', 'lon', 'time'), env_field('uvel', *grid[:3])[..., 0]),
+                # stored in another dimension order
+                'salt': (('time', 'depth', 'lat', 'lon'), env_field('salt', *grid).transpose(2, 3, 0, 1))},
+               coords=coords).to_netcdf(ocean)
+    coords = dict(lat=np.linspace(44., 46., 5), lon=np.linspace(-64., -62., 5),
+                  time=pd.date_range('2016-03-09', periods=10, freq='9H'))
+    grid = np.meshgrid(coords['lat'], coords['lon'], coords['time'].values.astype('int64') / 1e9,
+                       indexing='ij')
+    waves = str(tmp_path / 'waves.nc')
+    xr.Dataset({'wave': (('lat', 'lon', 'time'), env_field('wave', *grid))}, coords=coords).to_netcdf(waves)
+    return {'temp': ocean, 'salt': ocean, 'wave': waves, 'uvel': ocean}
+
+
+@pytest.fixture
+def receiver_detections():
+    rng = np.random.default_rng(4)
+    num = 400
+    return pd.DataFrame({
+        'datetime': pd.Timestamp('2016-03-09 06:00')
+                    + pd.to_timedelta(rng.integers(0, 60 * 3600, num), 's'),
+        'Receiver.lat': rng.choice([44.23, 44.81, 45.57], num),
+        'Receiver.lon': rng.choice([-63.91, -63.33, -62.45], num),
+        'Receiver.depth': rng.choice([3., 12.5, 40.], num),
+    })
+
+
+@pytest.mark.parametrize('window_margin', [None, 1])
+def test_custom_env_data_several_variables(multi_variable_files, receiver_detections, window_margin):
+    axes = query_axes(receiver_detections)
+    result = add_custom_env_data(axes, multi_variable_files, receiver_detections.copy(), 'linear',
+                                 window_margin=window_margin)
+    assert list(result.columns) == list(receiver_detections.columns) + list(multi_variable_files)
+    for var in multi_variable_files:
+        np.testing.assert_allclose(result[var].values, env_field(var, *axes), rtol=1e-9, err_msg=var)
+        # the same as reading each variable on its own
+        single = add_custom_env_data(axes, {var: multi_variable_files[var]},
+                                     receiver_detections.copy(), 'linear', window_margin=window_margin)
+        np.testing.assert_array_equal(result[var].values, single[var].values, err_msg=var)
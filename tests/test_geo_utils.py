@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from range_driver import geo_utils
+from range_driver.geo_utils import dist_matrix_m, geodesic_m, haversine_m, vincenty_m
+
+
+def random_points(num, seed):
+    rng = np.random.default_rng(seed)
+    # uniform on the sphere
+    lat = np.degrees(np.arcsin(rng.uniform(-1, 1, num)))
+    return lat, rng.uniform(-180, 180, num)
+
+
+@pytest.fixture(scope='module')
+def global_pairs():
+    lat0, lon0 = random_points(500, 0)
+    lat1, lon1 = random_points(500, 1)
+    return lat0, lon0, lat1, lon1
+
+
+def test_vincenty_matches_geodesic(global_pairs):
+    np.testing.assert_allclose(vincenty_m(*global_pairs), geodesic_m(*global_pairs), rtol=0, atol=1e-3)
+
+
+def test_haversine_within_relative_error(global_pairs):
+    expected = geodesic_m(*global_pairs)
+    assert np.abs(haversine_m(*global_pairs) / expected - 1).max() <= 0.0056
+
+
+def test_near_antipodal_points_use_geodesic(monkeypatch):
+    lat0 = np.array([0., 0., 10., -30.5, 44.5])
+    lon0 = np.array([0., 0., 20., 100., -64.])
+    lat1 = np.array([0., 0.5, -10., 30.5, 44.6])
+    lon1 = np.array([179.7, 179.8, -160.1, -80.2, -64.1])
+    fallbacks = []
+
+    def dist_m(latlon0, latlon1):
+        fallbacks.append((latlon0, latlon1))
+        return geo_utils.geodesic(latlon0, latlon1).m
+
+    monkeypatch.setattr(geo_utils, 'dist_m', dist_m)
+    result = vincenty_m(lat0, lon0, lat1, lon1)
+    assert 0 < len(fallbacks) < len(lat0)
+    np.testing.assert_allclose(result, geodesic_m(lat0, lon0, lat1, lon1), rtol=0, atol=1e-3)
+
+
+def test_scalar_and_coincident_points():
+    assert np.ndim(vincenty_m(44.5, -64., 44.6, -64.1)) == 0
+    assert vincenty_m(44.5, -64., 44.5, -64.) == 0
+    np.testing.assert_allclose(vincenty_m(44.5, -64., 44.6, -64.1),
+                               geodesic_m(44.5, -64., 44.6, -64.1), rtol=0, atol=1e-3)
+
+
+@pytest.mark.parametrize('method', ['vincenty', 'haversine', 'geodesic'])
+def test_dist_matrix(method):
+    lat, lon = random_points(12, 2)
+    lat1, lon1 = random_points(5, 3)
+    rtol = 0.0056 if method == 'haversine' else 1e-9
+    expected = geodesic_m(lat[:, None], lon[:, None], lat[None, :], lon[None, :])
+    dists = dist_matrix_m(lat, lon, method=method)
+    assert np.array_equal(dists, dists.T) and (np.diag(dists) == 0).all()
+    np.testing.assert_allclose(dists, expected, rtol=rtol)
+    np.testing.assert_allclose(dist_matrix_m(lat, lon, lat1, lon1, method=method),
+                               geodesic_m(lat[:, None], lon[:, None], lat1[None, :], lon1[None, :]),
+                               rtol=rtol)
+
+
+def test_dist_matrix_unknown_method():
+    with pytest.raises(ValueError):
+        dist_matrix_m([44.5], [-64.], method='flat')
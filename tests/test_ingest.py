@@ -0,0 +1,74 @@
+import copy
+
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+from sklearn.utils import Bunch
+
+import range_driver.detections as rdd
+from benchmarks.synthetic import make_synthetic_detections
+from range_driver.data_prep import encode_devices, merge_devices
+
+
+@pytest.fixture(scope='module')
+def synthetic():
+    df, md = make_synthetic_detections(30000, 4, 6, seed=5)
+    md.receiver['Receiver.lat'] = 44.45 + np.arange(4) * 0.01
+    md.receiver['Receiver.lon'] = -64.15
+    df = merge_devices(merge_devices(df, md.receiver), md.transmitter.reset_index())
+    return df.astype({'Receiver': str, 'Transmitter': str}), md
+
+
+@pytest.fixture(scope='module')
+def temp_file(tmp_path_factory):
+    rng = np.random.default_rng(0)
+    lat, lon = np.linspace(44.3, 44.6, 7), np.linspace(-64.3, -64.0, 7)
+    time = pd.date_range('2016-03-08', '2016-03-25', freq='3H')
+    path = str(tmp_path_factory.mktemp('env') / 'temp.nc')
+    xr.Dataset({'temp': (('lat', 'lon', 'time'), rng.normal(size=(len(lat), len(lon), len(time))))},
+               coords={'lat': lat, 'lon': lon, 'time': time}).to_netcdf(path)
+    return path
+
+
+def make_detections(df, md, auto_dr, temp_file, ingest=True):
+    dets = rdd.Detections.__new__(rdd.Detections)
+    dets.reset()
+    dets.config = Bunch(settings=Bunch(time_bin_length='60min', base_bin_length='20min',
+                                       auto_dr=auto_dr, show_details=False, ingest=ingest),
+                        data=Bunch(sources={}), bounds=Bunch(), file_map=Bunch(temp=temp_file))
+    dets.detection_df, dets.mdb = encode_devices(df), copy.deepcopy(md)
+    dets.make_detection_rate()
+    dets.process_bins()
+    return dets
+
+
+@pytest.mark.parametrize('auto_dr', [False, True])
+def test_ingest_matches_full_build(synthetic, temp_file, auto_dr):
+    df, md = synthetic
+    # the batch has later detections, and all detections of one receiver and of one pair
+    batch_mask = ((df['datetime'] >= df['datetime'].quantile(0.7))
+                  | (df['Receiver'] == 'VR2W-480002')
+                  | ((df['Receiver'] == 'VR2W-480003') & (df['Transmitter'] == 'A69-1601-10002')))
+    history, batch = df[~batch_mask], df[batch_mask]
+    full = pd.concat([history, batch]).reset_index(drop=True)
+    history = history.reset_index(drop=True)
+
+    expected = make_detections(full, md, auto_dr, temp_file)
+    dets = make_detections(history, md, auto_dr, temp_file)
+    pairs = dets.ingest(encode_devices(batch.reset_index(drop=True)))
+    assert len(pairs)
+
+    for attr in ['df_detections_env', 'detection_events_df', 'detection_bins_df']:
+        pd.testing.assert_frame_equal(getattr(dets, attr), getattr(expected, attr), obj=attr)
+    assert dets.df_detections_env['temp'].notna().all()
+    for table in ['rt_groups', 'rt_pairs']:
+        pd.testing.assert_frame_equal(dets.mdb[table], expected.mdb[table], obj=table)
+
+
+def test_raw_detections_only_kept_for_ingest(synthetic, temp_file):
+    df, md = synthetic
+    dets = make_detections(df, md, False, temp_file, ingest=False)
+    assert dets.raw_detection_df is None
+    with pytest.raises(ValueError):
+        dets.ingest(encode_devices(df.iloc[:10]))
@@ -0,0 +1,146 @@
+import numpy as np
+import pytest
+from scipy.interpolate import griddata
+
+from range_driver.data_prep.interpolation import (GridIndex, ScatteredIndex, axis_spacing,
+                                                  interpolate_points, scattered_index)
+
+axes = [np.array([44., 44.1, 44.35, 44.4, 45.]),
+        np.array([-64., -63.8, -63.7, -63.1]),
+        np.array([0., 3600., 7200., 14400., 21600., 36000.])]
+
+
+def field(lat, lon, t):
+    """Linear in each coordinate, which multilinear interpolation reproduces exactly"""
+    return 1 + 2 * lat - 3 * lon + t / 3600 + 0.5 * lat * lon - 0.01 * lon * t / 3600
+
+
+def grid_values(grid_axes=axes):
+    return field(*np.meshgrid(*grid_axes, indexing='ij'))
+
+
+def random_points(num, seed, margin=0.):
+    rng = np.random.default_rng(seed)
+    return np.column_stack([rng.uniform(ax.min() - margin * np.ptp(ax), ax.max() + margin * np.ptp(ax), num)
+                            for ax in axes])
+
+
+def brute_force_nearest(points, grid_axes=axes):
+    idx = [np.abs(ax[None, :] - points[:, [k]]).argmin(axis=1) for k, ax in enumerate(grid_axes)]
+    return grid_values(grid_axes)[tuple(idx)]
+
+
+def test_linear_matches_field():
+    points = random_points(1000, 0)
+    result = GridIndex(axes).lookup(points, 'linear').gather(grid_values())
+    np.testing.assert_allclose(result, field(*points.T), rtol=1e-12)
+
+
+def test_nearest_matches_brute_force():
+    points = random_points(1000, 1)
+    result = GridIndex(axes).lookup(points, 'nearest').gather(grid_values())
+    np.testing.assert_array_equal(result, brute_force_nearest(points))
+
+
+@pytest.mark.parametrize('method', ['nearest', 'linear'])
+def test_points_outside_are_clamped(method):
+    points = random_points(500, 2, margin=0.5)
+    clamped = np.column_stack([np.clip(points[:, k], ax.min(), ax.max()) for k, ax in enumerate(axes)])
+    index = GridIndex(axes)
+    np.testing.assert_allclose(index.lookup(points, method).gather(grid_values()),
+                               index.lookup(clamped, method).gather(grid_values()), rtol=1e-12)
+
+
+@pytest.mark.parametrize('method', ['nearest', 'linear'])
+def test_descending_axis(method):
+    points = random_points(1000, 3, margin=0.1)
+    descending = [axes[0][::-1], axes[1], axes[2][::-1]]
+    index = GridIndex(descending)
+    assert index.flipped == [True, False, True]
+    np.testing.assert_allclose(index.lookup(points, method).gather(grid_values(descending)),
+                               GridIndex(axes).lookup(points, method).gather(grid_values()),
+                               rtol=1e-12)
+
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        GridIndex(axes).lookup(random_points(2, 0), 'cubic')
+
+
+def test_nan_corners_are_left_out_of_weights():
+    index = GridIndex([np.array([0., 1.]), np.array([0., 1.])])
+    values = np.array([[1., np.nan], [3., 4.]])
+    lookup = index.lookup(np.array([[0.5, 0.5], [0.25, 0.]]), 'linear')
+    np.testing.assert_allclose(lookup.gather(values), [(1 + 3 + 4) / 3, 0.75 * 1 + 0.25 * 3])
+
+
+@pytest.mark.parametrize('method', ['nearest', 'linear'])
+def test_fill_nearest(method):
+    values = grid_values()
+    values[1:4, 1:3, :] = np.nan
+    # in the middle of the masked block, next to the unmasked lat=44 and lon=-64 nodes
+    points = np.array([[44.3, -63.75, 7200.], [44.12, -63.78, 3600.], [44.9, -63.2, 100.]])
+    lookup = GridIndex(axes).lookup(points, method)
+    filled = lookup.gather(values)
+    unfilled = lookup.gather(values, fill_nearest=False)
+    assert np.isnan(unfilled[:2]).all() and not np.isnan(unfilled[2])
+    assert filled[2] == unfilled[2]
+
+    # nearest valid node in coordinates scaled by the typical axis spacing
+    valid = ~np.isnan(values)
+    node_coords = np.column_stack([c[valid] for c in np.meshgrid(*axes, indexing='ij')])
+    scales = np.array([axis_spacing(ax) for ax in axes])
+    dists = np.linalg.norm((node_coords[None, :, :] - points[:2, None, :]) / scales, axis=2)
+    np.testing.assert_array_equal(filled[:2], values[valid][dists.argmin(axis=1)])
+
+
+def test_gather_several_variables():
+    values = np.stack([grid_values(), -grid_values(), grid_values() ** 2])
+    values[1, 1:3, 1:3, :] = np.nan
+    lookup = GridIndex(axes).lookup(random_points(300, 4), 'linear')
+    result = lookup.gather(values)
+    assert result.shape == (3, 300)
+    for k in range(3):
+        np.testing.assert_array_equal(result[k], lookup.gather(values[k]))
+
+
+def test_scattered_index_matches_brute_force():
+    rng = np.random.default_rng(5)
+    coords = np.column_stack([rng.uniform(44, 45, 400), rng.uniform(-64, -63, 400),
+                              rng.uniform(0, 86400, 400)])
+    points = np.column_stack([rng.uniform(44, 45, 200), rng.uniform(-64, -63, 200),
+                              rng.uniform(0, 86400, 200)])
+    index = ScatteredIndex(coords)
+    np.testing.assert_allclose(index.scales, [axis_spacing(c) for c in coords.T])
+    dists = np.linalg.norm((coords[None, :, :] - points[:, None, :]) / index.scales, axis=2)
+    np.testing.assert_array_equal(index.lookup(points), dists.argmin(axis=1))
+    # unscaled, the nearest neighbours are those of griddata
+    np.testing.assert_array_equal(
+        ScatteredIndex(coords, np.ones(3)).lookup(points),
+        griddata(coords, np.arange(len(coords)), points, method='nearest'))
+    assert scattered_index(coords) is scattered_index(coords)
+
+
+def test_interpolate_points_on_full_grid_matches_griddata():
+    rng = np.random.default_rng(6)
+    coords = np.column_stack([c.ravel() for c in np.meshgrid(*axes, indexing='ij')])
+    order = rng.permutation(len(coords))
+    coords, values = coords[order], grid_values().ravel()[order]
+    points = random_points(1000, 7)
+    # on a rectilinear grid the per-axis nearest node is the euclidean nearest node
+    result = interpolate_points(values, coords, points, 'nearest')
+    np.testing.assert_array_equal(result, griddata(coords, values, points, method='nearest'))
+    np.testing.assert_allclose(interpolate_points(values, coords, points, 'linear'),
+                               field(*points.T), rtol=1e-12)
+
+
+def test_interpolate_points_scattered_ignores_nan():
+    rng = np.random.default_rng(8)
+    coords = rng.uniform(0, 1, (300, 2))
+    values = rng.normal(size=300)
+    values[::3] = np.nan
+    points = rng.uniform(0, 1, (100, 2))
+    assert GridIndex.from_points(coords, values) is None
+    valid = ~np.isnan(values)
+    expected = values[valid][ScatteredIndex(coords[valid]).lookup(points)]
+    np.testing.assert_array_equal(interpolate_points(values, coords, points), expected)
@@ -0,0 +1,108 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import write_synthetic_nsog
+from range_driver.cache import DiskCache
+from range_driver.data_prep import metadata
+from range_driver.data_prep.metadata import read_otn_metadata, read_vendor_tag_specs
+
+
+def write_otn_metadata(path, lat_offset=0.):
+    """OTN metadata workbook with a data dictionary and deployments of two stations"""
+    datadict = pd.DataFrame({
+        'Field Name': ['OTN_ARRAY', 'STATION_NUMBER', 'DEPLOY_LAT', 'DEPLOY_LONG', 'INS_SERIAL_NO',
+                       'AR_SERIAL_NO', 'DEPLOY_DATE_TIME', 'COMMENTS'],
+        'Units / Format': ['text', 'format: integer', 'decimal degrees', 'decimal degrees', 'text',
+                           'text', 'format: yyyy-mm-ddThh:mm:ss', 'text'],
+    })
+    deploy = pd.DataFrame({
+        'OTN_ARRAY': ['NSOG', 'NSOG', np.nan, 'NSOG'],
+        'STATION_NUMBER': [1, 2, np.nan, 2],
+        'DEPLOY_LAT': np.array([44.41, 44.52, np.nan, 44.52]) + lat_offset,
+        'DEPLOY_LONG': [-64.2, -64.1, np.nan, -64.1],
+        'INS_SERIAL_NO': [480000, 480001, np.nan, 10001],
+        'AR_SERIAL_NO': [np.nan, np.nan, np.nan, 5],
+        'DEPLOY_DATE_TIME (yyyy-mm-ddThh:mm:ss)': ['2016-03-08T10:00:00', '2016-03-08T11:30:00',
+                                                   np.nan, '2016-03-08T12:00:00'],
+        'COMMENTS': ['lost anchor', np.nan, np.nan, 'tag'],
+    })
+    with pd.ExcelWriter(path) as writer:
+        title = pd.DataFrame({'header': ['OTN metadata'] * 3})
+        title.to_excel(writer, 'Data Dictionary', index=False)
+        datadict.to_excel(writer, 'Data Dictionary', index=False, startrow=4)
+        deploy.to_excel(writer, 'Deployment', index=False)
+
+
+def count_calls(monkeypatch, name):
+    calls = []
+    func = getattr(metadata, name)
+
+    def counted(*args, **kwargs):
+        calls.append(1)
+        return func(*args, **kwargs)
+
+    monkeypatch.setattr(metadata, name, counted)
+    return calls
+
+
+def test_otn_metadata_cache(tmp_path, monkeypatch):
+    path = str(tmp_path / 'otn_metadata.xlsx')
+    write_otn_metadata(path)
+    datadict, deploy = read_otn_metadata(path)
+    assert len(deploy) == 3 and deploy['STATION_NO'].dtype == int
+    assert deploy['DEPLOY_DATETIME'].iloc[1] == pd.Timestamp('2016-03-08 11:30')
+
+    cache = DiskCache(str(tmp_path / 'cache'))
+    calls = count_calls(monkeypatch, 'parse_otn_metadata')
+    for _ in range(2):
+        cached_datadict, cached_deploy = read_otn_metadata(path, cache=cache)
+        pd.testing.assert_frame_equal(cached_datadict, datadict)
+        pd.testing.assert_frame_equal(cached_deploy, deploy)
+        # missing values of text columns are NaN, as when parsed
+        assert cached_deploy['COMMENTS'].isna().sum() == 1
+    assert len(calls) == 1
+
+    # entries are keyed by the contents, not the modification time
+    os.utime(path, (1e9, 1e9))
+    read_otn_metadata(path, cache=cache)
+    assert len(calls) == 1
+    write_otn_metadata(path, lat_offset=0.5)
+    _, changed_deploy = read_otn_metadata(path, cache=cache)
+    assert len(calls) == 2
+    pd.testing.assert_frame_equal(changed_deploy, read_otn_metadata(path)[1])
+    np.testing.assert_allclose(changed_deploy['DEPLOY_LAT'], deploy['DEPLOY_LAT'] + 0.5)
+
+
+def test_vendor_tag_specs_cache(tmp_path, monkeypatch):
+    _, vendor_tag_specs = write_synthetic_nsog(str(tmp_path), num_detections=100, num_receivers=2,
+                                               num_transmitters=4, seed=0)
+    transmitter = read_vendor_tag_specs(vendor_tag_specs)
+    np.testing.assert_array_equal(transmitter['Transmitter.Avg delay'],
+                                  (transmitter['Transmitter.Min delay']
+                                   + transmitter['Transmitter.Max delay']) / 2)
+
+    cache = DiskCache(str(tmp_path / 'cache'))
+    calls = count_calls(monkeypatch, 'clean_vendor_tag_specs')
+    for _ in range(2):
+        pd.testing.assert_frame_equal(read_vendor_tag_specs(vendor_tag_specs, cache=cache),
+                                      transmitter)
+    assert len(calls) == 1
+
+    specs = pd.read_excel(vendor_tag_specs)
+    specs['Min \n(sec)'] += 10
+    specs.to_excel(vendor_tag_specs, index=False)
+    changed = read_vendor_tag_specs(vendor_tag_specs, cache=cache)
+    assert len(calls) == 2
+    np.testing.assert_array_equal(changed['Transmitter.Avg delay'],
+                                  transmitter['Transmitter.Avg delay'] + 5)
+
+
+def test_metadata_without_cache_is_parsed_each_time(tmp_path, monkeypatch):
+    path = str(tmp_path / 'otn_metadata.xlsx')
+    write_otn_metadata(path)
+    calls = count_calls(monkeypatch, 'parse_otn_metadata')
+    read_otn_metadata(path)
+    read_otn_metadata(path)
+    assert len(calls) == 2
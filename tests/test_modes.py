@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.utils import Bunch
+
+import range_driver.detections as rdd
+from benchmarks.synthetic import write_synthetic_nsog
+from range_driver.data_prep import rt_group_views
+from range_driver.data_prep.metadata import resolve_attributes
+from range_driver.pandas_utils import GroupViews, memory_bytes
+
+# settings of each processing mode
+modes = {
+    'memory_lean': Bunch(settings=Bunch(memory_lean=True)),
+    'normalized': Bunch(reader=Bunch(normalized=True)),
+    'normalized_lean': Bunch(reader=Bunch(normalized=True), settings=Bunch(memory_lean=True)),
+}
+
+
+@pytest.fixture(scope='module')
+def nsog_files(tmp_path_factory):
+    return write_synthetic_nsog(str(tmp_path_factory.mktemp('nsog')), num_detections=20000,
+                                num_receivers=3, num_transmitters=5, seed=4)
+
+
+def make_detections(nsog_files, tidal_times, monkeypatch, mode=None):
+    monkeypatch.setattr(rdd, 'read_ods', lambda path, sheet: tidal_times.copy())
+    monkeypatch.setattr(rdd.Detections, 'tidal_lookups', {})
+    detections_csv, vendor_tag_specs = nsog_files
+    config = Bunch(reader=Bunch(nsog=Bunch(detections_csv=detections_csv,
+                                           vendor_tag_specs=vendor_tag_specs)),
+                   settings=Bunch(time_bin_length='60min', base_bin_length='20min', auto_dr=True,
+                                  show_details=False),
+                   data=Bunch(sources={}, tidal=Bunch(tidal_times_ods='tidal.ods', year=2016),
+                              calculated_columns=[]),
+                   bounds=Bunch())
+    for section, values in (modes[mode] if mode else {}).items():
+        config[section].update(values)
+    return rdd.Detections(config)
+
+
+def plain(df):
+    """`df` with the dtypes of the default mode: categorical attributes as strings, compact
+    numbers as 64 bit"""
+    dtypes = {}
+    for col, dtype in df.dtypes.items():
+        if isinstance(dtype, pd.CategoricalDtype):
+            dtypes[col] = object
+        elif dtype.kind in 'fiu':
+            dtypes[col] = 'float64'
+    return df.astype(dtypes)
+
+
+@pytest.mark.parametrize('mode', list(modes))
+def test_mode_matches_default(nsog_files, tidal_times, monkeypatch, mode):
+    expected = make_detections(nsog_files, tidal_times, monkeypatch)
+    dets = make_detections(nsog_files, tidal_times, monkeypatch, mode)
+    assert len(expected.detection_bins_df) and len(expected.mdb.rt_groups) == 15
+    for attr in ['detection_bins_df', 'detection_events_df', 'df_detections_env']:
+        result, expected_frame = getattr(dets, attr), getattr(expected, attr)
+        pd.testing.assert_frame_equal(plain(result), plain(expected_frame[result.columns]),
+                                      rtol=1e-6, obj=attr)
+        # the attributes of normalized detections are in the dimension tables, also for the
+        # events, which only have the receiver attributes in the default mode
+        attributes = list(expected_frame.columns.difference(result.columns))
+        assert bool(attributes) == ('dimensions' in dets.mdb)
+        if attributes:
+            resolved = resolve_attributes(result, dets.mdb.dimensions, attributes)
+            assert resolved.notna().all().all()
+            known = expected_frame[attributes].notna()
+            pd.testing.assert_frame_equal(plain(resolved).where(known),
+                                          plain(expected_frame[attributes]), rtol=1e-6, obj=attr)
+    for table in ['rt_groups', 'rt_pairs']:
+        pd.testing.assert_frame_equal(plain(dets.mdb[table]), plain(expected.mdb[table]), rtol=1e-6,
+                                      obj=table)
+    assert len(dets.rt_group_detections) == len(expected.rt_group_detections)
+    for (key, group), (expected_key, expected_group) in zip(dets.rt_group_detections,
+                                                            expected.rt_group_detections):
+        assert key == expected_key
+        pd.testing.assert_frame_equal(plain(group), plain(expected_group[group.columns]), rtol=1e-6)
+
+
+def test_memory_report(nsog_files, tidal_times, monkeypatch):
+    default = make_detections(nsog_files, tidal_times, monkeypatch)
+    lean = make_detections(nsog_files, tidal_times, monkeypatch, 'memory_lean')
+    reports = {'default': default.memory_report(), 'memory_lean': lean.memory_report()}
+    stages = [stage for stage, *_ in rdd.Detections.pipeline_stages]
+    for report in reports.values():
+        assert list(report.index) == stages
+        assert set(rdd.Detections.frame_attributes) | {'total'} <= set(report.columns)
+        # shared columns count once in the total
+        frames = report[rdd.Detections.frame_attributes]
+        assert (report['total'] <= frames.sum(axis=1) + 1e-9).all()
+        assert (report['total'] >= frames.max(axis=1)).all()
+    np.testing.assert_allclose(reports['default'].loc['group_data', 'total'],
+                               memory_bytes(*(getattr(default, a, None)
+                                              for a in rdd.Detections.frame_attributes)) / 2**20)
+    assert (reports['memory_lean']['total'] < reports['default']['total']).all()
+    assert lean.df_dets is None and isinstance(lean.rt_group_detections, GroupViews)
+
+
+def test_group_views_match_groupby():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({'Receiver': rng.choice(['R1', 'R2', 'R3', None], 500),
+                       'Transmitter': rng.choice(['T1', 'T2'], 500),
+                       'x': rng.normal(size=500)}, index=rng.permutation(500) + 1000)
+    views = rt_group_views(df)
+    expected = list(df.groupby(['Receiver', 'Transmitter']))
+    assert len(views) == len(expected) == 6
+    for (key, group), (expected_key, expected_group) in zip(views, expected):
+        assert key == expected_key
+        pd.testing.assert_frame_equal(group, expected_group)
+    assert [key for key, _ in views[1:4]] == [key for key, _ in expected[1:4]]
+    assert views[-1][0] == expected[-1][0]
+
+    # groups without rows are left out
+    views = GroupViews(df, np.where(df['Transmitter'] == 'T1', 2, -1), ['a', 'b', 'c', 'd'])
+    assert len(views) == 1 and views[0][0] == 'c'
+    pd.testing.assert_frame_equal(views[0][1], df[df['Transmitter'] == 'T1'])
+    # only the row positions are stored
+    assert views.order.dtype == np.int32
+    assert memory_bytes(views) <= memory_bytes(df) + 4 * (len(df) + 5)
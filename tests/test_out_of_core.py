@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.utils import Bunch
+
+import range_driver.detections as rdd
+from benchmarks.synthetic import write_synthetic_nsog
+
+
+def decode(df):
+    """`df` with device names as strings, since the device categories of the modes differ"""
+    df = df.astype({c: object for c in df.columns if df[c].dtype == 'category'})
+    if isinstance(df.index, pd.MultiIndex):
+        df.index = pd.MultiIndex.from_frame(decode(df.index.to_frame(index=False)))
+    return df
+
+
+def by_pair(df):
+    return decode(df).sort_values(['Receiver', 'Transmitter'], kind='stable').reset_index(drop=True)
+
+
+@pytest.fixture
+def nsog_files(tmp_path):
+    return write_synthetic_nsog(str(tmp_path), num_detections=20000, num_receivers=3,
+                                num_transmitters=5, seed=2)
+
+
+def make_config(nsog_files, out_of_core=None):
+    detections_csv, vendor_tag_specs = nsog_files
+    reader = Bunch(nsog=Bunch(detections_csv=detections_csv, vendor_tag_specs=vendor_tag_specs),
+                   chunksize=5000)
+    if out_of_core is not None:
+        reader.out_of_core = out_of_core
+    return Bunch(reader=reader,
+                 settings=Bunch(time_bin_length='60min', base_bin_length='10min', auto_dr=True,
+                                show_details=False),
+                 data=Bunch(sources={}, tidal=Bunch(tidal_times_ods='tidal.ods', year=2016),
+                            calculated_columns=[]),
+                 bounds=Bunch())
+
+
+@pytest.mark.parametrize('scheduler', ['synchronous', 'processes'])
+def test_out_of_core_matches_in_memory(nsog_files, tidal_times, tmp_path, monkeypatch, scheduler):
+    monkeypatch.setattr(rdd, 'read_ods', lambda path, sheet: tidal_times.copy())
+    monkeypatch.setattr(rdd.Detections, 'tidal_lookups', {})
+    in_memory = rdd.Detections(make_config(nsog_files))
+    out_of_core = rdd.Detections(make_config(nsog_files, Bunch(
+        directory=str(tmp_path / 'out_of_core'), partitions=3, scheduler=scheduler, workers=2)))
+    assert out_of_core.detection_df.npartitions == 3
+    assert len(in_memory.detection_bins_df) and len(in_memory.mdb.rt_groups) == 15
+
+    bins = (in_memory.detection_bins_df
+            .sort_values(['datetime', 'Receiver', 'Transmitter'], kind='stable')
+            .reset_index(drop=True))
+    pd.testing.assert_frame_equal(decode(bins), decode(out_of_core.detection_bins_df))
+    events = out_of_core.detection_events_df.compute(scheduler='synchronous')
+    pd.testing.assert_frame_equal(by_pair(in_memory.detection_events_df), by_pair(events))
+    assert np.isfinite(events['height']).all()
+    for table in ['rt_groups', 'rt_pairs']:
+        pd.testing.assert_frame_equal(decode(in_memory.mdb[table]), decode(out_of_core.mdb[table]))
+    pd.testing.assert_frame_equal(
+        in_memory.df_tidal_interp.reindex(out_of_core.df_tidal_interp.index),
+        out_of_core.df_tidal_interp)
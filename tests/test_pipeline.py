@@ -0,0 +1,50 @@
+from sklearn.utils import Bunch
+
+from range_driver.detections import Detections
+
+
+class ToyDetections(Detections):
+    """Detections with a two-stage pipeline of plain values"""
+    pipeline_stages = [
+        ('first', 'make_first', ['x'], ['first']),
+        ('second', 'make_second', ['y'], ['second']),
+    ]
+
+    def make_first(self):
+        self.first = self.config.x
+
+    def make_second(self):
+        self.second = self.first + self.config.y
+
+
+def make_toy(x=1, y=10):
+    dets = ToyDetections.__new__(ToyDetections)
+    dets.reset()
+    dets.config = Bunch(settings=Bunch(), x=x, y=y)
+    return dets
+
+
+def test_rerun_changed_stages():
+    dets = make_toy()
+    assert dets.run_pipeline() == ['first', 'second']
+    assert dets.run_pipeline() == []
+    dets.config.y = 20
+    assert dets.run_pipeline() == ['second']
+    assert dets.second == 21
+
+
+def test_checkpoint_evicted_after_check():
+    dets = make_toy()
+    dets.run_pipeline()
+    first_key = dets.stage_keys[0]
+    dets.config.y = 20
+
+    # the checkpoint exists when checked, but is gone when it is loaded
+    def has_checkpoint(key):
+        found = key in dets.checkpoints
+        dets.checkpoints.pop(first_key, None)
+        return found
+    dets.has_checkpoint = has_checkpoint
+    dets.first = dets.second = None
+    assert dets.run_pipeline() == ['first', 'second']
+    assert (dets.first, dets.second) == (1, 21)
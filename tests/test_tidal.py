@@ -0,0 +1,112 @@
+import copy
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.utils import Bunch
+
+import range_driver.detections as rdd
+from benchmarks.synthetic import make_synthetic_detections
+from range_driver.data_prep.tidal import (TidalLookup, flatten_tidal_table, tidal_lookup_path,
+                                          tidal_phase_at)
+
+# largest differences from tidal_phase_at() at a 1min grid spacing
+linear_atol = {'t': 1e-9, 't2': 1e-9, 'height': 1e-3, 'dheight_cm_per_hr': 2e-3}
+nearest_atol = {'t': 1e-2, 't2': 1e-2, 'height': 3e-2, 'dheight_cm_per_hr': 6e-2}
+
+
+def phase_diff(a, b, period=None):
+    d = a - b
+    # phases at an extremum are either 0 or a full period
+    return np.abs(d if period is None else (d + period / 2) % period - period / 2)
+
+
+@pytest.fixture
+def dflat(tidal_times):
+    return flatten_tidal_table(tidal_times, year=2016)
+
+
+@pytest.fixture
+def query_times(dflat):
+    rng = np.random.default_rng(1)
+    start, end = dflat.index[0], dflat.index[-1]
+    times = start + pd.to_timedelta(rng.integers(0, (end - start).total_seconds(), 100000), 's')
+    # extrema, times outside of the table, and missing times
+    return np.concatenate([times.values, dflat.index.values[:20],
+                           np.array(['2016-02-01', '2016-08-01', 'NaT'], dtype='datetime64[ns]')])
+
+
+@pytest.mark.parametrize('linear,atol', [(True, linear_atol), (False, nearest_atol)])
+def test_lookup_close_to_exact(dflat, query_times, linear, atol):
+    lookup = TidalLookup.from_extrema(dflat, '1min')
+    exact = tidal_phase_at(dflat, query_times)
+    result = lookup.lookup(query_times, linear)
+    assert result.index.equals(exact.index)
+    for col in lookup.columns:
+        np.testing.assert_array_equal(np.isnan(result[col].values), np.isnan(exact[col].values))
+        diff = phase_diff(result[col].values, exact[col].values, lookup.periods.get(col))
+        assert np.nanmax(diff) <= atol[col], col
+
+
+def test_lookup_outside_grid_is_exact(dflat):
+    lookup = TidalLookup.from_extrema(dflat, '1min', start='2016-04-01', end='2016-04-02')
+    times = np.array(['2016-03-15 12:34:56', '2016-05-01 01:02:03'], dtype='datetime64[ns]')
+    pd.testing.assert_frame_equal(lookup.lookup(times), tidal_phase_at(dflat, times)[lookup.columns])
+
+
+def test_save_load(dflat, tmp_path):
+    lookup = TidalLookup.from_extrema(dflat, '10min', key='abc')
+    path = str(tmp_path / 'tidal_lookup.npz')
+    lookup.save(path)
+    loaded = TidalLookup.load(path, 'abc')
+    np.testing.assert_array_equal(loaded.values, lookup.values)
+    assert (loaded.origin, loaded.step, loaded.key) == (lookup.origin, lookup.step, 'abc')
+    pd.testing.assert_frame_equal(loaded.dflat, lookup.dflat, check_freq=False)
+    assert TidalLookup.load(path, 'other') is None
+    assert TidalLookup.load(str(tmp_path / 'missing.npz')) is None
+
+
+def test_load_corrupt_file(dflat, tmp_path):
+    path = str(tmp_path / 'tidal_lookup.npz')
+    TidalLookup.from_extrema(dflat, '10min', key='abc').save(path)
+    with open(path, 'rb') as fh:
+        data = fh.read()
+    with open(path, 'wb') as fh:
+        fh.write(data[:len(data) // 2])
+    assert TidalLookup.load(path, 'abc') is None
+
+
+def run_tidal_data(tidal):
+    df, md = make_synthetic_detections(20000, 3, 5, seed=4)
+    config = Bunch(settings=Bunch(time_bin_length='60min', auto_dr=True, show_details=False),
+                   data=Bunch(sources={}, tidal=tidal), bounds=Bunch())
+    dets = rdd.Detections.__new__(rdd.Detections)
+    dets.reset()
+    dets.config = config
+    dets.detection_df, dets.mdb = df, copy.deepcopy(md)
+    dets.df_detections_env = df
+    dets.add_tidal_data()
+    return dets
+
+
+def test_detections_tidal_data(tidal_times, tmp_path, monkeypatch):
+    reads = []
+    monkeypatch.setattr(rdd, 'read_ods', lambda path, sheet: reads.append(path) or tidal_times.copy())
+    monkeypatch.setattr(rdd.Detections, 'tidal_lookups', {})
+    tidal = Bunch(tidal_times_ods='tidal.ods', year=2016,
+                  tidal_interpolation_output_csv=str(tmp_path / 'tidal_interpolation.csv'))
+    dets = run_tidal_data(tidal)
+    exact = tidal_phase_at(flatten_tidal_table(tidal_times, year=2016),
+                           dets.df_detections_env['datetime'].values)
+    for col in ['t2', 'height', 'dheight_cm_per_hr']:
+        diff = phase_diff(dets.df_detections_env[col].values, exact[col].values,
+                          TidalLookup.periods.get(col))
+        assert np.nanmax(diff) <= linear_atol[col], col
+
+    # later Detections load the saved table rather than the ODS file
+    rdd.Detections.tidal_lookups.clear()
+    again = run_tidal_data(tidal)
+    assert reads == ['tidal.ods']
+    assert again.df_tidal_times is None
+    pd.testing.assert_frame_equal(again.df_detections_env, dets.df_detections_env)
+    assert TidalLookup.load(tidal_lookup_path(tidal.tidal_interpolation_output_csv)) is not None
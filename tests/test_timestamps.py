@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from range_driver.data_prep.timestamps import (datetime_from_components, detect_datetime_format,
+                                               parse_datetimes)
+
+cases = {
+    'iso': ['2016-03-07 00:18:05', '2016-03-07 13:01:59', '2016-02-29 23:59:00'],
+    'iso_minutes': ['2016-03-07 00:18', '2016-12-31 23:59'],
+    'iso_t': ['2016-03-07T00:18:05', '2016-03-08T10:00:00'],
+    'fraction': ['2016-03-07 00:18:05.123', '2016-03-07 00:18:06.500'],
+    'fraction_ns': ['2016-03-07T00:18:05.123456789', '2016-03-07T00:18:05.000000001'],
+    'nulls': ['2016-03-07 00:18:05', None, np.nan, '2016-03-07 00:19:05', 'NaT', ''],
+    'nan_string': ['2016-03-07 00:18:05', 'nan', '2016-03-07 00:19:05'],
+    'us_dates': ['03/07/2016 00:18:05', '12/31/2016 23:59:59'],
+    'month_names': ['07-Mar-2016 00:18', '31-Dec-2016 23:59'],
+    'offset': ['2016-03-07 00:18:05-04:00', '2016-03-07 01:00:00-04:00'],
+    'utc_z': ['2016-03-07T00:18:05Z', '2016-03-07T01:00:00Z'],
+    'utc_offset': ['2016-03-07 00:18:05+00:00', '2016-03-07 01:00:00+00:00'],
+    'all_null': [None, np.nan],
+}
+
+
+@pytest.mark.parametrize('name', list(cases))
+def test_parse_like_to_datetime(name):
+    # repeated values exercise the parsing of distinct values only
+    values = pd.Series(cases[name] * 3, index=np.arange(len(cases[name]) * 3) + 10, name='t',
+                       dtype=object)
+    pd.testing.assert_series_equal(parse_datetimes(values), pd.to_datetime(values))
+    pd.testing.assert_index_equal(parse_datetimes(values.values),
+                                  pd.DatetimeIndex(pd.to_datetime(values.values)))
+
+
+def test_invalid_values_raise():
+    values = pd.Series(['2016-03-07 00:18:05', 'not a time'] * 60)
+    with pytest.raises(ValueError):
+        pd.to_datetime(values)
+    with pytest.raises(ValueError):
+        parse_datetimes(values)
+
+
+def test_invalid_iso_date_raises():
+    values = pd.Series(['2016-02-30 00:18:05', '2016-03-07 00:18:05'])
+    with pytest.raises(ValueError):
+        parse_datetimes(values)
+
+
+def test_parsed_datetimes_pass_through():
+    values = pd.Series(pd.date_range('2016-03-07', periods=3, freq='H'))
+    pd.testing.assert_series_equal(parse_datetimes(values), values)
+
+
+def test_detect_format():
+    assert detect_datetime_format(cases['iso']) == '%Y-%m-%d %H:%M:%S'
+    assert detect_datetime_format(cases['fraction']) == '%Y-%m-%d %H:%M:%S.%f'
+    assert detect_datetime_format(['2016-03-07', 'not a time']) is None
+
+
+def test_datetime_from_components():
+    result = datetime_from_components([2016, 2016, np.nan], [2, 12, 1], [29, 31, 1], 23, 59, [0, 5, 0])
+    expected = np.array(['2016-02-29T23:59:00', '2016-12-31T23:59:05', 'NaT'], dtype='datetime64[ns]')
+    np.testing.assert_array_equal(result, expected)